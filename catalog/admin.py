@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils import timezone
 
-from .models import Author, Genre, Book, BookInstance, Review
+from .circulation import CirculationError, return_copy
+from .models import Author, Genre, Book, BookInstance, Hold, Job, Review, ReviewSubmission
 
 # admin.site.register(Book)
 # admin.site.register(Author)
@@ -21,16 +23,91 @@ admin.site.register(Author, AuthorAdmin)
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre',
-                    )
+                    'display_copies', 'display_avg_stars')
+    readonly_fields = ('copies_available', 'total_copies',
+                       'review_count', 'star_sum')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_display()
+
+    def display_copies(self, obj):
+        return f'{obj.copies_available} / {obj.total_copies}'
+
+    display_copies.short_description = 'Copies available'
+    display_copies.admin_order_field = 'copies_available'
+
+    def display_avg_stars(self, obj):
+        return obj.avg_stars
+
+    display_avg_stars.short_description = 'Average stars'
 
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
-    list_display = ('book', 'status', 'borrower', 'id')
-    list_filter = ('status',)
+    list_display = ('book', 'status', 'borrower', 'due_back', 'id')
+    list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
     fieldsets = (
         (None,
          {'fields': ('book', 'imprint', 'id')}),
         ('Availability',
-         {'fields': ('status', 'borrower')}),
+         {'fields': ('status', 'due_back', 'borrower')}),
     )
+    actions = ['mark_returned']
+
+    def mark_returned(self, request, queryset):
+        returned = 0
+        for instance in queryset.filter(status='o'):
+            try:
+                return_copy(instance)
+            except CirculationError as error:
+                self.message_user(request, str(error), level=messages.WARNING)
+                continue
+            returned += 1
+        self.message_user(request, f'{returned} copies returned')
+
+    mark_returned.short_description = 'Return selected copies (passes them to waiting holds)'
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('book', 'user', 'status', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    list_select_related = ('book', 'user')
+    raw_id_fields = ('book', 'user', 'instance')
+
+
+@admin.register(ReviewSubmission)
+class ReviewSubmissionAdmin(admin.ModelAdmin):
+    """Moderation queue: reviews the moderation hook held back"""
+    list_display = ('book', 'writer', 'stars', 'status', 'note', 'submitted_at')
+    list_filter = ('status',)
+    list_select_related = ('book',)
+    raw_id_fields = ('book', 'user')
+    actions = ['approve', 'reject']
+
+    def approve(self, request, queryset):
+        approved = queryset.filter(status='h').update(status='a')
+        self.message_user(request, f'{approved} reviews queued, process_reviews will publish them')
+
+    approve.short_description = 'Approve selected reviews'
+
+    def reject(self, request, queryset):
+        rejected, _ = queryset.delete()
+        self.message_user(request, f'{rejected} reviews rejected')
+
+    reject.short_description = 'Reject (delete) selected reviews'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Background jobs run by manage.py run_jobs"""
+    list_display = ('name', 'interval', 'next_run_at', 'last_status', 'last_finished_at')
+    readonly_fields = ('name', 'last_started_at', 'last_finished_at', 'last_status', 'last_result')
+    actions = ['run_soon']
+
+    def run_soon(self, request, queryset):
+        queryset.update(next_run_at=timezone.now())
+        self.message_user(request, 'The jobs run on the next poll of manage.py run_jobs')
+
+    run_soon.short_description = 'Run on the next poll'
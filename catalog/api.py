@@ -0,0 +1,233 @@
+"""Read-only JSON API over the catalog.
+
+Rows are fetched with ``values()`` and serialized as plain dicts, never as
+model instances. Every endpoint supports:
+
+- ``?fields=a,b`` to return only some fields (``id`` is always included)
+- ``?ids=1,2,3`` (and ``?isbns=`` for books) for batched lookups
+- ``?cursor=`` / ``?limit=`` keyset pagination, see catalog.pagination
+- ``ETag`` from the rows' ids and ``updated_at``, answering ``If-None-Match``
+  with 304 Not Modified; detail responses also carry ``Last-Modified`` for
+  ``If-Modified-Since``. Lists don't, since deleting a row doesn't move the
+  newest ``updated_at`` of the rows that are left.
+"""
+import functools
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .middleware import query_budget
+from .replicas import replica_reads
+from .models import STAR_FIELDS, Author, Book, BookInstance, Genre, Review
+from .pagination import CursorPaginator
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    """A bad request, reported to the client as a 400 with the message"""
+
+
+class Resource:
+    """What one endpoint exposes of a model"""
+
+    def __init__(self, model, fields, ordering, computed=None, lookups=None):
+        self.model = model
+        self.fields = fields
+        # name -> (columns it needs, function of the row)
+        self.computed = computed or {}
+        self.ordering = ordering
+        # query parameter -> column for batched lookups
+        self.lookups = {'ids': 'pk', **(lookups or {})}
+
+    def selected_fields(self, request):
+        requested = request.GET.get('fields')
+        available = list(self.fields) + list(self.computed)
+        if not requested:
+            return available
+        names = ['id'] + [name for name in requested.split(',') if name and name != 'id']
+        unknown = set(names) - set(available)
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        return names
+
+    def columns(self, names):
+        """Columns to fetch with values() for the selected field names"""
+        columns = {'updated_at'} | {field.lstrip('-') for field in self.ordering}
+        for name in names:
+            columns.update(self.computed[name][0] if name in self.computed else (name,))
+        return sorted(columns)
+
+    def serialize(self, row, names):
+        return {name: self.computed[name][1](row) if name in self.computed else row[name]
+                for name in names}
+
+
+def average_stars(row):
+    return row['star_sum'] / row['review_count'] if row['review_count'] else None
+
+
+BOOKS = Resource(
+    Book,
+    fields=('id', 'title', 'isbn', 'description', 'publication_date', 'author_id',
+            'copies_available', 'total_copies', 'review_count'),
+    computed={
+        'avg_stars': (('star_sum', 'review_count'), average_stars),
+        'is_available': (('copies_available',), lambda row: row['copies_available'] > 0),
+        'star_histogram': (STAR_FIELDS, lambda row: {
+            str(stars): row[name] for stars, name in enumerate(STAR_FIELDS, 1)}),
+    },
+    ordering=('title', 'id'),
+    lookups={'isbns': 'isbn'},
+)
+AUTHORS = Resource(
+    Author,
+    fields=('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death',
+            'book_count', 'copies_available', 'review_count'),
+    computed={'avg_stars': (('star_sum', 'review_count'), average_stars)},
+    ordering=('last_name', 'first_name', 'id'),
+)
+GENRES = Resource(Genre, fields=('id', 'name'), ordering=('name', 'id'))
+COPIES = Resource(
+    BookInstance, fields=('id', 'book_id', 'imprint', 'status', 'due_back'), ordering=('id',))
+REVIEWS = Resource(
+    Review, fields=('id', 'book_id', 'writer', 'stars', 'date_written', 'body'),
+    ordering=('date_written', 'id'))
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def conditional_json(request, payload, rows, last_modified=False):
+    """JsonResponse for ``payload``, or 304 if the client has the same rows already"""
+    names = request.GET.get('fields', '')
+    fingerprint = hashlib.md5(f'{request.path}|{names}'.encode())
+    for row in rows:
+        fingerprint.update(f'|{row["id"]}:{row["updated_at"].isoformat()}'.encode())
+    etag = f'"{fingerprint.hexdigest()}"'
+    if last_modified:
+        last_modified = max((row['updated_at'] for row in rows), default=None)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(payload, encoder=DjangoJSONEncoder)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def list_endpoint(resource, request, queryset):
+    names = resource.selected_fields(request)
+    columns = resource.columns(names)
+
+    for param, column in resource.lookups.items():
+        if param in request.GET:
+            values = [value for value in request.GET[param].split(',') if value][:MAX_LIMIT]
+            meta = resource.model._meta
+            field = meta.pk if column == 'pk' else meta.get_field(column)
+            try:
+                values = [field.to_python(value) for value in values]
+            except ValidationError:
+                raise ApiError(f'Invalid {param}')
+            rows = list(queryset.filter(**{f'{column}__in': values})
+                        .order_by(*resource.ordering).values(*columns))
+            payload = {'results': [resource.serialize(row, names) for row in rows]}
+            return conditional_json(request, payload, rows)
+
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('limit must be a number')
+    if limit < 1:
+        raise ApiError('limit must be positive')
+    paginator = CursorPaginator(queryset.values(*columns), limit, resource.ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except ValueError:
+        raise ApiError('Invalid cursor')
+    rows = page.object_list
+    payload = {
+        'results': [resource.serialize(row, names) for row in rows],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+    return conditional_json(request, payload, rows)
+
+
+def detail_endpoint(resource, request, pk):
+    names = resource.selected_fields(request)
+    rows = list(resource.model.objects.filter(pk=pk).values(*resource.columns(names)))
+    if not rows:
+        raise Http404(f'No {resource.model._meta.verbose_name} with id {pk}')
+    return conditional_json(request, resource.serialize(rows[0], names), rows,
+                            last_modified=True)
+
+
+def api_view(budget):
+    """GET-only JSON endpoint with a query budget, turning ApiError into a 400.
+
+    Endpoints only read, so they read from a replica when there is one.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            try:
+                return view_func(request, *args, **kwargs)
+            except ApiError as error:
+                return error_response(str(error))
+        return require_GET(replica_reads(query_budget(budget)(wrapped)))
+    return decorator
+
+
+@api_view(1)
+def api_root(request):
+    return JsonResponse({name: request.build_absolute_uri(reverse(f'api-{name}'))
+                         for name in ('books', 'authors', 'genres')})
+
+
+@api_view(1)
+def book_list(request):
+    return list_endpoint(BOOKS, request, Book.objects.all())
+
+
+@api_view(1)
+def book_detail(request, pk):
+    return detail_endpoint(BOOKS, request, pk)
+
+
+@api_view(2)
+def book_copies(request, pk):
+    get_object_or_404(Book.objects.only('pk'), pk=pk)
+    return list_endpoint(COPIES, request, BookInstance.objects.filter(book_id=pk))
+
+
+@api_view(2)
+def book_reviews(request, pk):
+    get_object_or_404(Book.objects.only('pk'), pk=pk)
+    return list_endpoint(REVIEWS, request, Review.objects.filter(book_id=pk))
+
+
+@api_view(1)
+def author_list(request):
+    return list_endpoint(AUTHORS, request, Author.objects.all())
+
+
+@api_view(1)
+def author_detail(request, pk):
+    return detail_endpoint(AUTHORS, request, pk)
+
+
+@api_view(1)
+def genre_list(request):
+    return list_endpoint(GENRES, request, Genre.objects.all())
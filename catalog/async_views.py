@@ -0,0 +1,99 @@
+"""Async versions of the hot catalog read views, for ASGI deployments.
+
+Django 3.2 has no async ORM, so database work and template rendering go
+through ``run_db``. With ``CATALOG_ASYNC_DB_POOL`` on, that runs them on the
+event loop's thread pool, each worker thread with its own connection, instead
+of queueing behind every other request on the one thread Django keeps for
+sync code. Independent work, such as loading the visitor's session and user
+next to the page's own queries, is awaited together with ``asyncio.gather``.
+
+``catalog/urls.py`` routes to these views instead of catalog.views when
+``CATALOG_ASYNC_VIEWS`` is set, which emilyslibrary/asgi.py does.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.shortcuts import render
+
+from . import counters, views
+from .middleware import count_queries, query_budget, timed_render
+from .replicas import replica_reads
+from .stats import catalog_stats
+
+
+def _call(request, pooled, func, args, kwargs):
+    if pooled:
+        # pool threads never see request_started/finished, so apply
+        # CONN_MAX_AGE to their connections here
+        close_old_connections()
+    try:
+        metrics = getattr(request, 'query_metrics', None)
+        if metrics is None:
+            return func(*args, **kwargs)
+        with count_queries(metrics):
+            return func(*args, **kwargs)
+    finally:
+        if pooled:
+            close_old_connections()
+
+
+async def run_db(request, func, *args, **kwargs):
+    """Run blocking ``func`` off the event loop, counting its queries for ``request``"""
+    pooled = settings.CATALOG_ASYNC_DB_POOL
+    return await sync_to_async(_call, thread_sensitive=not pooled)(
+        request, pooled, func, args, kwargs)
+
+
+def _load_user(request):
+    """Resolve the lazy request.user (session and user queries) ahead of rendering"""
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+def _render(request, response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        metrics = getattr(request, 'query_metrics', None)
+        (timed_render(metrics, response.render) if metrics else response.render)()
+    return response
+
+
+def async_view(view):
+    """Async version of a sync read view that leaves request.user to its template.
+
+    The view runs on one worker while another loads the user, then the
+    response is rendered on a worker too so lazy querysets in the template
+    don't block the event loop.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response, _ = await asyncio.gather(
+            run_db(request, view, request, *args, **kwargs),
+            run_db(request, _load_user, request))
+        return await run_db(request, _render, request, response)
+
+    wrapper.__module__ = __name__
+    return wrapper
+
+
+@replica_reads
+@query_budget(views.index.query_budget)
+async def index(request):
+    """View function for the home page of site"""
+    stats, total_visits, _ = await asyncio.gather(
+        run_db(request, catalog_stats), run_db(request, counters.total, counters.HOME_VISITS),
+        run_db(request, _load_user, request))
+    context = dict(stats)
+    context['num_visits'] = views.get_visits(request)
+    context['total_visits'] = total_visits
+    response = await run_db(request, render, request, 'index.html', context=context)
+    await run_db(request, views.count_visit, response, context['num_visits'])
+    return response
+
+
+book_list = async_view(views.BookListView.as_view())
+book_detail = async_view(views.BookDetailView.as_view())
+author_list = async_view(views.AuthorListView.as_view())
+author_detail = async_view(views.AuthorDetailView.as_view())
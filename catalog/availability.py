@@ -0,0 +1,195 @@
+"""Precomputed sets of books with a copy available, overall and per genre.
+
+Each set is a bitmap over book ids, stored in ``AvailabilityChunk`` rows of
+CHUNK_BITS bits (1KB) each. "Available books in genres X and Y after id N" is
+an AND of a few chunk rows rather than a join of books, genres and copies.
+
+The bitmaps follow ``Book.copies_available``. A book only changes sets when its
+first copy comes back or its last one goes out, so ``copies_changed`` usually
+costs one SELECT; ``sync_books`` rewrites the bits of books whose genres
+changed. ``manage.py rebuild_availability`` rebuilds everything from the
+counters, for bulk loads and as a consistency check.
+
+A chunk row covers thousands of books, so ``copies_changed`` syncs once the
+checkout or return has committed, in a short transaction of its own. Holding
+the chunk's lock until the loan commits would queue every loan in the chunk
+behind it. ``sync_books`` reads the books only once it holds the chunk
+lock, so the last sync to run applies the current state.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import AvailabilityChunk, Book
+
+CHUNK_BITS = 8192
+CHUNK_BYTES = CHUNK_BITS // 8
+ALL_BOOKS = 0
+# chunk rows read per query when walking a set
+CHUNKS_PER_QUERY = 16
+
+
+def to_bits(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def to_bytes(bits):
+    return bits.to_bytes(CHUNK_BYTES, 'little')
+
+
+def book_scopes(book_ids):
+    """{book id: {scopes it belongs in}} from the current counters and genres"""
+    scopes = {pk: set() for pk in book_ids}
+    available = Book.objects.filter(pk__in=book_ids, copies_available__gt=0)
+    for pk in available.values_list('pk', flat=True):
+        scopes[pk].add(ALL_BOOKS)
+    Through = Book.genre.through
+    for book_id, genre_id in Through.objects.filter(
+            book__in=available).values_list('book_id', 'genre_id'):
+        scopes[book_id].add(genre_id)
+    return scopes
+
+
+def sync_books(book_ids):
+    """Set the bits of ``book_ids`` in every scope to match the database"""
+    book_ids = {pk for pk in book_ids if pk is not None}
+    if not book_ids:
+        return
+    wanted = book_scopes(book_ids)
+    by_chunk = defaultdict(list)
+    for pk in book_ids:
+        by_chunk[pk // CHUNK_BITS].append(pk)
+
+    with transaction.atomic():
+        for chunk, pks in by_chunk.items():
+            needed = set().union(*(wanted[pk] for pk in pks))
+            existing = set(AvailabilityChunk.objects.filter(chunk=chunk).values_list(
+                'scope', flat=True))
+            for scope in needed - existing:
+                # syncing never deletes rows, so once created they can be locked below
+                AvailabilityChunk.objects.get_or_create(
+                    scope=scope, chunk=chunk, defaults={'bits': to_bytes(0)})
+            rows = list(AvailabilityChunk.objects.select_for_update().filter(
+                chunk=chunk).only('scope', 'bits'))
+            # a concurrent sync may have changed the books while we waited for the lock
+            wanted.update(book_scopes(pks))
+            for row in rows:
+                old = new = to_bits(row.bits)
+                for pk in pks:
+                    mask = 1 << (pk % CHUNK_BITS)
+                    new = new | mask if row.scope in wanted[pk] else new & ~mask
+                if new != old:
+                    AvailabilityChunk.objects.filter(pk=row.pk).update(bits=to_bytes(new))
+
+
+def copies_changed(book_id, available_delta):
+    """Keep the sets in step after copies_available of a book moved by ``available_delta``"""
+    if book_id is None or not available_delta:
+        return
+    available = Book.objects.filter(pk=book_id).values_list(
+        'copies_available', flat=True).first()
+    if available is None:
+        return
+    # only the first copy coming back or the last one going out changes the sets
+    if (available_delta > 0 and available == available_delta) or (
+            available_delta < 0 and available == 0):
+        transaction.on_commit(lambda: sync_books([book_id]))
+
+
+def drop_genre(genre_id):
+    AvailabilityChunk.objects.filter(scope=genre_id).delete()
+
+
+def compute_bitmaps():
+    """{(scope, chunk): bits} for every set, from Book.copies_available"""
+    bitmaps = defaultdict(int)
+    available = Book.objects.filter(copies_available__gt=0)
+    for pk in available.values_list('pk', flat=True).iterator():
+        bitmaps[ALL_BOOKS, pk // CHUNK_BITS] |= 1 << (pk % CHUNK_BITS)
+    Through = Book.genre.through
+    for book_id, genre_id in Through.objects.filter(book__in=available).values_list(
+            'book_id', 'genre_id').iterator():
+        bitmaps[genre_id, book_id // CHUNK_BITS] |= 1 << (book_id % CHUNK_BITS)
+    return bitmaps
+
+
+def stored_bitmaps():
+    return {(scope, chunk): to_bits(bits) for scope, chunk, bits in
+            AvailabilityChunk.objects.values_list('scope', 'chunk', 'bits').iterator()}
+
+
+def rebuild():
+    """Replace every stored set with one computed from the counters, returns the chunk count"""
+    bitmaps = compute_bitmaps()
+    with transaction.atomic():
+        AvailabilityChunk.objects.all().delete()
+        AvailabilityChunk.objects.bulk_create(
+            [AvailabilityChunk(scope=scope, chunk=chunk, bits=to_bytes(bits))
+             for (scope, chunk), bits in bitmaps.items() if bits],
+            batch_size=500)
+    return len(bitmaps)
+
+
+def set_bits(bits):
+    """Positions of the set bits of a chunk, lowest first"""
+    return [index * 8 + bit for index, byte in enumerate(to_bytes(bits)) if byte
+            for bit in range(8) if byte >> bit & 1]
+
+
+class AvailableBooks:
+    """Ids of available books in every one of ``genre_ids``, all available books if none"""
+
+    def __init__(self, genre_ids=()):
+        self.scopes = sorted({int(pk) for pk in genre_ids}) or [ALL_BOOKS]
+
+    def chunks(self, start, stop):
+        """{chunk: bits} of the intersection for start <= chunk < stop"""
+        found = defaultdict(dict)
+        for scope, chunk, bits in AvailabilityChunk.objects.filter(
+                scope__in=self.scopes, chunk__gte=start, chunk__lt=stop).values_list(
+                'scope', 'chunk', 'bits'):
+            found[chunk][scope] = to_bits(bits)
+        result = {}
+        for chunk, by_scope in found.items():
+            # a chunk missing from any scope has no books in the intersection
+            if len(by_scope) == len(self.scopes):
+                bits = -1
+                for value in by_scope.values():
+                    bits &= value
+                if bits:
+                    result[chunk] = bits
+        return result
+
+    def last_chunk(self):
+        return AvailabilityChunk.objects.filter(scope=self.scopes[0]).aggregate(
+            last=Max('chunk'))['last']
+
+    def after(self, book_id, limit):
+        """Up to ``limit`` ids greater than ``book_id`` (None for the start), ascending"""
+        last = self.last_chunk()
+        first_id = 0 if book_id is None else book_id + 1
+        start = first_id // CHUNK_BITS
+        ids = []
+        while last is not None and start <= last and len(ids) < limit:
+            chunks = self.chunks(start, start + CHUNKS_PER_QUERY)
+            for chunk in sorted(chunks):
+                base = chunk * CHUNK_BITS
+                ids += [base + n for n in set_bits(chunks[chunk]) if base + n >= first_id]
+            start += CHUNKS_PER_QUERY
+        return ids[:limit]
+
+    def before(self, book_id, limit):
+        """Up to ``limit`` ids less than ``book_id``, ascending"""
+        stop = book_id // CHUNK_BITS + 1
+        ids = []
+        while stop > 0 and len(ids) < limit:
+            start = max(stop - CHUNKS_PER_QUERY, 0)
+            chunks = self.chunks(start, stop)
+            found = []
+            for chunk in sorted(chunks):
+                base = chunk * CHUNK_BITS
+                found += [base + n for n in set_bits(chunks[chunk]) if base + n < book_id]
+            ids = found + ids
+            stop = start
+        return ids[-limit:] if limit else []
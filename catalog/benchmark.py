@@ -0,0 +1,250 @@
+"""Load testing the catalog pages and API over HTTP.
+
+Scenarios are the URL patterns of catalog/urls.py filled in with ids sampled
+evenly across the data, so the same data set (see ``generate_catalog``) always
+yields the same requests. ``run_scenario`` drives one with a pool of threads
+making plain HTTP requests, against the in-process ``serve()`` or any running
+deployment, and records latency, throughput and the ``X-Query-Count`` header
+set by QueryMetricsMiddleware. Results are plain dicts, saved as JSON
+baselines by ``manage.py benchmark_catalog`` and compared with ``compare``.
+"""
+import http.client
+import io
+import math
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.urls import reverse
+
+from .models import Author, Book, BookInstance, Review
+from .pagination import CursorPaginator
+from .views import BookListView
+
+Scenario = namedtuple('Scenario', 'name path authenticated')
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99 and mean of latencies in seconds, as milliseconds"""
+    ordered = sorted(latencies)
+    summary = {f'p{pct}_ms': percentile(ordered, pct) * 1000 for pct in (50, 95, 99)}
+    summary['mean_ms'] = sum(ordered) / len(ordered) * 1000
+    return summary
+
+
+def sample_ids(queryset, count):
+    """``count`` primary keys spread evenly over ``queryset`` in pk order"""
+    total = queryset.count()
+    if not total:
+        return []
+    step = max(total // count, 1)
+    return [queryset.order_by('pk').values_list('pk', flat=True)[offset]
+            for offset in range(step // 2, total, step)][:count]
+
+
+def build_scenarios(samples=3, user=None):
+    """The requests to time, ``user`` adds the pages that need a login"""
+    scenarios = [
+        Scenario('index', reverse('index'), False),
+        Scenario('books', reverse('books'), False),
+        Scenario('books-by-rating', f'{reverse("books")}?orderby=rating', False),
+        Scenario('authors', reverse('authors'), False),
+        Scenario('api-books', reverse('api-books'), False),
+        Scenario('api-authors', reverse('api-authors'), False),
+    ]
+    paginator = CursorPaginator(
+        Book.objects.all(), BookListView.paginate_by, BookListView.cursor_ordering)
+    cursor = paginator.page().next_cursor
+    if cursor:
+        scenarios.append(Scenario('books-page-2', f'{reverse("books")}?cursor={cursor}', False))
+
+    book_ids = sample_ids(Book.objects.all(), samples)
+    if book_ids:
+        word = (Book.objects.values_list('title', flat=True).get(pk=book_ids[0]).split() or ['a'])[0]
+        scenarios += [
+            Scenario('books-search', f'{reverse("books")}?filter={word.lower()}', False),
+            Scenario('book-suggest', f'{reverse("book-suggest")}?q={word[:3].lower()}', False),
+            Scenario('api-books-batch',
+                     f'{reverse("api-books")}?ids={",".join(map(str, book_ids))}', False),
+        ]
+    for i, pk in enumerate(book_ids):
+        scenarios += [
+            Scenario(f'book-detail-{i}', reverse('book-detail', args=[pk]), False),
+            Scenario(f'book-reviews-{i}', reverse('book-reviews', args=[pk]), False),
+            Scenario(f'api-book-{i}', reverse('api-book', args=[pk]), False),
+            Scenario(f'api-book-reviews-{i}', reverse('api-book-reviews', args=[pk]), False),
+        ]
+    for i, pk in enumerate(sample_ids(Author.objects.all(), samples)):
+        scenarios.append(Scenario(f'author-detail-{i}', reverse('author-detail', args=[pk]), False))
+
+    if user is not None:
+        scenarios.append(Scenario('my-borrowed', reverse('my-borrowed'), True))
+        if user.has_perm('catalog.can_add_edit'):
+            scenarios.append(Scenario('all-loaned', reverse('all-loaned'), True))
+    return scenarios
+
+
+def default_paths():
+    """The catalog read pages, one sample of each, for the in-process benchmarks"""
+    paths = [reverse('index'), reverse('books'), reverse('authors')]
+    book = Book.objects.order_by('pk').values_list('pk', flat=True).first()
+    author = Author.objects.order_by('pk').values_list('pk', flat=True).first()
+    if book is not None:
+        paths.append(reverse('book-detail', args=[book]))
+    if author is not None:
+        paths.append(reverse('author-detail', args=[author]))
+    return paths
+
+
+def default_user():
+    """The borrower with the first checked out copy, for the pages that need a login"""
+    borrower = (BookInstance.objects.filter(status='o', borrower__isnull=False)
+                .order_by('pk').values_list('borrower', flat=True).first())
+    return User.objects.filter(pk=borrower).first() if borrower else None
+
+
+def login_cookie(user):
+    """Cookie header for a new session logged in as ``user``"""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve():
+    """Start the WSGI application on a free local port, returns (server, base url)"""
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def fetch(base_url, path, cookie=''):
+    """(seconds, status, query count or None) for one GET"""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+    headers = {'Cookie': cookie} if cookie else {}
+    start = time.perf_counter()
+    try:
+        conn.request('GET', url.path.rstrip('/') + path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    queries = response.getheader('X-Query-Count')
+    return elapsed, response.status, int(queries) if queries is not None else None
+
+
+def wsgi_get(application, path, host, cookie=''):
+    """(seconds, status) for one GET handled by a WSGI ``application`` in-process"""
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SCRIPT_NAME': '', 'SERVER_NAME': host, 'SERVER_PORT': '80',
+        'HTTP_HOST': host, 'HTTP_COOKIE': cookie, 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    start = time.perf_counter()
+    response = application(environ, lambda code, headers: status.append(int(code[:3])))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return time.perf_counter() - start, status[0]
+
+
+def run_scenario(base_url, scenario, requests, concurrency, warmup=0, cookie=''):
+    """Time ``requests`` GETs of one scenario, ``concurrency`` at a time"""
+    for _ in range(warmup):
+        fetch(base_url, scenario.path, cookie)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: fetch(base_url, scenario.path, cookie), range(requests)))
+    elapsed = time.perf_counter() - started
+
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'name': scenario.name,
+        'path': scenario.path,
+        'requests': requests,
+        'errors': sum(1 for _, status, _ in results if status >= 400),
+        'rps': requests / elapsed if elapsed else 0.0,
+        **latency_summary([seconds for seconds, _, _ in results]),
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """What a result was measured against, stored alongside it"""
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'rows': {
+            'books': Book.objects.count(),
+            'copies': BookInstance.objects.count(),
+            'reviews': Review.objects.count(),
+            'authors': Author.objects.count(),
+            'users': User.objects.count(),
+        },
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """Lines comparing two results by scenario, and whether any got worse than ``threshold``"""
+    before = {result['name']: result for result in baseline['scenarios']}
+    lines, regressed = [], False
+    for result in current['scenarios']:
+        old = before.get(result['name'])
+        if old is None:
+            lines.append(f'{result["name"]}: new scenario')
+            continue
+        p95 = result['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+        rps = result['rps'] / old['rps'] - 1 if old['rps'] else 0.0
+        queries_grew = (result['queries_per_request'] or 0) > (old['queries_per_request'] or 0)
+        worse = p95 > threshold or rps < -threshold or queries_grew
+        regressed |= worse
+        lines.append(
+            f'{result["name"]}: p95 {old["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms ({p95:+.0%}), '
+            f'{old["rps"]:.1f} -> {result["rps"]:.1f} req/s ({rps:+.0%}), '
+            f'queries {old["queries_per_request"]} -> {result["queries_per_request"]}'
+            + ('  REGRESSION' if worse else ''))
+    return lines, regressed
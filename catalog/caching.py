@@ -0,0 +1,133 @@
+"""Versioned caching of rendered catalog pages and fragments.
+
+Cache keys embed the current version of every scope the content depends on,
+e.g. ``books`` for anything shown on the book list, ``book:<pk>`` for a book's
+detail body and ``author:<pk>`` for an author page. Signals in
+``catalog.signals`` bump the versions when rows change, so stale entries are
+never read again and simply age out of the backend.
+
+Content is only cached when it was read from the primary: a replica
+(catalog.replicas) may still return rows from before a bump. Page cache
+misses render inside ``primary_reads()``, and so should code filling the
+cache itself. Fragments rendered from replica reads aren't stored.
+
+Versions live in the same cache as the content. A missing version is
+replaced with a fresh ``time_ns()`` value rather than restarting at 1, so an
+evicted version can't bring back old entries.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from .replicas import current_read_alias, primary_reads
+
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def cache_timeout(from_primary=False):
+    """Seconds to keep catalog content, 0 (don't store it) if it was read from a replica"""
+    if current_read_alias() is not None and not from_primary:
+        return 0
+    return settings.CATALOG_CACHE_TIMEOUT
+
+
+def _version_key(scope):
+    return f'catalog:v:{scope}'
+
+
+def get_versions(*scopes):
+    """{scope: version} for ``scopes`` in a single cache round trip"""
+    cache = catalog_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    missing = {}
+    for scope, key in keys.items():
+        if key in found:
+            versions[scope] = found[key]
+        else:
+            versions[scope] = missing[key] = time.time_ns()
+    if missing:
+        cache.set_many(missing, None)
+    return versions
+
+
+def version_tag(*scopes):
+    """Short string identifying the current versions of ``scopes``, for cache keys"""
+    versions = get_versions(*scopes)
+    return '.'.join(str(versions[scope]) for scope in scopes)
+
+
+def _bump(scopes):
+    now = time.time_ns()
+    catalog_cache().set_many(
+        {_version_key(scope): now for scope in scopes}, None)
+
+
+def invalidate(*scopes):
+    """Bump ``scopes`` now and again once the surrounding transaction commits.
+
+    The second bump covers a reader that cached pre-commit data under the new
+    version in between.
+    """
+    scopes = [scope for scope in scopes if scope]
+    if not scopes:
+        return
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def book_scopes(*book_ids):
+    """Scopes to invalidate when something shown for these books changes"""
+    return ['books'] + [f'book:{pk}' for pk in set(book_ids) if pk is not None]
+
+
+def is_cacheable(request):
+    """Anonymous GETs without a session can share one rendered page"""
+    return (request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+class CachedPageMixin:
+    """Serve anonymous traffic for a view from the catalog cache.
+
+    ``get_cache_scopes`` names what the page shows; only use this on pages
+    without per-visitor content such as CSRF tokens.
+    """
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.kwargs = kwargs
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f'catalog:page:{path}:{version_tag(*self.get_cache_scopes())}'
+        cache = catalog_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Catalog-Cache'] = 'hit'
+            return response
+
+        # render now, from the primary, the page is stored under the current versions
+        with primary_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+                def store(rendered):
+                    cache.set(key, (rendered.content, rendered['Content-Type']),
+                              cache_timeout(from_primary=True))
+                response.add_post_render_callback(store)
+                response['X-Catalog-Cache'] = 'miss'
+                response.render()
+        return response
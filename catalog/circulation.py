@@ -0,0 +1,190 @@
+"""Reservations, checkouts and returns of BookInstance copies.
+
+Copies are claimed with a compare-and-set ``UPDATE ... WHERE status = 'a'``,
+so two requests can never both get the same copy, on any database. On
+backends that support it the candidates are also read with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent requests for a popular
+title pick different copies instead of queueing behind each other's locks.
+
+Readers who find no copy wait in a FIFO ``Hold`` queue per book. A returned
+copy goes to the oldest waiting hold, which then has HOLD_PICKUP_PERIOD to
+check it out. So does a copy that becomes available any other way (a new
+copy, an admin edit), through ``offer_copy`` in the BookInstance signals.
+
+These functions change copies with queryset updates, which skip the model
+signals, so they adjust the Book counters, availability sets and cache
+versions themselves. Each change is also recorded in the loan ledger
+(catalog.ledger), in the same transaction.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import availability, ledger
+from .caching import book_scopes, invalidate
+from .models import Book, BookInstance, Hold
+
+LOAN_PERIOD = timedelta(days=21)
+HOLD_PICKUP_PERIOD = timedelta(days=3)
+
+
+class CirculationError(Exception):
+    """A reservation, checkout or return that can't be done"""
+
+
+def _status_changed(book_id, old_status, new_status):
+    delta = int(new_status == 'a') - int(old_status == 'a')
+    Book.objects.adjust_counters(book_id, copies_available=delta)
+    availability.copies_changed(book_id, delta)
+    invalidate(*book_scopes(book_id))
+
+
+def _set_status(instance_id, book_id, old_status, new_status, **changes):
+    """Compare-and-set the status of one copy, False if someone else changed it first"""
+    updated = BookInstance.objects.filter(pk=instance_id, status=old_status).update(
+        status=new_status, updated_at=timezone.now(), **changes)
+    if updated:
+        _status_changed(book_id, old_status, new_status)
+    return bool(updated)
+
+
+def _locked(queryset):
+    """Row-lock ``queryset`` skipping rows other transactions hold, where supported"""
+    if connection.features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True)
+    return queryset
+
+
+def claim_copy(book, user, status, due_back=None):
+    """Atomically take one available copy of ``book`` for ``user``, None if there is none"""
+    # with SKIP LOCKED every candidate we see is ours, otherwise read a few and race for them
+    batch = 1 if connection.features.has_select_for_update_skip_locked else 10
+    with transaction.atomic():
+        while True:
+            candidates = list(_locked(BookInstance.objects.filter(
+                book=book, status='a').order_by('pk')).values_list('pk', flat=True)[:batch])
+            if not candidates:
+                return None
+            for pk in candidates:
+                if _set_status(pk, book.pk, 'a', status, borrower=user, due_back=due_back):
+                    return BookInstance.objects.get(pk=pk)
+
+
+def _next_waiting_hold(book_id):
+    return _locked(Hold.objects.filter(book_id=book_id, status='w')
+                   .order_by('created_at', 'id')).first()
+
+
+def _pass_on(instance, old_status):
+    """Give a copy coming back to the oldest waiting hold, or make it available"""
+    while True:
+        hold = _next_waiting_hold(instance.book_id)
+        if hold is None:
+            if old_status != 'a' and not _set_status(instance.pk, instance.book_id, old_status, 'a',
+                               borrower=None, due_back=None):
+                raise CirculationError(f'{instance} was changed while it was passed on')
+            return None
+        # claim the hold first so a concurrent return can't give it a second copy
+        if Hold.objects.filter(pk=hold.pk, status='w').update(
+                status='y', instance=instance,
+                expires_at=timezone.now() + HOLD_PICKUP_PERIOD):
+            # raising rolls the hold back with everything else the caller wrote
+            if not _set_status(instance.pk, instance.book_id, old_status, 'r',
+                               borrower=hold.user_id, due_back=None):
+                raise CirculationError(f'{instance} was changed while it was passed on')
+            return hold
+
+
+def offer_copy(instance):
+    """Give a copy made available outside circulation to the oldest waiting hold, if any"""
+    if not Hold.objects.filter(book_id=instance.book_id, status='w').exists():
+        return None
+    with transaction.atomic():
+        if not BookInstance.objects.select_for_update().filter(
+                pk=instance.pk, status='a').exists():
+            return None
+        return _pass_on(instance, 'a')
+
+
+def reserve(book, user):
+    """Put ``user`` in the queue for ``book``, setting a copy aside right away if one is free"""
+    with transaction.atomic():
+        if Hold.objects.filter(book=book, user=user, status__in=Hold.ACTIVE_STATUSES).exists():
+            raise CirculationError(f'You already have a hold on {book}')
+        hold = Hold.objects.create(book=book, user=user)
+        # don't jump the queue, free copies go to earlier holds first
+        if not Hold.objects.filter(book=book, status='w', created_at__lt=hold.created_at).exists():
+            instance = claim_copy(book, user, 'r')
+            if instance is not None:
+                hold.status = 'y'
+                hold.instance = instance
+                hold.expires_at = timezone.now() + HOLD_PICKUP_PERIOD
+                hold.save(update_fields=['status', 'instance', 'expires_at'])
+        ledger.record(ledger.RESERVED, book.pk, user.pk, hold.instance_id)
+        return hold
+
+
+def checkout(book, user, due_back=None):
+    """Lend a copy of ``book`` to ``user``: the one held for them, or any free copy"""
+    due_back = due_back or (timezone.localdate() + LOAN_PERIOD)
+    with transaction.atomic():
+        hold = Hold.objects.filter(book=book, user=user, status='y').first()
+        # take the hold before the copy, in the same order as cancel_hold
+        if hold is not None and hold.instance_id and Hold.objects.filter(
+                pk=hold.pk, status='y').update(status='f'):
+            if not _set_status(hold.instance_id, book.pk, 'r', 'o',
+                               borrower=user, due_back=due_back):
+                raise CirculationError(f'The copy of {book} held for you has been changed')
+            ledger.record(ledger.CHECKED_OUT, book.pk, user.pk, hold.instance_id, due_back)
+            return BookInstance.objects.get(pk=hold.instance_id)
+        # free copies go to the queue first, but its head may take one
+        waiting = Hold.objects.filter(book=book, status='w').order_by('created_at', 'id').first()
+        if waiting is not None and waiting.user_id != user.pk:
+            raise CirculationError(f'Copies of {book} are held for readers in the queue')
+        instance = claim_copy(book, user, 'o', due_back=due_back)
+        if instance is None:
+            raise CirculationError(f'No copy of {book} is available')
+        if waiting is not None and not Hold.objects.filter(pk=waiting.pk, status='w').update(
+                status='f', instance=instance):
+            raise CirculationError(f'Your hold on {book} has changed, please try again')
+        ledger.record(ledger.CHECKED_OUT, book.pk, user.pk, instance.pk, due_back)
+        return instance
+
+
+def return_copy(instance):
+    """Check a lent copy back in, returns the hold it was passed on to if any"""
+    with transaction.atomic():
+        # the lock keeps a concurrent return or cancel from passing the copy on twice
+        borrower = list(BookInstance.objects.select_for_update().filter(
+            pk=instance.pk, status='o').values_list('borrower_id', flat=True))
+        if not borrower:
+            raise CirculationError(f'{instance} is not checked out')
+        ledger.record(ledger.RETURNED, instance.book_id, borrower[0], instance.pk)
+        return _pass_on(instance, 'o')
+
+
+def cancel_hold(hold, status='c'):
+    """Cancel (or expire) a hold, passing its set-aside copy on to the next in line"""
+    with transaction.atomic():
+        active = Hold.objects.filter(pk=hold.pk, status__in=Hold.ACTIVE_STATUSES)
+        if not active.update(status=status):
+            raise CirculationError('The hold is no longer active')
+        ledger.record(status, hold.book_id, hold.user_id, hold.instance_id)
+        instance = hold.instance_id and BookInstance.objects.select_for_update().filter(
+            pk=hold.instance_id, status='r', borrower=hold.user_id).first()
+        if instance:
+            _pass_on(instance, 'r')
+
+
+def expire_holds(now=None):
+    """Expire ready holds nobody picked up in time, returns how many"""
+    now = now or timezone.now()
+    expired = 0
+    for hold in Hold.objects.filter(status='y', expires_at__lt=now).order_by('expires_at'):
+        try:
+            cancel_hold(hold, status='e')
+        except CirculationError:
+            continue
+        expired += 1
+    return expired
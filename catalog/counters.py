@@ -0,0 +1,78 @@
+"""Hit counters that don't write to the database on every hit.
+
+``hit`` increments a pending count in the catalog cache. The flush-counters
+job (catalog.jobs) adds the pending counts to their SiteCounter rows, one
+UPDATE per counter per run. ``total`` is the stored plus the pending count
+and, once the stored value is cached, costs no query.
+
+Pending hits live only in the cache. The web and job processes need a shared
+cache for them to reach the database (memcached, redis or file-based, see
+CATALOG_CACHE_BACKEND). Hits still pending when the cache is cleared or
+evicts them are lost, so these counts are approximate.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .caching import catalog_cache
+from .models import SiteCounter
+from .replicas import primary_reads
+
+HOME_VISITS = 'home-visits'
+COUNTERS = (HOME_VISITS,)
+
+
+def pending_key(name):
+    return f'catalog:counter:{name}:pending'
+
+
+def stored_key(name):
+    return f'catalog:counter:{name}:stored'
+
+
+def hit(name, count=1):
+    cache = catalog_cache()
+    key = pending_key(name)
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        # the first hit since a flush or eviction; add() loses no concurrent hit
+        if not cache.add(key, count, timeout=None):
+            cache.incr(key, count)
+
+
+def pending(name):
+    return catalog_cache().get(pending_key(name)) or 0
+
+
+def stored(name):
+    cache = catalog_cache()
+    value = cache.get(stored_key(name))
+    if value is None:
+        with primary_reads():
+            value = SiteCounter.objects.filter(name=name).values_list(
+                'value', flat=True).first() or 0
+        cache.set(stored_key(name), value, None)
+    return value
+
+
+def total(name):
+    return stored(name) + pending(name)
+
+
+def flush(names=COUNTERS):
+    """Add the pending counts to the database, returns {name: hits flushed}"""
+    cache = catalog_cache()
+    flushed = {}
+    for name in names:
+        count = pending(name)
+        if not count:
+            continue
+        with transaction.atomic():
+            if not SiteCounter.objects.filter(name=name).update(value=F('value') + count):
+                SiteCounter.objects.create(name=name, value=count)
+            value = SiteCounter.objects.get(name=name).value
+        # hits counted since we read the pending count stay pending
+        cache.decr(pending_key(name), count)
+        cache.set(stored_key(name), value, None)
+        flushed[name] = count
+    return flushed
@@ -0,0 +1,123 @@
+"""Resized and recompressed derivatives of ``Book.cover_img``.
+
+Each cover gets JPEG and WebP variants at a few widths, stored next to the
+originals under ``book_covers/derived/<variant>/``, and served as plain
+files from MEDIA_ROOT.
+
+Saving a new cover sets ``Book.cover_variants`` to None, and the
+build-cover-variants job (catalog.jobs) builds the variants of those books,
+then records whether it could. ``manage.py build_cover_variants`` rebuilds
+them all. Pages never touch the storage: the cover_picture tag links the
+variants once they are recorded as built, and the original image until then
+or when the source couldn't be read.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .caching import book_scopes, invalidate
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'book_covers/derived'
+# covers built per job run
+BUILD_BATCH_SIZE = 50
+
+# name -> bounding box, the list card shows covers ~200px wide and the detail page 300px
+VARIANTS = {
+    'thumb': (200, 300),
+    'medium': (300, 450),
+    'large': (600, 900),
+}
+
+FORMATS = {
+    'jpeg': {'ext': 'jpg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+    'webp': {'ext': 'webp', 'options': {'quality': 78, 'method': 6}},
+}
+
+
+def variant_name(source_name, variant, fmt):
+    """Storage name of one derivative of ``source_name``"""
+    base = posixpath.basename(source_name)
+    return f'{DERIVED_DIR}/{variant}/{base}.{FORMATS[fmt]["ext"]}'
+
+
+def render_variant(image, variant, fmt):
+    """Encoded bytes of ``image`` shrunk to fit the variant's box (never enlarged)"""
+    resized = image.copy()
+    resized.thumbnail(VARIANTS[variant], Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, fmt.upper(), **FORMATS[fmt]['options'])
+    return buffer.getvalue()
+
+
+def open_cover(source_name, storage=default_storage):
+    with storage.open(source_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+
+def build_variants(source_name, force=False, storage=default_storage):
+    """Write every missing variant of one cover, returns how many, None if it can't be read"""
+    missing = [(variant, fmt) for variant in VARIANTS for fmt in FORMATS
+               if force or not storage.exists(variant_name(source_name, variant, fmt))]
+    if not missing:
+        return 0
+    try:
+        image = open_cover(source_name, storage)
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Could not read cover image %s', source_name)
+        return None
+    for variant, fmt in missing:
+        name = variant_name(source_name, variant, fmt)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(render_variant(image, variant, fmt)))
+    return len(missing)
+
+
+def build_cover(pk, name, force=False, storage=default_storage):
+    """Build one book's cover variants and record on the book whether that worked.
+
+    Returns how many variants were written, None if the cover couldn't be used.
+    """
+    try:
+        written = build_variants(name, force=force, storage=storage) if name else None
+    except Exception:
+        # a decompression bomb or an encoder error mustn't stop the covers after it
+        logger.exception('Could not build the variants of cover %s', name)
+        written = None
+    ok = written is not None
+    # a cover replaced while we built is left to the next run
+    if Book.objects.filter(pk=pk, cover_img=name).exclude(cover_variants=ok).update(
+            cover_variants=ok):
+        invalidate(*book_scopes(pk))
+    return written
+
+
+def build_pending(limit=BUILD_BATCH_SIZE, storage=default_storage):
+    """Build the variants of up to ``limit`` new covers, returns (built, unreadable)"""
+    pending = list(Book.objects.filter(cover_variants__isnull=True).order_by('pk')
+                   .values_list('pk', 'cover_img')[:limit])
+    built = unreadable = 0
+    for pk, name in pending:
+        if build_cover(pk, name, storage=storage) is None:
+            unreadable += 1
+        else:
+            built += 1
+    return built, unreadable
+
+
+def variant_urls(cover, storage=default_storage):
+    """{fmt: {variant: url}} of a cover whose variants have been built"""
+    return {fmt: {variant: storage.url(variant_name(cover.name, variant, fmt))
+                  for variant in VARIANTS}
+            for fmt in FORMATS}
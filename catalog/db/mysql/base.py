@@ -0,0 +1,8 @@
+"""Django's MySQL backend with connection pooling, see catalog.db.pool"""
+from django.db.backends.mysql import base
+
+from ..pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,172 @@
+"""A per-process pool of database connections for Django's own backends.
+
+Django 3.2 either opens a connection per request or keeps one per thread
+(CONN_MAX_AGE). The catalog.db engines wrap the MySQL and SQLite backends so
+that closing a connection returns it to a shared pool instead, and the next
+request on any thread takes it back without a new TCP and auth handshake.
+With CONN_MAX_AGE = 0 a request holds a connection only while it runs, so a
+process needs at most as many as it serves requests at once. That matters
+under ASGI, where the executor behind catalog.async_views has far more
+threads than requests in flight.
+
+The ``POOL`` entry of a database's settings configures it:
+
+    'POOL': {
+        'MAX_SIZE': 10,         # idle connections kept, 0 turns pooling off
+        'MAX_AGE': 300,         # seconds before a connection is recycled
+        'HEALTH_CHECKS': True,  # SELECT 1 before reusing a connection
+    }
+
+A connection is only pooled after a clean close: outside a transaction and
+with no database error seen. Pools are per process, per alias and per set of
+connection parameters. A forked child gets its own pool and never reuses its
+parent's connections. When an alias's parameters change (the test runner
+renaming NAME, a settings change at runtime), the alias gets a new pool and
+the old one's idle connections are closed.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_POOL = {'MAX_SIZE': 10, 'MAX_AGE': 300, 'HEALTH_CHECKS': True}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Idle connections with the time each was opened, newest returned first"""
+
+    def __init__(self, max_size, max_age):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.opened = self.reused = 0
+
+    def take(self):
+        """(connection, opened at) of an idle connection, None if there is none"""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                raw, opened_at = self.idle.pop()
+            if time.monotonic() - opened_at < self.max_age:
+                return raw, opened_at
+            close_quietly(raw)
+
+    def give_back(self, raw, opened_at):
+        """Keep ``raw`` for reuse, False if it is too old or the pool is full"""
+        if time.monotonic() - opened_at >= self.max_age:
+            return False
+        with self.lock:
+            if len(self.idle) >= self.max_size:
+                return False
+            self.idle.append((raw, opened_at))
+        return True
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for raw, _ in idle:
+            close_quietly(raw)
+
+
+def close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+def pool_settings(settings_dict):
+    return {**DEFAULT_POOL, **(settings_dict.get('POOL') or {})}
+
+
+def pool_key(alias, conn_params):
+    """Pool key for connections of ``alias`` opened with ``conn_params`` in this process"""
+    return os.getpid(), alias, repr(sorted(conn_params.items()))
+
+
+def get_pool(key, settings_dict, create=True):
+    """The pool for ``key``, None when pooling is off or, unless ``create``, it is gone"""
+    options = pool_settings(settings_dict)
+    if not options['MAX_SIZE']:
+        return None
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None and create:
+            # the alias points somewhere else now, its old connections are no use
+            for stale in [other for other in _pools if other[:2] == key[:2]]:
+                _pools.pop(stale).clear()
+            pool = _pools[key] = ConnectionPool(options['MAX_SIZE'], options['MAX_AGE'])
+    if pool is not None:
+        # settings changed at runtime (tests, benchmark_connections) apply from now on
+        pool.max_size, pool.max_age = options['MAX_SIZE'], options['MAX_AGE']
+    return pool
+
+
+class PooledConnectionMixin:
+    """DatabaseWrapper mixin taking connections from, and returning them to, a ConnectionPool"""
+    pooled_opened_at = None
+    # pool key of the current connection, it goes back to that pool only
+    pooled_key = None
+    # whether the current connection came out of the pool
+    reused = False
+
+    @property
+    def pool(self):
+        """The pool for the current settings"""
+        if not self.can_pool():
+            return None
+        return get_pool(pool_key(self.alias, self.get_connection_params()), self.settings_dict)
+
+    def can_pool(self):
+        return True
+
+    def get_new_connection(self, conn_params):
+        self.pooled_key = pool_key(self.alias, conn_params) if self.can_pool() else None
+        pool = self.pooled_key and get_pool(self.pooled_key, self.settings_dict)
+        while pool is not None:
+            idle = pool.take()
+            if idle is None:
+                break
+            raw, opened_at = idle
+            if pool_settings(self.settings_dict)['HEALTH_CHECKS'] and not self.healthy(raw):
+                close_quietly(raw)
+                continue
+            pool.reused += 1
+            self.pooled_opened_at, self.reused = opened_at, True
+            return raw
+        raw = super().get_new_connection(conn_params)
+        if pool is not None:
+            pool.opened += 1
+        self.pooled_opened_at, self.reused = time.monotonic(), False
+        return raw
+
+    def healthy(self, raw):
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _close(self):
+        pool = self.pooled_key and get_pool(self.pooled_key, self.settings_dict, create=False)
+        if (pool is not None and self.connection is not None and not self.in_atomic_block
+                and not self.errors_occurred and self.pooled_opened_at is not None):
+            try:
+                # leave nothing uncommitted for the next borrower
+                self.connection.rollback()
+            except Exception:
+                pass
+            else:
+                if pool.give_back(self.connection, self.pooled_opened_at):
+                    return None
+        return super()._close()
@@ -0,0 +1,13 @@
+"""Django's SQLite backend with connection pooling, see catalog.db.pool.
+
+A stand-in for the MySQL engine in tests and benchmarks. In-memory databases
+are never pooled: each connection to one is a different database.
+"""
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    def can_pool(self):
+        return not self.is_in_memory_db()
@@ -1,15 +1,16 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
-from .models import Review
+from .models import ReviewSubmission
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
 
 class ReviewForm(forms.ModelForm):
+    """A reader's review, the book comes from the URL and the writer from the login"""
     class Meta:
-        model = Review
-        fields = '__all__'
+        model = ReviewSubmission
+        fields = ['stars', 'body']
 
 
 class RegisterForm(UserCreationForm):
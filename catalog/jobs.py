@@ -0,0 +1,137 @@
+"""Periodic maintenance run outside requests, with no message broker.
+
+Each entry of ``settings.CATALOG_JOBS`` (name: (dotted path of a callable,
+seconds between runs)) has a Job row recording when it is next due.
+``manage.py run_jobs`` claims due jobs in batches and runs them, inline or on
+a process pool. A claim is a compare-and-set UPDATE that pushes next_run_at a
+LEASE ahead. Where the database supports it, the candidates are first read
+with ``SELECT ... FOR UPDATE SKIP LOCKED``. Any number of workers can poll
+the table this way and each due job still runs once. If a worker dies
+mid-run, the job is retried when its lease runs out.
+
+Job callables take no arguments. Whatever they return is stored as text in
+Job.last_result, where the admin shows it.
+"""
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import availability, circulation, counters, covers, ledger, reviews, sessions
+from .models import Job
+
+BATCH_SIZE = 10
+LEASE = timedelta(hours=1)
+LEDGER_KEEP = timedelta(days=180)
+
+
+def configured_jobs():
+    """{name: (callable path, interval)} from settings.CATALOG_JOBS"""
+    return {name: (path, timedelta(seconds=seconds))
+            for name, (path, seconds) in settings.CATALOG_JOBS.items()}
+
+
+def sync_jobs():
+    """Add rows for newly configured jobs, due now, and keep intervals in step"""
+    jobs = configured_jobs()
+    existing = dict(Job.objects.values_list('name', 'interval'))
+    Job.objects.bulk_create([Job(name=name, interval=interval)
+                             for name, (path, interval) in jobs.items() if name not in existing],
+                            ignore_conflicts=True)
+    for name, (path, interval) in jobs.items():
+        if name in existing and existing[name] != interval:
+            Job.objects.filter(name=name).update(interval=interval)
+
+
+def claim_due(limit=BATCH_SIZE, now=None):
+    """Names of up to ``limit`` due jobs, leased to this worker, most overdue first"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = Job.objects.filter(name__in=list(settings.CATALOG_JOBS),
+                                 next_run_at__lte=now).order_by('next_run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        claimed = []
+        for pk, name, next_run_at in due.values_list('pk', 'name', 'next_run_at')[:limit]:
+            # another worker may have claimed it since we read it
+            if Job.objects.filter(pk=pk, next_run_at=next_run_at).update(
+                    next_run_at=now + LEASE, last_started_at=now):
+                claimed.append(name)
+    return claimed
+
+
+def run_job(name):
+    """Run one claimed job and record how it went, returns (name, status, result)"""
+    path, interval = configured_jobs()[name]
+    try:
+        result, status = import_string(path)(), 'ok'
+    except Exception:
+        result, status = traceback.format_exc(), 'failed'
+    result = '' if result is None else str(result)
+    finished = timezone.now()
+    # a failed job waits for its next turn rather than retrying in a tight loop
+    Job.objects.filter(name=name).update(
+        next_run_at=finished + interval, last_finished_at=finished,
+        last_status=status, last_result=result)
+    return name, status, result
+
+
+def process_pool(workers):
+    """Executor for run_due whose worker processes open their own connections"""
+    return ProcessPoolExecutor(workers, initializer=django.setup)
+
+
+def run_due(limit=BATCH_SIZE, executor=None):
+    """Claim a batch of due jobs and run them, returns [(name, status, result)]"""
+    names = claim_due(limit)
+    if executor is None or not names:
+        return [run_job(name) for name in names]
+    # forked workers must not inherit this process's open connections
+    connections.close_all()
+    return list(executor.map(run_job, names))
+
+
+def expire_holds():
+    return f'{circulation.expire_holds()} holds expired'
+
+
+def process_reviews():
+    result = reviews.drain()
+    return (f'{result.applied} reviews applied, {result.held} held, '
+            f'{result.rejected} rejected')
+
+
+def reconcile_counters():
+    """Repair stored Book and Author counters, then the availability sets built on them"""
+    out = StringIO()
+    call_command('rebuild_book_counters', stdout=out)
+    chunks = availability.rebuild()
+    return f'{out.getvalue().strip()}; {chunks} availability chunks rebuilt'
+
+
+def prune_sessions():
+    if not sessions.stores_rows():
+        return f'{settings.SESSION_ENGINE} keeps no session rows to prune'
+    return f'{sessions.clear_expired()} expired sessions deleted'
+
+
+def flush_counters():
+    flushed = counters.flush()
+    return ', '.join(f'{count} {name}' for name, count in flushed.items()) or 'Nothing to flush'
+
+
+def compact_loan_ledger():
+    moved = ledger.compact(timezone.now() - LEDGER_KEEP)
+    return f'{moved} loan events archived'
+
+
+def build_cover_variants():
+    built, unreadable = covers.build_pending()
+    return f'{built} covers built, {unreadable} unreadable'
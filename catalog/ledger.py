@@ -0,0 +1,106 @@
+"""Append-only ledger of loan events: holds placed, checkouts, returns, and
+holds cancelled or expired.
+
+catalog.circulation records an event in the same transaction as each change
+it makes, so BookInstance only has to hold the current state of a copy.
+Recent events live in LoanEvent. ``compact`` (``manage.py
+compact_loan_ledger``) moves older ones to ArchivedLoanEvent in batches,
+counting them into LoanRollup per book, kind and month on the way. The hot
+table then holds a few months of events however long the library has run,
+and monthly figures never scan the archive.
+
+Histories are read from both tables at once with MergedCursorPaginator, each
+side served by its (user, occurred_at) or (book, occurred_at) index.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedLoanEvent, LoanEvent, LoanRollup
+from .pagination import MergedCursorPaginator
+
+RESERVED, CHECKED_OUT, RETURNED, CANCELLED, EXPIRED = 'h', 'o', 'r', 'c', 'e'
+HISTORY_ORDERING = ('-occurred_at', '-id')
+COMPACT_BATCH_SIZE = 5000
+ROLLUP_CHUNK_SIZE = 500
+
+
+def record(kind, book_id, user_id=None, instance_id=None, due_back=None):
+    return LoanEvent.objects.create(kind=kind, book_id=book_id, user_id=user_id,
+                                    instance_id=instance_id, due_back=due_back)
+
+
+def user_history(user_id):
+    """The hot and archived events of a user, for history_paginator"""
+    return [model.objects.filter(user_id=user_id) for model in (LoanEvent, ArchivedLoanEvent)]
+
+
+def book_history(book_id):
+    return [model.objects.filter(book_id=book_id) for model in (LoanEvent, ArchivedLoanEvent)]
+
+
+def history_paginator(querysets, per_page):
+    """Newest first cursor pages over the tables of user_history or book_history"""
+    return MergedCursorPaginator(querysets, per_page, HISTORY_ORDERING)
+
+
+def month_of(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def monthly_counts(book_id, kind=CHECKED_OUT):
+    """[(first day of month, events)] for a book, oldest first, from the rollup and hot table"""
+    counts = Counter(dict(LoanRollup.objects.filter(book_id=book_id, kind=kind).values_list(
+        'month', 'count')))
+    for occurred_at in LoanEvent.objects.filter(book_id=book_id, kind=kind).values_list(
+            'occurred_at', flat=True):
+        counts[month_of(occurred_at)] += 1
+    return sorted(counts.items())
+
+
+def add_to_rollups(counts):
+    """Add {(month, book id, kind): n} to LoanRollup.
+
+    The existing rows are read a chunk of books at a time by plain IN lists
+    and matched here, a filter ORing every key would be too deep for SQLite.
+    """
+    book_ids = sorted({book_id for month, book_id, kind in counts})
+    months = sorted({month for month, book_id, kind in counts})
+    rollups = {}
+    for start in range(0, len(book_ids), ROLLUP_CHUNK_SIZE):
+        for rollup in LoanRollup.objects.filter(
+                book_id__in=book_ids[start:start + ROLLUP_CHUNK_SIZE], month__in=months):
+            key = (rollup.month, rollup.book_id, rollup.kind)
+            if key in counts:
+                rollups[key] = rollup
+    for key, rollup in rollups.items():
+        rollup.count = F('count') + counts[key]
+    LoanRollup.objects.bulk_update(rollups.values(), ['count'])
+    LoanRollup.objects.bulk_create(
+        [LoanRollup(month=month, book_id=book_id, kind=kind, count=n)
+         for (month, book_id, kind), n in counts.items() if (month, book_id, kind) not in rollups])
+
+
+def compact(before, batch_size=COMPACT_BATCH_SIZE):
+    """Move events older than ``before`` into the archive, returns how many were moved.
+
+    Run one compaction at a time; each batch is its own transaction, so an
+    interrupted run loses nothing and the next one carries on.
+    """
+    fields = [field.attname for field in LoanEvent._meta.concrete_fields]
+    moved = 0
+    while True:
+        with transaction.atomic():
+            events = list(LoanEvent.objects.filter(occurred_at__lt=before)
+                          .order_by('occurred_at', 'id')[:batch_size])
+            if not events:
+                return moved
+            ArchivedLoanEvent.objects.bulk_create(
+                [ArchivedLoanEvent(**{name: getattr(event, name) for name in fields})
+                 for event in events])
+            add_to_rollups(Counter(
+                (month_of(event.occurred_at), event.book_id, event.kind) for event in events))
+            LoanEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+        moved += len(events)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from catalog.benchmark import default_paths, latency_summary, wsgi_get
+
+MODES = ('wsgi', 'asgi')
+
+
+def summarize(mode, latencies, statuses, elapsed):
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status != 200),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        **latency_summary(latencies),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare the WSGI path (sync views on a thread pool) with the ASGI path '
+            '(catalog.async_views on an event loop) by driving each handler in-process')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Paths to request in turn, the catalog read pages by default')
+        parser.add_argument('--mode', choices=('both',) + MODES, default='both',
+                            help='both runs each mode in a fresh process, so each gets its own URLconf')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Requests in flight: WSGI threads, or ASGI tasks on one loop')
+        parser.add_argument('--bypass-cache', action='store_true',
+                            help='Send a session cookie so anonymous page caching is skipped')
+        parser.add_argument('--host', default=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            results = [self.run_child(mode, options) for mode in MODES]
+        else:
+            expected = options['mode'] == 'asgi'
+            if settings.CATALOG_ASYNC_VIEWS != expected:
+                raise CommandError(f'Run --mode {options["mode"]} with '
+                                   f'CATALOG_ASYNC_VIEWS={int(expected)}')
+            paths = options['paths'] or default_paths()
+            run = self.run_asgi if expected else self.run_wsgi
+            results = [run(paths, options)]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f'{"mode":<6}{"requests":>10}{"errors":>8}{"req/s":>10}'
+                          f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for result in results:
+            self.stdout.write(
+                f'{result["mode"]:<6}{result["requests"]:>10}{result["errors"]:>8}'
+                f'{result["rps"]:>10.1f}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                f'{result["p99_ms"]:>10.1f}')
+
+    def run_child(self, mode, options):
+        command = [sys.executable, sys.argv[0], 'benchmark_asgi', *options['paths'],
+                   '--mode', mode, '--json', '--host', options['host'],
+                   '--requests', str(options['requests']),
+                   '--concurrency', str(options['concurrency'])]
+        if options['bypass_cache']:
+            command.append('--bypass-cache')
+        env = dict(os.environ, CATALOG_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        output = subprocess.run(command, env=env, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout)[0]
+
+    def cookie(self, options):
+        return f'{settings.SESSION_COOKIE_NAME}=benchmark' if options['bypass_cache'] else ''
+
+    def run_wsgi(self, paths, options):
+        application = get_wsgi_application()
+        host, cookie = options['host'], self.cookie(options)
+
+        def request(path):
+            return wsgi_get(application, path, host, cookie)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(
+                request, (paths[i % len(paths)] for i in range(options['requests']))))
+        elapsed = time.perf_counter() - started
+        return summarize('wsgi', [r[0] for r in results], [r[1] for r in results], elapsed)
+
+    def run_asgi(self, paths, options):
+        application = get_asgi_application()
+        host, cookie = options['host'], self.cookie(options)
+        headers = [(b'host', host.encode())]
+        if cookie:
+            headers.append((b'cookie', cookie.encode()))
+
+        async def request(path, limit):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'root_path': '', 'query_string': b'', 'headers': headers,
+                'client': ('127.0.0.1', 0), 'server': (host, 80),
+            }
+            status = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with limit:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                return time.perf_counter() - start, status[0]
+
+        async def main():
+            limit = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(
+                request(paths[i % len(paths)], limit) for i in range(options['requests'])))
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        return summarize('asgi', [r[0] for r in results], [r[1] for r in results], elapsed)
@@ -0,0 +1,103 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from catalog import benchmark
+
+
+class Command(BaseCommand):
+    help = '''Load test the catalog pages and API and record latency, throughput and queries.
+
+    Fill a fresh database with generate_catalog first, then run this with the
+    same options on each commit. Without --url the WSGI application is served
+    in-process on a free local port, so nothing outside this machine is used.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Untimed requests per scenario first, to fill caches')
+        parser.add_argument('--samples', type=int, default=3,
+                            help='Books and authors to sample for the detail scenarios')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                            help='Run only scenarios whose name starts with one of these')
+        parser.add_argument('--user', help='Username for the logged-in scenarios, '
+                                           'a borrower is picked by default')
+        parser.add_argument('--no-page-cache', action='store_true',
+                            help='Send anonymous requests with a session cookie, which skips '
+                                 'the anonymous page cache')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='Compare with an earlier --output file, exit non-zero on regressions')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative p95 or throughput change counted as a regression')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        scenarios = benchmark.build_scenarios(options['samples'], user)
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.name.startswith(tuple(options['only']))]
+        if not scenarios:
+            raise CommandError('No scenarios to run')
+        user_cookie = benchmark.login_cookie(user) if user else ''
+        anonymous_cookie = (f'{settings.SESSION_COOKIE_NAME}=benchmark'
+                            if options['no_page_cache'] else '')
+
+        server = None
+        base_url = options['url']
+        if not base_url:
+            server, base_url = benchmark.serve()
+        try:
+            with override_settings(CATALOG_METRICS_HEADERS=True,
+                                   ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['127.0.0.1']):
+                results = []
+                for scenario in scenarios:
+                    result = benchmark.run_scenario(
+                        base_url, scenario, options['requests'], options['concurrency'],
+                        options['warmup'], user_cookie if scenario.authenticated else anonymous_cookie)
+                    results.append(result)
+                    self.stdout.write(self.format_result(result))
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        report = {
+            'environment': benchmark.environment(),
+            'options': {name: options[name] for name in (
+                'url', 'requests', 'concurrency', 'warmup', 'samples', 'no_page_cache')},
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f'Wrote {options["output"]}')
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            lines, regressed = benchmark.compare(baseline, report, options['threshold'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressed:
+                raise CommandError(
+                    f'Slower than {options["compare"]} ({baseline["environment"]["commit"]})')
+
+    def get_user(self, username):
+        if username is None:
+            return benchmark.default_user()
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'No user {username}')
+
+    def format_result(self, result):
+        queries = result['queries_per_request']
+        return (f'{result["name"]:<22} {result["rps"]:8.1f} req/s  p50 {result["p50_ms"]:7.1f}  '
+                f'p95 {result["p95_ms"]:7.1f}  p99 {result["p99_ms"]:7.1f} ms  '
+                f'queries {queries if queries is None else round(queries, 1)}  '
+                f'errors {result["errors"]}')
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from catalog.benchmark import default_paths, latency_summary, wsgi_get
+
+# mode: (CONN_MAX_AGE, pooled)
+MODES = {
+    'per-request': (0, False),
+    'persistent': (600, False),
+    'pooled': (0, True),
+}
+
+
+class Command(BaseCommand):
+    help = '''Compare per-request latency with a new connection per request,
+    persistent connections (CONN_MAX_AGE) and the catalog.db connection pool.
+
+    The WSGI application is driven in-process with a session cookie, so no
+    page comes from the anonymous page cache. Against SQLite, opening a
+    connection costs almost nothing. --connect-latency adds the TCP and auth
+    handshake a networked MySQL server would add to each new connection.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Paths to request in turn, the catalog read '
+                                                     'pages by default')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=8, help='WSGI threads')
+        parser.add_argument('--warmup', type=int, default=20,
+                            help='Untimed requests per mode first')
+        parser.add_argument('--connect-latency', type=float, default=0.0, metavar='MS',
+                            help='Milliseconds added to every new database connection')
+        parser.add_argument('--host', default=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        database = connections.databases[DEFAULT_DB_ALIAS]
+        connection = connections[DEFAULT_DB_ALIAS]
+        if 'pooled' in options['modes'] and not (
+                hasattr(connection, 'can_pool') and connection.can_pool()):
+            raise CommandError('Pooling needs a catalog.db engine and a file database, '
+                               f'not {database["ENGINE"]} on {database["NAME"]}')
+        paths = options['paths'] or default_paths()
+        saved = {name: database.get(name) for name in ('CONN_MAX_AGE', 'POOL')}
+        opened = []
+        lock = threading.Lock()
+
+        def count_new(sender, connection, **kwargs):
+            if connection.alias != DEFAULT_DB_ALIAS or getattr(connection, 'reused', False):
+                return
+            with lock:
+                opened.append(1)
+            if options['connect_latency']:
+                time.sleep(options['connect_latency'] / 1000)
+
+        connection_created.connect(count_new)
+        results = []
+        try:
+            for mode in options['modes']:
+                max_age, pooled = MODES[mode]
+                database['CONN_MAX_AGE'] = max_age
+                database['POOL'] = dict(saved['POOL'] or {}, MAX_SIZE=(
+                    max(options['concurrency'], (saved['POOL'] or {}).get('MAX_SIZE', 0))
+                    if pooled else 0))
+                connections.close_all()
+                opened.clear()
+                results.append(self.run_mode(mode, paths, options, opened))
+                self.clear_pool()
+        finally:
+            connection_created.disconnect(count_new)
+            database.update(saved)
+            connections.close_all()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f'{"mode":<12}{"requests":>10}{"connects":>10}{"errors":>8}'
+                          f'{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for result in results:
+            self.stdout.write(
+                f'{result["mode"]:<12}{result["requests"]:>10}{result["connections"]:>10}'
+                f'{result["errors"]:>8}{result["rps"]:>10.1f}{result["p50_ms"]:>10.1f}'
+                f'{result["p95_ms"]:>10.1f}{result["p99_ms"]:>10.1f}')
+
+    def run_mode(self, mode, paths, options, opened):
+        application = get_wsgi_application()
+        cookie = f'{settings.SESSION_COOKIE_NAME}=benchmark'
+
+        def request(i):
+            return wsgi_get(application, paths[i % len(paths)], options['host'], cookie)
+
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(request, range(options['warmup'])))
+            opened.clear()
+            started = time.perf_counter()
+            results = list(pool.map(request, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        return {
+            'mode': mode,
+            'requests': len(results),
+            'connections': len(opened),
+            'errors': sum(1 for _, status in results if status != 200),
+            'rps': len(results) / elapsed if elapsed else 0.0,
+            **latency_summary([seconds for seconds, _ in results]),
+        }
+
+    def clear_pool(self):
+        pool = getattr(connections[DEFAULT_DB_ALIAS], 'pool', None)
+        if pool is not None:
+            pool.clear()
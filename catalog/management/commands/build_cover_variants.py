@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from catalog.covers import build_cover
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Build the resized JPEG/WebP variants of every book cover'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        covers = (Book.objects.exclude(cover_img='').exclude(cover_img__isnull=True)
+                  .order_by('pk').values_list('pk', 'cover_img').iterator())
+        books = written = 0
+        for pk, name in covers:
+            books += 1
+            written += build_cover(pk, name, force=options['force']) or 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} variants for {books} covers'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import ledger
+
+
+class Command(BaseCommand):
+    help = '''Move loan events older than --keep-days into the archive table and
+    the monthly rollups, see catalog/ledger.py. Run it from cron, one at a time.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=180,
+                            help='Days of events kept in the hot table')
+        parser.add_argument('--batch-size', type=int, default=ledger.COMPACT_BATCH_SIZE,
+                            help='Events moved per transaction')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['keep_days'])
+        moved = ledger.compact(before, options['batch_size'])
+        self.stdout.write(f'{moved} loan events archived')
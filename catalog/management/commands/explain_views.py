@@ -0,0 +1,121 @@
+import re
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from catalog import benchmark
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(.*)$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(connection, sql, params):
+    """(plan lines, [(table, detail)] of full table scans) for one query"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            lines = [row[-1] for row in cursor.fetchall()]
+            scans = []
+            for line in lines:
+                match = SQLITE_SCAN_RE.match(line)
+                # "SCAN t USING [COVERING] INDEX i" walks an index in order, usually under a LIMIT
+                if match and 'INDEX' not in match.group(2):
+                    scans.append((match.group(1), line))
+            return lines, scans
+        cursor.execute(f'EXPLAIN {sql}', params)
+        rows = cursor.fetchall()
+        if connection.vendor == 'mysql':
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in rows]
+            lines = [f'{row["table"]}: type={row["type"]} key={row["key"]} rows={row["rows"]} '
+                     f'{row.get("Extra") or ""}'.strip() for row in rows]
+            return lines, [(row['table'], line) for row, line in zip(rows, lines)
+                           if row['type'] == 'ALL']
+        lines = [row[0] for row in rows]
+        return lines, [(match.group(1), line) for line in lines
+                       for match in [POSTGRES_SCAN_RE.search(line)] if match]
+
+
+class Command(BaseCommand):
+    help = '''Run EXPLAIN on every query the catalog views make and flag full table scans.
+
+    Each view from the benchmark scenarios is requested in-process with the
+    catalog cache disabled, so the queries behind cached pages run too.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=1,
+                            help='Books and authors to sample for the detail views')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                            help='Explain only scenarios whose name starts with one of these')
+        parser.add_argument('--user', help='Username for the logged-in views, a borrower by default')
+        parser.add_argument('--ignore', nargs='+', default=[], metavar='TABLE',
+                            help='Tables small enough that scanning them is fine')
+        parser.add_argument('--plans', action='store_true', help='Print every query plan')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit non-zero when any query scans a whole table')
+
+    def handle(self, *args, **options):
+        user = (User.objects.filter(username=options['user']).first() if options['user']
+                else benchmark.default_user())
+        if options['user'] and user is None:
+            raise CommandError(f'No user {options["user"]}')
+        scenarios = benchmark.build_scenarios(options['samples'], user)
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.name.startswith(tuple(options['only']))]
+
+        dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        explained = set()
+        total_scans = 0
+        with override_settings(CACHES={**settings.CACHES, settings.CATALOG_CACHE_ALIAS: dummy},
+                               ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for scenario in scenarios:
+                client = Client()
+                if scenario.authenticated:
+                    client.force_login(user)
+                queries = self.capture(client, scenario.path)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{scenario.name} {scenario.path} ({len(queries)} queries)'))
+                for alias, sql, params in queries:
+                    if not sql.lstrip().upper().startswith('SELECT') or sql in explained:
+                        continue
+                    explained.add(sql)
+                    lines, scans = explain(connections[alias], sql, params)
+                    scans = [(table, detail) for table, detail in scans
+                             if table not in options['ignore']]
+                    total_scans += len(scans)
+                    if scans or options['plans']:
+                        self.stdout.write(f'  {sql[:160]}')
+                    for table, detail in scans:
+                        self.stdout.write(self.style.WARNING(f'    full scan of {table}: {detail}'))
+                    if options['plans']:
+                        for line in lines:
+                            self.stdout.write(f'    {line}')
+
+        summary = f'{len(explained)} distinct queries explained, {total_scans} full table scans'
+        if total_scans and options['fail_on_scan']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not total_scans else summary)
+
+    def capture(self, client, path):
+        """[(alias, sql, params)] of the queries one GET runs"""
+        queries = []
+
+        def record(alias):
+            def wrapper(execute, sql, params, many, context):
+                queries.append((alias, sql, params))
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record(alias)))
+            response = client.get(path)
+        if response.status_code >= 400:
+            raise CommandError(f'{path} answered {response.status_code}')
+        return queries
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import CHUNK_SIZE, EXPORTS, FORMATS, iter_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream catalog tables to CSV or JSON Lines files without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*',
+                            help=f'Tables to export ({", ".join(EXPORTS)}), all of them by default')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output-dir',
+                            help='Write one <kind>.<format> file per table here instead of to stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or list(EXPORTS)
+        unknown = set(kinds) - set(EXPORTS)
+        if unknown:
+            raise CommandError(f'Unknown tables: {", ".join(sorted(unknown))}')
+        fmt = options['format']
+        for kind in kinds:
+            lines = iter_lines(kind, fmt, options['chunk_size'])
+            if not options['output_dir']:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+                continue
+            path = os.path.join(options['output_dir'], f'{kind}.{fmt}')
+            count = 0
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            self.stderr.write(f'Wrote {count} lines to {path}')
@@ -0,0 +1,216 @@
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import availability
+from catalog.caching import invalidate
+from catalog.models import STAR_FIELDS, Author, Book, BookInstance, Genre, Review, SearchToken
+from catalog.search import build_document, token_weights, uses_fulltext
+
+WORDS = (
+    'ancient archive autumn beneath bitter broken candle city clockwork crimson dark '
+    'distant dragon dream echo ember empire fallen feather forest forgotten garden ghost '
+    'glass golden harbor hidden hollow house iron island kingdom lantern last library '
+    'light lost machine memory midnight mirror moon mountain night ocean orchard paper '
+    'quiet raven river road salt secret shadow silent silver sky song star stone storm '
+    'summer sun thief thorn tide tower traveler valley voyage war water wild winter wolf'
+).split()
+FIRST_NAMES = (
+    'Ada Alan Amara Ann Bram Chen Clara Dana Elif Emily Farah Greta Hugo Ines Ivan Jun '
+    'Kofi Lena Leo Maya Mira Nadia Noor Omar Pia Ravi Rosa Sam Tariq Uma Vera Yuki Zora'
+).split()
+LAST_NAMES = (
+    'Abe Baker Costa Dahl Eze Flores Gray Haddad Ito Jensen Kim Lopez Mbeki Novak Okafor '
+    'Park Quinn Rossi Silva Tanaka Usman Vogel Walsh Xu Yilmaz Zeller'
+).split()
+GENRES = (
+    'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'Horror', 'Historical',
+    'Biography', 'Poetry', 'Travel', 'Cooking', 'History', 'Science', 'Philosophy',
+    'Children', 'Young Adult', 'Graphic Novel', 'Essays', 'Drama', 'Humor',
+)
+# share of generated copies in each status
+COPY_STATUSES = (('a', 0.6), ('o', 0.3), ('r', 0.05), ('u', 0.05))
+USERNAME_PREFIX = 'reader'
+ISBN_PREFIX = '979'
+
+
+class Command(BaseCommand):
+    help = '''Fill the catalog with synthetic books, authors, genres, copies, reviews and users.
+
+    The same --seed and scale always produce the same data, so benchmark runs
+    against a fresh database are comparable. Rows go in with bulk inserts and
+    the book counters and search index are filled in directly, as signals don't
+    run for bulk_create.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--copies', type=int, help='Total copies, 5 per book by default')
+        parser.add_argument('--reviews', type=int, help='Total reviews, 10 per book by default')
+        parser.add_argument('--users', type=int, help='Users, one per 10 books by default')
+        parser.add_argument('--authors', type=int, help='Authors, one per 5 books by default')
+        parser.add_argument('--genres', type=int, default=len(GENRES))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Books per transaction, with their copies, reviews and tokens')
+        parser.add_argument('--append', action='store_true',
+                            help='Add to a catalog that already has books instead of refusing')
+
+    def handle(self, *args, **options):
+        books = options['books']
+        scale = {
+            'books': books,
+            'copies': options['copies'] if options['copies'] is not None else books * 5,
+            'reviews': options['reviews'] if options['reviews'] is not None else books * 10,
+            'users': options['users'] if options['users'] is not None else max(books // 10, 1),
+            'authors': options['authors'] if options['authors'] is not None else max(books // 5, 1),
+            'genres': options['genres'],
+        }
+        if any(value < 0 for value in scale.values()) or not scale['users'] or not scale['genres']:
+            raise CommandError('Counts must not be negative, and there must be users and genres')
+        if Book.objects.exists() and not options['append']:
+            raise CommandError('The catalog already has books, use --append to add to it')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        started = time.monotonic()
+
+        self.users = self.create_users(scale['users'])
+        self.authors = self.create_authors(scale['authors'])
+        self.genres = self.create_genres(scale['genres'])
+        self.stdout.write(f'Created {len(self.users)} users, {len(self.authors)} authors '
+                          f'and {len(self.genres)} genres')
+
+        first_number = Book.objects.filter(isbn__startswith=ISBN_PREFIX).count()
+        created = {'books': 0, 'copies': 0, 'reviews': 0}
+        for start in range(0, books, self.batch_size):
+            count = min(self.batch_size, books - start)
+            self.create_books(first_number + start, count, scale, created)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{created["books"]} books, {created["copies"]} copies, '
+                              f'{created["reviews"]} reviews ({elapsed:.0f}s)')
+
+        # bulk_create skipped the signals that keep the availability sets and author totals
+        availability.rebuild()
+        Author.objects.recount()
+        invalidate('books', 'authors', 'genres')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {created["books"]} books, {created["copies"]} copies and '
+            f'{created["reviews"]} reviews in {time.monotonic() - started:.1f}s'))
+
+    # lookup tables
+
+    def create_users(self, count):
+        # hashing is deliberately slow, every generated user shares one hash
+        password = make_password(USERNAME_PREFIX)
+        first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        names = [f'{USERNAME_PREFIX}{number:07d}' for number in range(first, first + count)]
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in names],
+            batch_size=self.batch_size)
+        # bulk_create doesn't return ids on MySQL, read them back
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX)
+                    .order_by('pk').values_list('pk', 'username'))
+
+    def create_authors(self, count):
+        last_pk = Author.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Author.objects.bulk_create(
+            [Author(first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=f'{self.rng.choice(LAST_NAMES)} {number}',
+                    date_of_birth=date(1900, 1, 1) + timedelta(days=self.rng.randrange(36500)))
+             for number in range(count)],
+            batch_size=self.batch_size)
+        return list(Author.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', 'first_name', 'last_name'))
+
+    def create_genres(self, count):
+        names = [GENRES[i] if i < len(GENRES) else f'{GENRES[i % len(GENRES)]} {i // len(GENRES)}'
+                 for i in range(count)]
+        existing = set(Genre.objects.filter(name__in=names).values_list('name', flat=True))
+        Genre.objects.bulk_create([Genre(name=name) for name in names if name not in existing])
+        return list(Genre.objects.filter(name__in=names).order_by('pk').values_list('pk', 'name'))
+
+    # books and everything hanging off them
+
+    def spread(self, total, books):
+        """Per-book counts adding up to ``total`` on average, with some books getting none"""
+        mean = total / books if books else 0
+        return self.rng.randint(0, round(mean * 2)) if mean else 0
+
+    def words(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def create_books(self, first_number, count, scale, created):
+        rows = []
+        for number in range(first_number, first_number + count):
+            author_id, first, last = self.rng.choice(self.authors)
+            genres = self.rng.sample(self.genres, min(self.rng.randint(1, 3), len(self.genres)))
+            statuses = self.rng.choices(
+                [status for status, _ in COPY_STATUSES], [share for _, share in COPY_STATUSES],
+                k=self.spread(scale['copies'], scale['books']))
+            stars = [self.rng.randint(1, 5)
+                     for _ in range(self.spread(scale['reviews'], scale['books']))]
+            fields = {
+                'title': self.words(1, 4).title(),
+                'isbn': f'{ISBN_PREFIX}{number:010d}',
+                'author': f'{first} {last}',
+                'genre': ' '.join(name for _, name in genres),
+                'description': self.words(8, 30).capitalize() + '.',
+            }
+            rows.append((fields, (author_id, first, last), genres, statuses, stars))
+
+        with transaction.atomic():
+            Book.objects.bulk_create([
+                Book(title=fields['title'], isbn=fields['isbn'], description=fields['description'],
+                     author_id=author_id, author_sort=f'{last}, {first}',
+                     publication_date=date(1950, 1, 1) + timedelta(days=self.rng.randrange(26000)),
+                     total_copies=len(statuses), copies_available=statuses.count('a'),
+                     review_count=len(stars), star_sum=sum(stars),
+                     rating=sum(stars) / len(stars) if stars else 0,
+                     **{name: stars.count(n) for n, name in enumerate(STAR_FIELDS, 1)},
+                     search_document=build_document(fields))
+                for fields, (author_id, first, last), genres, statuses, stars in rows
+            ], batch_size=self.batch_size)
+            book_ids = dict(Book.objects.filter(
+                isbn__in=[fields['isbn'] for fields, *_ in rows]).values_list('isbn', 'pk'))
+
+            Through = Book.genre.through
+            Through.objects.bulk_create(
+                [Through(book_id=book_ids[fields['isbn']], genre_id=genre_id)
+                 for fields, _, genres, _, _ in rows for genre_id, _ in genres],
+                batch_size=self.batch_size)
+            copies = [self.build_copy(book_ids[fields['isbn']], status)
+                      for fields, _, _, statuses, _ in rows for status in statuses]
+            BookInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+            reviews = [self.build_review(book_ids[fields['isbn']], star)
+                       for fields, _, _, _, stars in rows for star in stars]
+            Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+            if not uses_fulltext():
+                SearchToken.objects.bulk_create(
+                    [SearchToken(book_id=book_ids[fields['isbn']], token=token, weight=weight)
+                     for fields, *_ in rows for token, weight in token_weights(fields).items()],
+                    batch_size=self.batch_size)
+
+        created['books'] += len(rows)
+        created['copies'] += len(copies)
+        created['reviews'] += len(reviews)
+
+    def build_copy(self, book_id, status):
+        copy = BookInstance(id=uuid.UUID(int=self.rng.getrandbits(128), version=4),
+                            book_id=book_id, status=status,
+                            imprint=f'{self.rng.choice(LAST_NAMES)} Press')
+        if status == 'o':
+            copy.borrower_id = self.rng.choice(self.users)[0]
+            copy.due_back = self.today + timedelta(days=self.rng.randint(-7, 21))
+        return copy
+
+    def build_review(self, book_id, stars):
+        return Review(book_id=book_id, stars=stars, writer=self.rng.choice(self.users)[1],
+                      body=self.words(5, 40).capitalize() + '.',
+                      date_written=self.today - timedelta(days=self.rng.randrange(3650)))
@@ -0,0 +1,209 @@
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import availability
+from catalog.caching import invalidate
+from catalog.models import Author, Book, BookInstance, Genre, SearchToken
+from catalog.search import build_document, token_weights, uses_fulltext
+
+REQUIRED_FIELDS = ('title', 'isbn')
+
+
+class Command(BaseCommand):
+    help = '''Bulk load books, authors, genres and copies from CSV or JSON Lines.
+
+    Each row is one book with the columns/keys: title, isbn, description,
+    publication_date (YYYY-MM-DD), author_first_name, author_last_name,
+    genres (a list, or ";"-separated in CSV), copies, copy_status, imprint.
+    Books whose ISBN already exists are skipped.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin')
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help='Input format, guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Books per bulk insert and transaction')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        self.batch_size = options['batch_size']
+        self.load_lookup_maps()
+
+        started = time.monotonic()
+        self.imported = self.skipped = 0
+        stream = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+                  if options['path'] == '-' else open(options['path'], encoding='utf-8', newline=''))
+        with stream:
+            batch = []
+            for row in self.read_rows(stream, fmt):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+                    self.report(started)
+            if batch:
+                self.import_batch(batch)
+
+        # bulk_create skipped the signals that keep the availability sets and author totals
+        availability.rebuild()
+        Author.objects.recount()
+        invalidate('books', 'authors', 'genres')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} books ({self.skipped} skipped) in {elapsed:.1f}s, '
+            f'{self.imported / max(elapsed, 1e-9):.0f} rows/s'))
+
+    def report(self, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{self.imported} books, {self.imported / max(elapsed, 1e-9):.0f} rows/s')
+
+    # reading
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            for row in csv.DictReader(stream):
+                row['genres'] = (row.get('genres') or '').split(';')
+                yield row
+            return
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Line {line_number}: {error}')
+            if isinstance(row.get('genres'), str):
+                row['genres'] = row['genres'].split(';')
+            yield row
+
+    # lookups
+
+    def load_lookup_maps(self):
+        """Existing authors and genres, so each is only ever looked up in memory"""
+        self.authors = {}
+        for pk, first, last in Author.objects.order_by('pk').values_list(
+                'pk', 'first_name', 'last_name').iterator():
+            self.authors.setdefault((first, last), pk)
+        self.genres = {}
+        for pk, name in Genre.objects.order_by('pk').values_list('pk', 'name').iterator():
+            self.genres.setdefault(name, pk)
+
+    def create_missing_authors(self, rows):
+        missing = {key for key in (self.author_key(row) for row in rows)
+                   if key and key not in self.authors}
+        if not missing:
+            return
+        Author.objects.bulk_create(
+            [Author(first_name=first, last_name=last) for first, last in missing],
+            batch_size=self.batch_size)
+        # bulk_create doesn't return ids on MySQL, read them back
+        for pk, first, last in Author.objects.filter(
+                last_name__in={last for _, last in missing}).values_list(
+                'pk', 'first_name', 'last_name'):
+            if (first, last) in missing:
+                self.authors.setdefault((first, last), pk)
+
+    def create_missing_genres(self, rows):
+        missing = {name for row in rows for name in row['genres'] if name not in self.genres}
+        if not missing:
+            return
+        Genre.objects.bulk_create([Genre(name=name) for name in missing])
+        for pk, name in Genre.objects.filter(name__in=missing).values_list('pk', 'name'):
+            self.genres.setdefault(name, pk)
+
+    @staticmethod
+    def author_key(row):
+        first = (row.get('author_first_name') or '').strip()
+        last = (row.get('author_last_name') or '').strip()
+        return (first, last) if first or last else None
+
+    # writing
+
+    def clean_rows(self, batch):
+        """Valid rows of a batch with new ISBNs, the rest are counted as skipped"""
+        rows = {}
+        for row in batch:
+            row = {key: value.strip() if isinstance(value, str) else value
+                   for key, value in row.items()}
+            if not all(row.get(field) for field in REQUIRED_FIELDS):
+                continue
+            try:
+                row['copies'] = int(row.get('copies') or 0)
+                published = row.get('publication_date')
+                row['publication_date'] = date.fromisoformat(published) if published else None
+            except (TypeError, ValueError):
+                continue
+            row['copy_status'] = row.get('copy_status') or 'a'
+            if row['copies'] < 0 or row['copy_status'] not in dict(BookInstance.LOAN_STATUS):
+                continue
+            row['genres'] = [name.strip() for name in row.get('genres') or () if name.strip()]
+            rows.setdefault(row['isbn'], row)
+        existing = set(Book.objects.filter(isbn__in=rows).values_list('isbn', flat=True))
+        rows = [row for isbn, row in rows.items() if isbn not in existing]
+        self.skipped += len(batch) - len(rows)
+        return rows
+
+    def import_batch(self, batch):
+        with transaction.atomic():
+            rows = self.clean_rows(batch)
+            if not rows:
+                return
+            self.create_missing_authors(rows)
+            self.create_missing_genres(rows)
+
+            books = [self.build_book(row) for row in rows]
+            Book.objects.bulk_create(books, batch_size=self.batch_size)
+            book_ids = dict(Book.objects.filter(
+                isbn__in=[row['isbn'] for row in rows]).values_list('isbn', 'pk'))
+
+            Through = Book.genre.through
+            Through.objects.bulk_create(
+                [Through(book_id=book_ids[row['isbn']], genre_id=self.genres[name])
+                 for row in rows for name in set(row['genres'])],
+                batch_size=self.batch_size)
+            BookInstance.objects.bulk_create(
+                [BookInstance(book_id=book_ids[row['isbn']], imprint=row.get('imprint') or '',
+                              status=row['copy_status'])
+                 for row in rows for _ in range(row['copies'])],
+                batch_size=self.batch_size)
+            if not uses_fulltext():
+                SearchToken.objects.bulk_create(
+                    [SearchToken(book_id=book_ids[row['isbn']], token=token, weight=weight)
+                     for row in rows
+                     for token, weight in token_weights(self.search_fields(row)).items()],
+                    batch_size=self.batch_size)
+        self.imported += len(rows)
+
+    def search_fields(self, row):
+        first, last = self.author_key(row) or ('', '')
+        return {
+            'title': row['title'],
+            'isbn': row['isbn'],
+            'author': f'{first} {last}'.strip(),
+            'genre': ' '.join(row['genres']),
+            'description': row.get('description') or '',
+        }
+
+    def build_book(self, row):
+        # bulk_create skips the signals, so fill the counters and search document here
+        copies = row['copies']
+        status = row['copy_status']
+        author_key = self.author_key(row)
+        return Book(
+            title=row['title'],
+            isbn=row['isbn'],
+            description=row.get('description') or '',
+            publication_date=row['publication_date'] or date.today(),
+            author_id=self.authors[author_key] if author_key else None,
+            author_sort=f'{author_key[1]}, {author_key[0]}' if author_key else '',
+            total_copies=copies,
+            copies_available=copies if status == 'a' else 0,
+            search_document=build_document(self.search_fields(row)),
+        )
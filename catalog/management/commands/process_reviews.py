@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import reviews
+
+
+class Command(BaseCommand):
+    help = '''Apply queued review submissions in batches, see catalog/reviews.py.
+
+    Without --forever the queue is drained once, which suits cron; with it the
+    command keeps polling every --interval seconds.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=reviews.BATCH_SIZE,
+                            help='Submissions applied per transaction')
+        parser.add_argument('--forever', action='store_true', help='Keep polling the queue')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            result = reviews.drain(options['batch_size'])
+            if any(result) or not options['forever']:
+                self.stdout.write(f'{result.applied} reviews applied, {result.held} held '
+                                  f'for moderation, {result.rejected} rejected')
+            if not options['forever']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from catalog import sessions
+
+
+class Command(BaseCommand):
+    help = '''Delete expired sessions in batches, see catalog/sessions.py. A batched
+    clearsessions that doesn't lock the whole django_session table at once.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sessions.BATCH_SIZE,
+                            help='Sessions deleted per statement')
+
+    def handle(self, *args, **options):
+        if not sessions.stores_rows():
+            self.stdout.write(f'{settings.SESSION_ENGINE} keeps no session rows to prune')
+            return
+        deleted = sessions.clear_expired(options['batch_size'])
+        self.stdout.write(f'{deleted} expired sessions deleted')
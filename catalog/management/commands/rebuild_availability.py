@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import availability
+from catalog.caching import invalidate
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-genre sets of available books from the Book counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report sets that are out of sync, exit non-zero if any')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            chunks = availability.rebuild()
+            invalidate('books')
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {chunks} availability chunks'))
+            return
+
+        computed = availability.compute_bitmaps()
+        stored = availability.stored_bitmaps()
+        stale = 0
+        for scope, chunk in sorted(set(computed) | set(stored)):
+            expected, found = computed.get((scope, chunk), 0), stored.get((scope, chunk), 0)
+            if expected != found:
+                stale += 1
+                self.stdout.write(f'Scope {scope} chunk {chunk}: '
+                                  f'{bin(expected ^ found).count("1")} books differ')
+        if stale:
+            raise CommandError(f'{stale} availability chunks are out of sync')
+        self.stdout.write(self.style.SUCCESS(f'All {len(computed)} availability chunks are in sync'))
@@ -0,0 +1,74 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import AUTHOR_COUNTERS, STAR_FIELDS, Author, Book
+
+COUNTERS = ('copies_available', 'total_copies', 'review_count', 'star_sum') + STAR_FIELDS
+DERIVED = ('rating',)
+
+
+class Command(BaseCommand):
+    help = ('Recount the stored Book inventory and rating counters from BookInstance and Review rows, '
+            'the average rating, and the Author totals over their books')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report books whose counters are out of sync, exit non-zero if any')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ('pk',) + COUNTERS + DERIVED + tuple(f'counted_{name}' for name in COUNTERS)
+        rows = (Book.objects.with_counted_stats().order_by()
+                .values_list(*fields).iterator(chunk_size=batch_size))
+
+        stale = []
+        checked = fixed = 0
+        split = 1 + len(COUNTERS) + len(DERIVED)
+        for row in rows:
+            checked += 1
+            pk, stored, counted = row[0], row[1:split], row[split:]
+            review_count, star_sum = counted[2:4]
+            counted += (star_sum / review_count if review_count else 0.0,)
+            if stored[:-1] == counted[:-1] and math.isclose(stored[-1], counted[-1]):
+                continue
+            stale.append(pk)
+            if options['check']:
+                self.stdout.write(f'Book {pk}: stored {stored}, counted {counted}')
+            if len(stale) >= batch_size:
+                fixed += self.flush(Book, stale, options['check'])
+        fixed += self.flush(Book, stale, options['check'])
+
+        # author totals are sums of the (now rebuilt) book counters
+        author_fields = ('book_count',) + AUTHOR_COUNTERS
+        stale_authors = 0
+        for row in Author.objects.with_counted_stats().values(
+                'pk', *author_fields, *(f'counted_{name}' for name in author_fields)).iterator():
+            stored = tuple(row[name] for name in author_fields)
+            counted = tuple(row[f'counted_{name}'] for name in author_fields)
+            if stored != counted:
+                stale.append(row['pk'])
+                if options['check']:
+                    self.stdout.write(f'Author {row["pk"]}: stored {stored}, counted {counted}')
+                if len(stale) >= batch_size:
+                    stale_authors += self.flush(Author, stale, options['check'])
+        stale_authors += self.flush(Author, stale, options['check'])
+
+        if options['check']:
+            if fixed or stale_authors:
+                raise CommandError(f'{fixed} of {checked} books and {stale_authors} authors '
+                                   f'have stale counters')
+            self.stdout.write(self.style.SUCCESS(f'All {checked} book counters are in sync'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt counters for {fixed} of {checked} books and {stale_authors} authors'))
+
+    def flush(self, model, stale, check_only):
+        # recount() counts in the UPDATE itself rather than writing the values
+        # read above, so counter deltas applied since then aren't overwritten
+        count = len(stale)
+        if count and not check_only:
+            model.objects.filter(pk__in=stale).recount()
+        stale.clear()
+        return count
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Book
+from catalog.search import index_book
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog search document and token index for every book'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        books = (Book.objects.select_related('author').prefetch_related('genre')
+                 .order_by('pk'))
+        count = 0
+        # prefetch_related needs explicit batches, iterator() would skip it
+        last_pk = 0
+        while True:
+            batch = list(books.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            for book in batch:
+                index_book(book)
+            count += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books'))
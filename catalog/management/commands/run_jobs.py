@@ -0,0 +1,48 @@
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import jobs
+from catalog.models import Job
+
+
+class Command(BaseCommand):
+    help = '''Run the periodic maintenance jobs in settings.CATALOG_JOBS that are due, see
+    catalog/jobs.py.
+
+    Without --forever one batch of due jobs runs, which suits cron. With it
+    the command keeps polling every --interval seconds. Several workers can
+    run side by side, and each due job still runs once.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=jobs.BATCH_SIZE,
+                            help='Due jobs claimed at a time')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes running jobs, 1 runs them in this process')
+        parser.add_argument('--forever', action='store_true', help='Keep polling for due jobs')
+        parser.add_argument('--interval', type=float, default=30.0,
+                            help='Seconds to sleep when no job is due')
+        parser.add_argument('--list', action='store_true',
+                            help='Show the jobs and when they run next instead of running any')
+
+    def handle(self, *args, **options):
+        jobs.sync_jobs()
+        if options['list']:
+            for job in Job.objects.filter(name__in=list(jobs.configured_jobs())):
+                self.stdout.write(f'{job.name}: every {job.interval}, next at '
+                                  f'{timezone.localtime(job.next_run_at):%Y-%m-%d %H:%M:%S}, '
+                                  f'last {job.get_last_status_display().lower()}')
+            return
+        pool = jobs.process_pool(options['workers']) if options['workers'] > 1 else None
+        with pool or nullcontext():
+            while True:
+                results = jobs.run_due(options['batch_size'], pool)
+                for name, status, result in results:
+                    line = f'{name}: {result.strip().splitlines()[-1] if result else status}'
+                    self.stdout.write(line if status == 'ok' else self.style.ERROR(line))
+                if not options['forever']:
+                    return
+                if len(results) < options['batch_size']:
+                    time.sleep(options['interval'])
@@ -0,0 +1,169 @@
+"""Per-request query count and timing for the catalog views.
+
+``QueryMetricsMiddleware`` counts the SQL queries a catalog view runs and
+splits the request time into database, template and remaining Python time.
+The numbers go to the ``catalog.metrics`` logger and, when
+``CATALOG_METRICS_HEADERS`` is on, into ``X-Query-Count`` and
+``Server-Timing`` response headers.
+
+Views declare how many queries they may run with a ``query_budget`` class
+attribute or the ``query_budget`` decorator. Going over budget logs a
+warning, and tests can assert on ``response.query_metrics``.
+
+The middleware works in sync and async chains. Async views (see
+catalog.async_views) run their queries on worker threads, so they install the
+counters per call with ``count_queries`` rather than once for the request.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import markcoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('catalog.metrics')
+
+
+def query_budget(budget):
+    """Declare the query budget of a function view"""
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_class or view_func, 'query_budget', None)
+
+
+class RequestMetrics:
+    """Counters for one request, fed by connection.execute_wrapper"""
+
+    def __init__(self, view_name, budget):
+        self.view_name = view_name
+        self.budget = budget
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        # async views may run queries for one request on several threads
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.db_time += elapsed
+                self.queries += 1
+
+    @property
+    def python_time(self):
+        return max(self.total_time - self.db_time - self.template_time, 0.0)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def server_timing(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in (
+            ('db', self.db_time), ('template', self.template_time),
+            ('python', self.python_time), ('total', self.total_time)))
+
+
+def count_queries(metrics):
+    """Context manager counting this thread's queries into ``metrics``"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics))
+    return stack
+
+
+def timed_render(metrics, render):
+    """``render`` wrapped to add its time, less queries it runs, to template_time"""
+    def timed():
+        # queries run while rendering (lazy querysets) count as db time
+        start, db_time = time.perf_counter(), metrics.db_time
+        try:
+            return render()
+        finally:
+            metrics.template_time += (time.perf_counter() - start) - (metrics.db_time - db_time)
+    return timed
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, start)
+
+    def finish(self, request, response, start):
+        metrics = getattr(request, 'query_metrics', None)
+        if metrics is None:
+            return response
+        # the wrappers stay installed until here so lazy queries run by
+        # middleware after the view, e.g. session saves, are counted too
+        request._query_metrics_stack.close()
+        metrics.total_time = time.perf_counter() - start
+        self.report(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not view_func.__module__.startswith('catalog.'):
+            return None
+        match = request.resolver_match
+        metrics = RequestMetrics(
+            match.view_name if match else view_func.__name__, get_query_budget(view_func))
+        if asyncio.iscoroutinefunction(view_func):
+            stack = ExitStack()
+        else:
+            stack = count_queries(metrics)
+        request.query_metrics = metrics
+        request._query_metrics_stack = stack
+        return None
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, 'query_metrics', None)
+        if metrics is None:
+            return response
+        response.render = timed_render(metrics, response.render)
+        return response
+
+    def process_exception(self, request, exception):
+        stack = getattr(request, '_query_metrics_stack', None)
+        if stack is not None:
+            stack.close()
+
+    def report(self, request, response, metrics):
+        response.query_metrics = metrics
+        if getattr(settings, 'CATALOG_METRICS_HEADERS', False):
+            response['X-Query-Count'] = str(metrics.queries)
+            response['Server-Timing'] = metrics.server_timing()
+        log = logger.warning if metrics.over_budget else logger.info
+        log('%s %s view=%s queries=%d budget=%s db_ms=%.1f template_ms=%.1f python_ms=%.1f total_ms=%.1f',
+            request.method, request.path, metrics.view_name, metrics.queries, metrics.budget,
+            metrics.db_time * 1000, metrics.template_time * 1000,
+            metrics.python_time * 1000, metrics.total_time * 1000)
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:40
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_book_counters(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    Review = apps.get_model('catalog', 'Review')
+    for book in Book.objects.all().iterator():
+        instances = BookInstance.objects.filter(book=book)
+        reviews = Review.objects.filter(book=book)
+        book.total_copies = instances.count()
+        book.copies_available = instances.filter(status='a').count()
+        book.review_count = reviews.count()
+        book.star_sum = reviews.aggregate(
+            total=models.Sum('stars'))['total'] or 0
+        book.save(update_fields=['total_copies', 'copies_available',
+                                 'review_count', 'star_sum'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_alter_bookinstance_options'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='author',
+            options={'ordering': ['last_name', 'first_name'], 'permissions': (('can_add', 'Can add authors'), ('can_edit', 'Can edit authors'), ('can_delete', 'Can delete authors'))},
+        ),
+        migrations.AlterModelOptions(
+            name='book',
+            options={'permissions': (('can_edit', 'Edit existing books'), ('can_add', 'Can add new books'), ('can_delete', 'Can delete books'))},
+        ),
+        migrations.AlterModelOptions(
+            name='bookinstance',
+            options={'permissions': (('can_marked_returned', 'Set book as returned'), ('can_add_edit', 'Can add/edit book instances'))},
+        ),
+        migrations.AlterModelOptions(
+            name='genre',
+            options={'permissions': (('can_add', 'Can add genres'),)},
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='review',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_img',
+            field=models.ImageField(blank=True, null=True, upload_to='book_covers/'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='publication_date',
+            field=models.DateField(blank=True, default=datetime.date.today),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='star_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='book',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='catalog.book'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='description',
+            field=models.TextField(blank=True, help_text='Enter a brief summary', max_length=1000),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='date_written',
+            field=models.DateField(blank=True, default=datetime.date.today),
+        ),
+        migrations.RunPython(fill_book_counters, migrations.RunPython.noop),
+    ]
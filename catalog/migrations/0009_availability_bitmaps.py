@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:10
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+CHUNK_BITS = 8192
+
+
+def build_availability(apps, schema_editor):
+    # same layout as catalog.availability.rebuild()
+    Book = apps.get_model('catalog', 'Book')
+    AvailabilityChunk = apps.get_model('catalog', 'AvailabilityChunk')
+    bitmaps = defaultdict(int)
+    available = Book.objects.filter(copies_available__gt=0)
+    for pk in available.values_list('pk', flat=True).iterator():
+        bitmaps[0, pk // CHUNK_BITS] |= 1 << (pk % CHUNK_BITS)
+    for book_id, genre_id in Book.genre.through.objects.filter(
+            book__in=available).values_list('book_id', 'genre_id').iterator():
+        bitmaps[genre_id, book_id // CHUNK_BITS] |= 1 << (book_id % CHUNK_BITS)
+    AvailabilityChunk.objects.bulk_create(
+        [AvailabilityChunk(scope=scope, chunk=chunk,
+                           bits=bits.to_bytes(CHUNK_BITS // 8, 'little'))
+         for (scope, chunk), bits in bitmaps.items()],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.PositiveIntegerField()),
+                ('chunk', models.PositiveIntegerField()),
+                ('bits', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('scope', 'chunk')},
+            },
+        ),
+        migrations.RunPython(build_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:15
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf
+
+
+def fill_sort_keys(apps, schema_editor):
+    # same values as BookQuerySet.adjust_counters and the Book pre_save signal
+    Book = apps.get_model('catalog', 'Book')
+    Author = apps.get_model('catalog', 'Author')
+    Book.objects.update(rating=Coalesce(
+        Cast(F('star_sum'), models.FloatField()) / NullIf(F('review_count'), 0), 0.0))
+    names = Author.objects.filter(pk=OuterRef('author_id')).annotate(
+        name=Concat('last_name', Value(', '), 'first_name', output_field=models.CharField()))
+    Book.objects.filter(author__isnull=False).update(
+        author_sort=Subquery(names.values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_availability_bitmaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='author_sort',
+            field=models.CharField(blank=True, editable=False, max_length=302),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publication_date', 'id'], name='book_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author_sort', 'id'], name='book_author_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='book_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['copies_available', 'id'], name='book_available_idx'),
+        ),
+    ]
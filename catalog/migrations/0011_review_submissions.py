@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:17
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0010_book_sort_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('writer', models.CharField(max_length=200)),
+                ('body', models.TextField(max_length=2000)),
+                ('stars', models.PositiveSmallIntegerField(help_text='Between 1 and 5 stars', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('status', models.CharField(choices=[('q', 'Queued'), ('h', 'Held for moderation'), ('a', 'Approved by a moderator')], default='q', max_length=1)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_submissions', to='catalog.book')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reviewsubmission',
+            index=models.Index(fields=['status', 'id'], name='submission_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_stars(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    Review = apps.get_model('catalog', 'Review')
+    for stars in range(1, 6):
+        counts = (Review.objects.filter(book=OuterRef('pk'), stars=stars).order_by()
+                  .values('book').annotate(n=Count('pk')).values('n'))
+        Book.objects.update(**{f'stars_{stars}': Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_review_submissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_stars, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_books(apps, schema_editor):
+    # same as AuthorQuerySet.recount()
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    books = Book.objects.filter(author=OuterRef('pk')).order_by().values('author')
+    counted = {'book_count': Coalesce(Subquery(books.annotate(n=Count('pk')).values('n')), 0)}
+    for name in ('copies_available', 'review_count', 'star_sum'):
+        counted[name] = Coalesce(Subquery(books.annotate(total=Sum(name)).values('total')), 0)
+    Author.objects.update(**counted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_star_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='star_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_books, migrations.RunPython.noop),
+    ]
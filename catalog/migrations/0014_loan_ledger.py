@@ -0,0 +1,82 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0013_author_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('h', 'Reserved'), ('o', 'Checked out'), ('r', 'Returned'), ('c', 'Hold cancelled'), ('e', 'Hold expired')], max_length=1)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('book', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+                ('instance', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.bookinstance')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-occurred_at', '-id'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoanEvent',
+            fields=[
+                ('kind', models.CharField(choices=[('h', 'Reserved'), ('o', 'Checked out'), ('r', 'Returned'), ('c', 'Hold cancelled'), ('e', 'Hold expired')], max_length=1)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('book', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+                ('instance', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.bookinstance')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-occurred_at', '-id'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('kind', models.CharField(choices=[('h', 'Reserved'), ('o', 'Checked out'), ('r', 'Returned'), ('c', 'Hold cancelled'), ('e', 'Hold expired')], max_length=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalog.book')),
+            ],
+            options={
+                'unique_together': {('book', 'month', 'kind')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['user', 'occurred_at'], name='loanevent_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['book', 'occurred_at'], name='loanevent_book_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['occurred_at'], name='loanevent_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloanevent',
+            index=models.Index(fields=['user', 'occurred_at'], name='archivedloan_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedloanevent',
+            index=models.Index(fields=['book', 'occurred_at'], name='archivedloan_book_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0014_loan_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('interval', models.DurationField()),
+                ('next_run_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.CharField(blank=True, choices=[('', 'Never run'), ('ok', 'Succeeded'), ('failed', 'Failed')], max_length=6)),
+                ('last_result', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['next_run_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='hold',
+            index=models.Index(fields=['status', 'expires_at'], name='hold_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+
+def queue_covers(apps, schema_editor):
+    # the build-cover-variants job builds (or finds) the variants of every existing cover
+    Book = apps.get_model('catalog', 'Book')
+    Book.objects.exclude(cover_img='').exclude(cover_img__isnull=True).update(cover_variants=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0016_site_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_variants',
+            field=models.BooleanField(default=False, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['cover_variants'], name='book_cover_variants_idx'),
+        ),
+        migrations.RunPython(queue_covers, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.urls import reverse
 import uuid
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 from datetime import datetime
 from datetime import date
@@ -13,6 +16,7 @@ from datetime import date
 class Genre(models.Model):
     """ Model representing a book genre."""
     name = models.CharField(max_length=200, help_text="Enter a book genre")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         permissions = (("can_add", "Can add genres"),)
@@ -28,6 +32,79 @@ class Genre(models.Model):
 # Book Model
 
 
+# Book columns counting the reviews with 1 to 5 stars
+STAR_FIELDS = ('stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
+
+
+class BookQuerySet(models.QuerySet):
+    """QuerySet for books, the per-book stats are stored counters on Book"""
+
+    def counted_stats(self):
+        """Expressions counting each book's BookInstance and Review rows, to verify or refill the stored counters"""
+        instances = BookInstance.objects.filter(
+            book=OuterRef('pk')).order_by().values('book')
+        reviews = Review.objects.filter(
+            book=OuterRef('pk')).order_by().values('book')
+        return {
+            'copies_available': Coalesce(Subquery(
+                instances.filter(status='a').annotate(n=Count('pk')).values('n')), 0),
+            'total_copies': Coalesce(Subquery(
+                instances.annotate(n=Count('pk')).values('n')), 0),
+            'review_count': Coalesce(Subquery(
+                reviews.annotate(n=Count('pk')).values('n')), 0),
+            'star_sum': Coalesce(Subquery(
+                reviews.annotate(total=Sum('stars')).values('total')), 0),
+            **{name: Coalesce(Subquery(
+                reviews.filter(stars=stars).annotate(n=Count('pk')).values('n')), 0)
+               for stars, name in enumerate(STAR_FIELDS, 1)},
+        }
+
+    def with_counted_stats(self):
+        """Annotate stats counted from BookInstance and Review rows, used to verify the stored counters"""
+        return self.annotate(**{f'counted_{name}': value
+                                for name, value in self.counted_stats().items()})
+
+    def recount(self):
+        """Refill the stored counters with one UPDATE that counts the rows as it writes"""
+        counted = self.counted_stats()
+        return self.update(rating=rating_expression(counted['star_sum'], counted['review_count']),
+                           updated_at=timezone.now(), **counted)
+
+    def for_display(self):
+        """Author and genres, everything a book card or detail page renders"""
+        return self.select_related('author').prefetch_related('genre')
+
+    def adjust_counters(self, book_id, *, with_author=True, **deltas):
+        """Apply counter deltas to a book with a single UPDATE ... SET col = col + n"""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if book_id is None or not deltas:
+            return
+        values = {}
+        if 'star_sum' in deltas or 'review_count' in deltas:
+            # ahead of the counters in the SET list, MySQL reads columns already assigned to
+            values['rating'] = rating_expression(
+                F('star_sum') + deltas.get('star_sum', 0),
+                F('review_count') + deltas.get('review_count', 0))
+        values.update({name: F(name) + delta for name, delta in deltas.items()})
+        self.filter(pk=book_id).update(updated_at=timezone.now(), **values)
+        # the author's totals over their books move with the book's
+        author_deltas = {name: delta for name, delta in deltas.items() if name in AUTHOR_COUNTERS}
+        if author_deltas and with_author:
+            Author.objects.filter(pk=Subquery(self.filter(pk=book_id).values('author_id'))).update(
+                updated_at=timezone.now(),
+                **{name: F(name) + delta for name, delta in author_deltas.items()})
+
+
+def star_deltas(stars, delta=1):
+    """Counter delta for the histogram column of a review's stars, none for stars outside 1-5"""
+    return {STAR_FIELDS[stars - 1]: delta} if stars in range(1, 6) else {}
+
+
+def rating_expression(star_sum, review_count):
+    """Average stars from the two counters, 0 for a book without reviews"""
+    return Coalesce(Cast(star_sum, models.FloatField()) / NullIf(review_count, 0), 0.0)
+
+
 class Book(models.Model):
     """Model representing a book (but not a specific copy of a book)"""
     title = models.CharField(max_length=200)
@@ -39,6 +116,9 @@ class Book(models.Model):
 
     cover_img = models.ImageField(
         upload_to='book_covers/', null=True, blank=True)
+    # resized variants of the cover (catalog.covers): None while the build-cover-variants
+    # job has yet to build them, False without a cover or when it couldn't be read
+    cover_variants = models.BooleanField(null=True, default=False, editable=False)
     publication_date = models.DateField(blank=True, default=date.today)
     # foreign key used because a book can only have one author, but authors can have written multiple books
     author = models.ForeignKey('Author', on_delete=models.SET_NULL, null=True)
@@ -47,9 +127,40 @@ class Book(models.Model):
     genre = models.ManyToManyField(
         Genre, help_text='Select a genre for this book')
 
+    # counters kept in sync by catalog.signals, rebuild with manage.py rebuild_book_counters
+    copies_available = models.PositiveIntegerField(default=0, editable=False)
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    star_sum = models.IntegerField(default=0, editable=False)
+    stars_1 = models.PositiveIntegerField(default=0, editable=False)
+    stars_2 = models.PositiveIntegerField(default=0, editable=False)
+    stars_3 = models.PositiveIntegerField(default=0, editable=False)
+    stars_4 = models.PositiveIntegerField(default=0, editable=False)
+    stars_5 = models.PositiveIntegerField(default=0, editable=False)
+    # sort keys for the book list: star_sum / review_count (0 without reviews) and str(author)
+    rating = models.FloatField(default=0, editable=False)
+    author_sort = models.CharField(max_length=302, blank=True, editable=False)
+
+    # title, author, isbn, genres and description, maintained by catalog.search
+    search_document = models.TextField(blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
     class Meta:
         permissions = (("can_edit", "Edit existing books"), ("can_add", "Can add new books"),
                        ('can_delete', "Can delete books"))
+        indexes = [
+            # book list order and its cursor pagination
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+            # the other book list sorts, see BookListView.sorts
+            models.Index(fields=['publication_date', 'id'], name='book_published_idx'),
+            models.Index(fields=['author_sort', 'id'], name='book_author_sort_idx'),
+            models.Index(fields=['rating', 'id'], name='book_rating_idx'),
+            models.Index(fields=['copies_available', 'id'], name='book_available_idx'),
+            # covers waiting for the build-cover-variants job
+            models.Index(fields=['cover_variants'], name='book_cover_variants_idx'),
+        ]
 
     def __str__(self):
         """ String representation of the Model object"""
@@ -65,34 +176,23 @@ class Book(models.Model):
 
     display_genre.short_description = 'Genre'
 
-    def at_least_one_bookinst_is_avail(self):
-        book_insts = BookInstance.objects.filter(book=self)
-        for inst in book_insts:
-            if inst.status == 'a':
-                return True
-        return False
-
-    def num_copies_avail(self):
-        book_insts = BookInstance.objects.filter(book=self)
-        num_avail = 0
-        for book in book_insts:
-            if book.status == 'a':
-                num_avail += 1
-        return num_avail
-
-    def total_copies(self):
-        return BookInstance.objects.filter(book=self).count()
-
-    def average_review(self):
-        reviews = Review.objects.filter(book=self)
-        counter = 0
-        summer = 0
-        for review in reviews:
-            summer += review.stars
-            counter += 1
-        if counter == 0:
-            return -1
-        return summer/counter
+    @property
+    def is_available(self):
+        return self.copies_available > 0
+
+    @property
+    def avg_stars(self):
+        """Average review stars, None when the book has no reviews"""
+        if not self.review_count:
+            return None
+        return self.star_sum / self.review_count
+
+    def star_histogram(self):
+        """[(stars, count, percent of reviews)] from 5 stars down to 1"""
+        counts = [getattr(self, name) for name in STAR_FIELDS]
+        total = sum(counts)
+        return [(stars, count, round(100 * count / total) if total else 0)
+                for stars, count in reversed(list(enumerate(counts, 1)))]
 
     # def display_num_of_reviews(self):
     #     """Create a string showing how many reviews a book has"""
@@ -114,14 +214,23 @@ class Review(models.Model):
         default=date.today, blank=True)
     book = models.ForeignKey(
         Book, on_delete=models.CASCADE, null=True, related_name="reviews")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date_written']
+        indexes = [
+            models.Index(fields=['book', 'date_written'], name='review_book_date_idx'),
+        ]
 
     def __str__(self):
         """String representing the model object"""
         return self.body
 
+    def save(self, *args, **kwargs):
+        # book counters are updated in post_save, keep them in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     # def get_date_written(self):
     #     return date_written.date()
 
@@ -148,31 +257,89 @@ class BookInstance(models.Model):
         default='u',
         help_text='Book availability',
     )
+    due_back = models.DateField(
+        null=True, blank=True, help_text='Return date of a checked out copy')
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         permissions = (("can_marked_returned", "Set book as returned"),
                        ("can_add_edit", "Can add/edit book instances"),)
+        indexes = [
+            # available copies of a book, for availability and checkout
+            models.Index(fields=['book', 'status'], name='copy_book_status_idx'),
+            # a user's loans, also serves borrower IS NOT NULL for all loans
+            models.Index(fields=['borrower', 'status'], name='copy_borrower_status_idx'),
+        ]
 
     def __str__(self):
         """String representing the model object"""
         return f'{self.id} ({self.book.title})'
 
+    def save(self, *args, **kwargs):
+        # book counters are updated in post_save, keep them in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_status(self):
         return self.status
 
 
+# Book counters summed per author, plus the number of books
+AUTHOR_COUNTERS = ('copies_available', 'review_count', 'star_sum')
+
+
+class AuthorQuerySet(models.QuerySet):
+    """QuerySet for authors, the totals over their books are stored counters on Author"""
+
+    def counted_stats(self):
+        """Expressions totalling each author's Book rows, to verify or refill the stored counters"""
+        books = Book.objects.filter(author=OuterRef('pk')).order_by().values('author')
+        counted = {'book_count': Coalesce(Subquery(books.annotate(n=Count('pk')).values('n')), 0)}
+        for name in AUTHOR_COUNTERS:
+            counted[name] = Coalesce(Subquery(books.annotate(total=Sum(name)).values('total')), 0)
+        return counted
+
+    def with_counted_stats(self):
+        return self.annotate(**{f'counted_{name}': value
+                                for name, value in self.counted_stats().items()})
+
+    def recount(self):
+        """Refill the stored counters from the books, after bulk loads that skip the signals"""
+        return self.update(updated_at=timezone.now(), **self.counted_stats())
+
+    def adjust_counters(self, author_id, **deltas):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if author_id is None or not deltas:
+            return
+        self.filter(pk=author_id).update(
+            updated_at=timezone.now(), **{name: F(name) + delta for name, delta in deltas.items()})
+
+
 class Author(models.Model):
     """Model representing an Author"""
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=200)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('Died', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # totals over the author's books, kept in sync by catalog.signals and
+    # BookQuerySet.adjust_counters, rebuild with manage.py rebuild_book_counters
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+    copies_available = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    star_sum = models.IntegerField(default=0, editable=False)
+
+    objects = AuthorQuerySet.as_manager()
 
     class Meta:
         ordering = ['last_name', 'first_name']
         permissions = (("can_add", "Can add authors"),
                        ("can_edit", "Can edit authors"),
                        ("can_delete", "Can delete authors"))
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_idx'),
+        ]
 
     def get_absolute_url(self):
         """Returns the url to access a particulat author instance"""
@@ -181,3 +348,219 @@ class Author(models.Model):
     def __str__(self):
         """String representation for the Model object"""
         return f'{self.last_name}, {self.first_name}'
+
+    @property
+    def avg_stars(self):
+        """Average stars over every review of the author's books, None without reviews"""
+        if not self.review_count:
+            return None
+        return self.star_sum / self.review_count
+
+
+class SearchToken(models.Model):
+    """Inverted index row for catalog search on databases without full-text indexes"""
+    token = models.CharField(max_length=50)
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = (('token', 'book'),)
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.token} ({self.book_id})'
+
+
+class Hold(models.Model):
+    """Model representing a user's place in the FIFO queue for a book"""
+    HOLD_STATUS = (
+        ('w', 'Waiting'),
+        ('y', 'Ready for pickup'),
+        ('f', 'Fulfilled'),
+        ('c', 'Cancelled'),
+        ('e', 'Expired'),
+    )
+    ACTIVE_STATUSES = ('w', 'y')
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=1, choices=HOLD_STATUS, default='w')
+    # the copy set aside once the hold is ready
+    instance = models.ForeignKey(
+        BookInstance, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['book', 'status', 'created_at'], name='hold_queue_idx'),
+            models.Index(fields=['user', 'status'], name='hold_user_idx'),
+            # expire_holds looks for ready holds past their pickup time
+            models.Index(fields=['status', 'expires_at'], name='hold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.user} - {self.book} ({self.get_status_display()})'
+
+
+class AvailabilityChunk(models.Model):
+    """One slice of a bitmap of books with a copy available, see catalog.availability.
+
+    Bit ``n`` of chunk ``c`` stands for book id ``c * CHUNK_BITS + n``. Scope 0
+    holds every available book, any other scope the available books of the
+    genre with that id.
+    """
+    scope = models.PositiveIntegerField()
+    chunk = models.PositiveIntegerField()
+    bits = models.BinaryField()
+
+    class Meta:
+        unique_together = (('scope', 'chunk'),)
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.scope}:{self.chunk}'
+
+
+class ReviewSubmission(models.Model):
+    """A posted review waiting to become a Review, see catalog.reviews"""
+    SUBMISSION_STATUS = (
+        ('q', 'Queued'),
+        ('h', 'Held for moderation'),
+        ('a', 'Approved by a moderator'),
+    )
+    PENDING_STATUSES = ('q', 'a')
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='review_submissions')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    writer = models.CharField(max_length=200)
+    body = models.TextField(max_length=2000)
+    stars = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)],
+        help_text='Between 1 and 5 stars')
+    status = models.CharField(max_length=1, choices=SUBMISSION_STATUS, default='q')
+    # why the moderation hook held it
+    note = models.CharField(max_length=200, blank=True)
+    submitted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='submission_queue_idx'),
+        ]
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.writer} on {self.book_id} ({self.get_status_display()})'
+
+
+class LoanEventBase(models.Model):
+    """One entry of the loan ledger, see catalog.ledger.
+
+    Rows are never updated. Book, copy and user are plain references rather
+    than constrained foreign keys, so history outlives deleted rows.
+    """
+    EVENT_KINDS = (
+        ('h', 'Reserved'),
+        ('o', 'Checked out'),
+        ('r', 'Returned'),
+        ('c', 'Hold cancelled'),
+        ('e', 'Hold expired'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=1, choices=EVENT_KINDS)
+    # book and user lead the composite indexes of the concrete tables
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, related_name='+')
+    instance = models.ForeignKey(BookInstance, on_delete=models.DO_NOTHING, db_constraint=False,
+                                 null=True, blank=True, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, null=True, blank=True, related_name='+')
+    occurred_at = models.DateTimeField(default=timezone.now)
+    due_back = models.DateField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['-occurred_at', '-id']
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.get_kind_display()} {self.book_id} by {self.user_id} at {self.occurred_at}'
+
+
+class LoanEvent(LoanEventBase):
+    """Recent ledger entries, older ones are moved to ArchivedLoanEvent by compact_loan_ledger"""
+
+    class Meta(LoanEventBase.Meta):
+        indexes = [
+            models.Index(fields=['user', 'occurred_at'], name='loanevent_user_idx'),
+            models.Index(fields=['book', 'occurred_at'], name='loanevent_book_idx'),
+            # compaction takes the oldest events first
+            models.Index(fields=['occurred_at'], name='loanevent_time_idx'),
+        ]
+
+
+class ArchivedLoanEvent(LoanEventBase):
+    """Compacted ledger entries, same ids and columns as when they were LoanEvents"""
+    id = models.BigIntegerField(primary_key=True)
+
+    class Meta(LoanEventBase.Meta):
+        indexes = [
+            models.Index(fields=['user', 'occurred_at'], name='archivedloan_user_idx'),
+            models.Index(fields=['book', 'occurred_at'], name='archivedloan_book_idx'),
+        ]
+
+
+class LoanRollup(models.Model):
+    """Ledger events per book, kind and month, counted as they are archived"""
+    month = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, related_name='+')
+    kind = models.CharField(max_length=1, choices=LoanEventBase.EVENT_KINDS)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('book', 'month', 'kind'),)
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.book_id} {self.month:%Y-%m} {self.get_kind_display()}: {self.count}'
+
+
+class Job(models.Model):
+    """A periodic maintenance task and when it runs next, see catalog.jobs"""
+    JOB_STATUS = (
+        ('', 'Never run'),
+        ('ok', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100, unique=True)
+    interval = models.DurationField()
+    # pushed ahead by the lease while the job runs, so a crashed run is retried
+    next_run_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=6, choices=JOB_STATUS, blank=True)
+    last_result = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['next_run_at', 'id']
+
+    def __str__(self):
+        """String representing the model object"""
+        return self.name
+
+
+class SiteCounter(models.Model):
+    """Flushed total of a hit counter, see catalog.counters"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """String representing the model object"""
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,248 @@
+"""Keyset (cursor) pagination for list views.
+
+Instead of ``OFFSET n`` and a ``COUNT(*)``, each page seeks past the ordering
+key of the last row it showed, so every page costs the same as the first.
+Cursors are signed tokens carrying that key, handed to templates as
+``page_obj.next_cursor`` / ``page_obj.previous_cursor``.
+"""
+import json
+from collections.abc import Sequence
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SALT = 'catalog.pagination.cursor'
+
+
+class CursorSerializer:
+    """signing serializer that also handles dates, decimals and UUIDs in keys"""
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=DjangoJSONEncoder, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+def encode_cursor(key, direction):
+    return signing.dumps({'k': key, 'd': direction}, salt=CURSOR_SALT,
+                         serializer=CursorSerializer, compress=True)
+
+
+def decode_cursor(token):
+    """(key, direction) from a cursor token, raises ValueError if it was tampered with"""
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT, serializer=CursorSerializer)
+        return list(data['k']), data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def key_for(obj, ordering):
+    """Values of the ordering fields for one row (a model or a values() dict), following __ lookups"""
+    key = []
+    for field in ordering:
+        name = field.lstrip('-')
+        if isinstance(obj, dict):
+            key.append(obj[name])
+            continue
+        value = obj
+        for attr in name.split('__'):
+            value = getattr(value, attr) if value is not None else None
+        key.append(value)
+    return key
+
+
+def seek_filter(ordering, key, forwards=True):
+    """Q for rows strictly after ``key`` in ``ordering`` (before it if not forwards)"""
+    seek = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forwards else 'gt'
+        clause = Q(**{f'{name}__{lookup}': key[i]})
+        for prev_field, prev_value in zip(ordering[:i], key[:i]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        seek |= clause
+    return seek
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+class CursorPage(Sequence):
+    """One page of a CursorPaginator, usable where templates expect a Page"""
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginates ``queryset`` by seeking on ``ordering``, which must end in a unique field"""
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def page(self, cursor=None):
+        """The page after (or before) ``cursor``, the first page when it is empty"""
+        forwards = True
+        key = None
+        if cursor:
+            key, direction = decode_cursor(cursor)
+            if len(key) != len(self.ordering) or direction not in ('n', 'p'):
+                raise ValueError('Invalid cursor')
+            forwards = direction == 'n'
+        ordering = self.ordering if forwards else reverse_ordering(self.ordering)
+
+        # one extra row tells us whether there is another page, without a COUNT
+        rows = self.fetch(self.queryset, key, forwards, ordering, self.per_page + 1)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forwards:
+            rows.reverse()
+
+        has_next = more if forwards else True
+        has_previous = bool(cursor) if forwards else more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(key_for(rows[-1], self.ordering), 'n')
+        if rows and has_previous:
+            previous_cursor = encode_cursor(key_for(rows[0], self.ordering), 'p')
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def fetch(self, queryset, key, forwards, ordering, limit):
+        if key is not None:
+            queryset = queryset.filter(seek_filter(self.ordering, key, forwards))
+        return list(queryset.order_by(*ordering)[:limit])
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Paginates several querysets with the same columns as if they were one.
+
+    Each page reads a page from every queryset and merges them, e.g. a table
+    of recent rows and its archive.
+    """
+
+    def __init__(self, querysets, per_page, ordering):
+        super().__init__(None, per_page, ordering)
+        self.querysets = list(querysets)
+
+    def fetch(self, queryset, key, forwards, ordering, limit):
+        rows = []
+        for part in self.querysets:
+            rows += super().fetch(part, key, forwards, ordering, limit)
+        # stable sorts from the last ordering field to the first
+        for i in reversed(range(len(ordering))):
+            rows.sort(key=lambda row: key_for(row, ordering[i:i + 1])[0],
+                      reverse=ordering[i].startswith('-'))
+        return rows[:limit]
+
+
+class IdSetPaginator:
+    """Cursor pagination in id order over a precomputed set of ids.
+
+    ``ids`` answers ``after(id, limit)`` and ``before(id, limit)`` with
+    ascending ids, e.g. catalog.availability.AvailableBooks; the rows of a
+    page are then read from ``queryset`` by primary key.
+    """
+    ordering = ('id',)
+
+    def __init__(self, ids, queryset, per_page):
+        self.ids = ids
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    def page(self, cursor=None):
+        forwards = True
+        last_id = None
+        if cursor:
+            key, direction = decode_cursor(cursor)
+            if len(key) != 1 or direction not in ('n', 'p') or not isinstance(key[0], int):
+                raise ValueError('Invalid cursor')
+            forwards = direction == 'n'
+            last_id = key[0]
+
+        if forwards:
+            ids = self.ids.after(last_id, self.per_page + 1)
+            more = len(ids) > self.per_page
+            ids = ids[:self.per_page]
+        else:
+            ids = self.ids.before(last_id, self.per_page + 1)
+            more = len(ids) > self.per_page
+            ids = ids[-self.per_page:]
+        rows = self.queryset.in_bulk(ids)
+        # a set lagging behind a deleted book just shows a shorter page
+        object_list = [rows[pk] for pk in ids if pk in rows]
+
+        has_next = more if forwards else True
+        has_previous = bool(cursor) if forwards else more
+        next_cursor = encode_cursor(ids[-1:], 'n') if ids and has_next else None
+        previous_cursor = encode_cursor(ids[:1], 'p') if ids and has_previous else None
+        return CursorPage(object_list, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    """Opt-in keyset pagination for a ListView.
+
+    Set ``cursor_ordering`` to a stable key ending in a unique field. Requests
+    with the usual ``?page=N`` still get Django's offset pagination.
+    """
+    cursor_ordering = None
+    cursor_kwarg = 'cursor'
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def get_cursor_paginator(self, queryset, page_size):
+        """Paginator with a page(cursor) method, None for offset pagination"""
+        ordering = self.get_cursor_ordering()
+        if not ordering or self.page_kwarg in self.request.GET:
+            return None
+        return CursorPaginator(queryset, page_size, ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        if paginator is None:
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except ValueError:
+            raise Http404('Invalid cursor')
+        page.next_query = self.cursor_query(page.next_cursor)
+        page.previous_query = self.cursor_query(page.previous_cursor)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def cursor_query(self, cursor):
+        """Current query string with the cursor swapped, so filters survive paging"""
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        params[self.cursor_kwarg] = cursor
+        return params.urlencode()
@@ -0,0 +1,154 @@
+"""Read-replica routing for the catalog's read views.
+
+``settings.CATALOG_DB_REPLICAS`` names database aliases that are read-only
+copies of ``default``. ``ReplicaMiddleware`` routes the reads of a safe
+(GET/HEAD) request to one of them, picked per request, but only when the view
+opts in with a ``replica_reads = True`` class attribute or the
+``replica_reads`` decorator. Every other read, and every read outside a
+request (commands, jobs), stays on the primary.
+
+Replicas lag behind the primary, so a client must see its own writes:
+
+* the first write in a request pins the rest of that request to the primary;
+* a request that wrote, or used an unsafe method, sets a short-lived
+  PIN_COOKIE, and the client's requests read the primary until it expires
+  (CATALOG_REPLICA_PIN_SECONDS). Posting a review and being redirected to the
+  book, or reserving and landing on "my books", reads the primary.
+
+Anything stored in the catalog cache is read inside ``primary_reads()``.
+Invalidation bumps a version as soon as a row is written, and a replica that
+hasn't caught up would otherwise fill the new version with the old rows.
+
+The routing state lives in a context variable, so it follows a request onto
+the worker threads of catalog.async_views.
+"""
+import asyncio
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'catalog_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = contextvars.ContextVar('catalog_replica_routing', default=None)
+
+
+def replica_reads(view_func):
+    """Let a read-only function view read from a replica"""
+    view_func.replica_reads = True
+    return view_func
+
+
+def reads_from_replica(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_class or view_func, 'replica_reads', False)
+
+
+def replicas():
+    return list(getattr(settings, 'CATALOG_DB_REPLICAS', ()))
+
+
+class RoutingState:
+    """Where the current request reads from, mutated in place so worker threads share it"""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+    @property
+    def read_alias(self):
+        return None if self.wrote else self.replica
+
+
+def current_read_alias():
+    """The replica the current request reads from, None for the primary"""
+    state = _routing.get()
+    return state.read_alias if state is not None else None
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Read from the primary inside the block, for rows that fill a cache"""
+    state = _routing.get()
+    if state is None or state.replica is None:
+        yield
+        return
+    replica, state.replica = state.replica, None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaRouter:
+    """Reads of opted-in requests go to their replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return current_read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing.get()
+        aliases = replicas()
+        if (state is not None and aliases and request.method in SAFE_METHODS
+                and PIN_COOKIE not in request.COOKIES and reads_from_replica(view_func)):
+            state.replica = random.choice(aliases)
+        return None
+
+    def finish(self, request, response, state):
+        if replicas() and (state.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.CATALOG_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
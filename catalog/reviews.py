@@ -0,0 +1,109 @@
+"""Review ingestion: posted reviews are queued and applied in batches.
+
+Posting a review is one INSERT of a ReviewSubmission. ``apply_batch``, run by
+``manage.py process_reviews``, takes the oldest queued submissions, asks the
+moderation hook about each, writes the approved ones as Review rows with one
+bulk insert, and moves each book's review counters (rating and star histogram
+included) and cache versions once per batch rather than once per review.
+
+The hook is ``settings.CATALOG_REVIEW_MODERATOR``, a callable taking a
+submission and returning APPROVE, HOLD or REJECT (optionally with a note, as
+a tuple). Held submissions wait in the admin, where approving one queues it
+again past the hook.
+"""
+import re
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .caching import book_scopes, invalidate
+from .models import Book, Review, ReviewSubmission, star_deltas
+
+APPROVE, HOLD, REJECT = 'approve', 'hold', 'reject'
+BATCH_SIZE = 200
+LINK_RE = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+BatchResult = namedtuple('BatchResult', 'applied held rejected')
+
+
+def default_moderator(submission):
+    """Hold reviews with links for a moderator, approve the rest"""
+    if LINK_RE.search(submission.body):
+        return HOLD, 'contains a link'
+    return APPROVE
+
+
+def get_moderator():
+    return import_string(settings.CATALOG_REVIEW_MODERATOR)
+
+
+def writer_name(user):
+    return user.get_full_name() or user.get_username()
+
+
+def moderate(moderator, submission):
+    """(verdict, note) for one queued submission"""
+    if submission.status == 'a':
+        return APPROVE, ''
+    verdict = moderator(submission)
+    verdict, note = verdict if isinstance(verdict, tuple) else (verdict, '')
+    if verdict not in (APPROVE, HOLD, REJECT):
+        raise ValueError(f'Moderator returned {verdict!r}')
+    return verdict, note
+
+
+def apply_batch(batch_size=BATCH_SIZE, moderator=None):
+    """Apply up to ``batch_size`` of the oldest queued submissions in one transaction"""
+    moderator = moderator or get_moderator()
+    with transaction.atomic():
+        queued = ReviewSubmission.objects.filter(
+            status__in=ReviewSubmission.PENDING_STATUSES).order_by('id')
+        # concurrent workers take different batches where SKIP LOCKED is supported
+        if connection.features.has_select_for_update_skip_locked:
+            queued = queued.select_for_update(skip_locked=True)
+        submissions = list(queued[:batch_size])
+
+        reviews, held, done = [], defaultdict(list), []
+        for submission in submissions:
+            verdict, note = moderate(moderator, submission)
+            if verdict == HOLD:
+                held[note[:200]].append(submission.pk)
+                continue
+            done.append(submission.pk)
+            if verdict == APPROVE:
+                reviews.append(Review(
+                    book_id=submission.book_id, writer=submission.writer, body=submission.body,
+                    stars=submission.stars,
+                    date_written=timezone.localdate(submission.submitted_at)))
+
+        # bulk_create skips the Review signals, so the counters move here, once per book
+        Review.objects.bulk_create(reviews)
+        for note, pks in held.items():
+            ReviewSubmission.objects.filter(pk__in=pks).update(status='h', note=note)
+        ReviewSubmission.objects.filter(pk__in=done).delete()
+        totals = defaultdict(lambda: defaultdict(int))
+        for review in reviews:
+            deltas = totals[review.book_id]
+            deltas['review_count'] += 1
+            deltas['star_sum'] += review.stars
+            for name, delta in star_deltas(review.stars).items():
+                deltas[name] += delta
+        for book_id, deltas in totals.items():
+            Book.objects.adjust_counters(book_id, **deltas)
+        if totals:
+            invalidate(*book_scopes(*totals))
+    return BatchResult(len(reviews), sum(len(pks) for pks in held.values()),
+                       len(done) - len(reviews))
+
+
+def drain(batch_size=BATCH_SIZE, moderator=None):
+    """Apply batches until the queue is empty, returns the summed BatchResult"""
+    total = BatchResult(0, 0, 0)
+    while True:
+        result = apply_batch(batch_size, moderator)
+        total = BatchResult(*(a + b for a, b in zip(total, result)))
+        if sum(result) < batch_size:
+            return total
@@ -0,0 +1,122 @@
+"""Catalog search over title, description, author, ISBN and genre.
+
+Every book keeps a denormalized ``search_document``. On MySQL the document has
+a FULLTEXT index and queries go through ``MATCH ... AGAINST`` in boolean mode.
+Other backends (SQLite in tests) use the ``SearchToken`` inverted index, where
+each (token, book) row carries the summed weight of the fields it came from.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import Book, SearchToken
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 50
+
+# how much a match in each field counts towards the rank
+FIELD_WEIGHTS = {
+    'title': 5,
+    'isbn': 5,
+    'author': 3,
+    'genre': 2,
+    'description': 1,
+}
+
+
+def tokenize(text):
+    """Lowercased word tokens, short tokens dropped and long ones truncated"""
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall((text or '').lower())
+            if len(token) >= MIN_TOKEN_LENGTH]
+
+
+def uses_fulltext():
+    return connection.vendor == 'mysql'
+
+
+def book_fields(book):
+    """Searchable text of a book, keyed like FIELD_WEIGHTS"""
+    author = book.author
+    return {
+        'title': book.title,
+        'isbn': book.isbn,
+        'author': f'{author.first_name} {author.last_name}' if author else '',
+        'genre': ' '.join(genre.name for genre in book.genre.all()),
+        'description': book.description,
+    }
+
+
+def build_document(fields):
+    """Search document text from book_fields()"""
+    return ' '.join(text for text in fields.values() if text)
+
+
+def token_weights(fields):
+    """{token: weight} from book_fields(), summing the weights of every field a token occurs in"""
+    weights = {}
+    for field, text in fields.items():
+        for token in set(tokenize(text)):
+            weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field]
+    return weights
+
+
+def index_book(book):
+    """Rebuild the search document (and tokens when not on MySQL) for one book"""
+    fields = book_fields(book)
+    with transaction.atomic():
+        Book.objects.filter(pk=book.pk).update(search_document=build_document(fields))
+        if uses_fulltext():
+            return
+        SearchToken.objects.filter(book=book).delete()
+        SearchToken.objects.bulk_create(
+            SearchToken(token=token, book=book, weight=weight)
+            for token, weight in token_weights(fields).items())
+
+
+def search_books(queryset, query, prefix=True):
+    """Filter ``queryset`` to books matching every term of ``query``, best match first.
+
+    With ``prefix`` the last term also matches longer words, for typeahead.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    if uses_fulltext():
+        return _fulltext_search(queryset, terms, prefix)
+    return _token_search(queryset, terms, prefix)
+
+
+def suggest_titles(prefix, limit=10):
+    """Typeahead suggestions, (pk, title) of the best matches for a partial query"""
+    books = search_books(Book.objects.all(), prefix, prefix=True)
+    return list(books.values_list('pk', 'title')[:limit])
+
+
+def _term_lookup(term, is_prefix):
+    return Q(token__startswith=term) if is_prefix else Q(token=term)
+
+
+def _token_search(queryset, terms, prefix):
+    any_term = Q()
+    for i, term in enumerate(terms):
+        lookup = _term_lookup(term, prefix and i == len(terms) - 1)
+        any_term |= lookup
+        queryset = queryset.filter(
+            pk__in=SearchToken.objects.filter(lookup).values('book'))
+    rank = (SearchToken.objects.filter(any_term, book=OuterRef('pk'))
+            .order_by().values('book').annotate(rank=Sum('weight')).values('rank'))
+    return queryset.annotate(rank=Subquery(rank)).order_by('-rank', 'title', 'pk')
+
+
+def _fulltext_search(queryset, terms, prefix):
+    boolean_query = ' '.join(f'+{term}' for term in terms)
+    if prefix:
+        boolean_query += '*'
+    rank = RawSQL(
+        f'MATCH ({Book._meta.db_table}.search_document) AGAINST (%s IN BOOLEAN MODE)',
+        (boolean_query,))
+    return (queryset.annotate(rank=rank).filter(rank__gt=0)
+            .order_by('-rank', 'title', 'pk'))
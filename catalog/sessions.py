@@ -0,0 +1,30 @@
+"""Expired session cleanup in batches.
+
+Django's clearsessions deletes every expired row in one statement, which on
+a busy django_session table holds locks for a long time. ``clear_expired``
+deletes BATCH_SIZE rows per transaction instead, walking the expire_date
+index. Engines that keep no rows (cache, signed cookies) have nothing to
+clean up.
+"""
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+DB_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+BATCH_SIZE = 1000
+
+
+def stores_rows():
+    return settings.SESSION_ENGINE in DB_ENGINES
+
+
+def clear_expired(batch_size=BATCH_SIZE, now=None):
+    """Delete expired django_session rows, returns how many"""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+                    .values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
@@ -0,0 +1,273 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_init, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import availability, circulation
+from .caching import book_scopes, invalidate
+from .models import AUTHOR_COUNTERS, Author, Book, BookInstance, Genre, Review, star_deltas
+from .search import index_book
+
+
+# ids of books whose delete is under way, between their pre_delete and post_delete
+_deleting_books = set()
+
+
+# BookInstance -> copies_available, total_copies, availability sets, cached book pages
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_bookinstance_state(sender, instance, **kwargs):
+    # read from __dict__ so deferred fields don't trigger a query
+    instance._counter_state = (
+        instance.__dict__.get('book_id'), instance.__dict__.get('status'))
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_book_id, old_status = (None, None) if created else instance._counter_state
+    new_book_id, new_status = instance.book_id, instance.status
+    invalidate(*book_scopes(old_book_id, new_book_id))
+    if created or old_book_id != new_book_id:
+        if not created:
+            Book.objects.adjust_counters(old_book_id, total_copies=-1,
+                                         copies_available=-(old_status == 'a'))
+            availability.copies_changed(old_book_id, -(old_status == 'a'))
+        Book.objects.adjust_counters(new_book_id, total_copies=1,
+                                     copies_available=int(new_status == 'a'))
+        availability.copies_changed(new_book_id, int(new_status == 'a'))
+    elif old_status != new_status:
+        delta = int(new_status == 'a') - int(old_status == 'a')
+        Book.objects.adjust_counters(new_book_id, copies_available=delta)
+        availability.copies_changed(new_book_id, delta)
+    if new_status == 'a' and (created or old_status != 'a' or old_book_id != new_book_id):
+        # readers in the queue get a newly free copy before anyone else can take it
+        hold = circulation.offer_copy(instance)
+        if hold is not None:
+            instance.status, instance.borrower_id, instance.due_back = 'r', hold.user_id, None
+    instance._counter_state = (new_book_id, instance.status)
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    invalidate(*book_scopes(instance.book_id))
+    Book.objects.adjust_counters(instance.book_id, total_copies=-1,
+                                 copies_available=-(instance.status == 'a'))
+    availability.copies_changed(instance.book_id, -(instance.status == 'a'))
+
+
+# Review -> review_count, star_sum, star histogram, cached book pages
+
+
+@receiver(post_init, sender=Review)
+def remember_review_state(sender, instance, **kwargs):
+    instance._counter_state = (
+        instance.__dict__.get('book_id'), instance.__dict__.get('stars'))
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_book_id, old_stars = (None, None) if created else instance._counter_state
+    new_book_id, new_stars = instance.book_id, instance.stars
+    invalidate(*book_scopes(old_book_id, new_book_id))
+    if created or old_book_id != new_book_id:
+        if not created:
+            Book.objects.adjust_counters(old_book_id, review_count=-1,
+                                         star_sum=-(old_stars or 0), **star_deltas(old_stars, -1))
+        Book.objects.adjust_counters(new_book_id, review_count=1, star_sum=new_stars,
+                                     **star_deltas(new_stars))
+    elif old_stars != new_stars:
+        Book.objects.adjust_counters(new_book_id, star_sum=new_stars - (old_stars or 0),
+                                     **star_deltas(old_stars, -1), **star_deltas(new_stars))
+    instance._counter_state = (new_book_id, new_stars)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    invalidate(*book_scopes(instance.book_id))
+    # the author already lost the totals of a book being deleted, see book_deleting
+    Book.objects.adjust_counters(instance.book_id, review_count=-1,
+                                 star_sum=-instance.stars, **star_deltas(instance.stars, -1),
+                                 with_author=instance.book_id not in _deleting_books)
+
+
+# Book -> Author.book_count and the author's share of the book counters
+
+
+@receiver(post_init, sender=Book)
+def remember_book_author(sender, instance, **kwargs):
+    instance._author_state = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Book)
+def book_author_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_author_id = None if created else instance._author_state
+    if created or old_author_id != instance.author_id:
+        # a new book's counters are as saved, an older instance's may be behind the table
+        counters = ({name: getattr(instance, name) for name in AUTHOR_COUNTERS} if created else
+                    Book.objects.filter(pk=instance.pk).values(*AUTHOR_COUNTERS).get())
+        if not created:
+            Author.objects.adjust_counters(
+                old_author_id, book_count=-1, **{name: -n for name, n in counters.items()})
+        Author.objects.adjust_counters(instance.author_id, book_count=1, **counters)
+    instance._author_state = instance.author_id
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    # Review.book is nullable, so the cascade may delete the reviews before or after the book.
+    # Subtract the book's totals here and have review_deleted leave the author alone.
+    counters = Book.objects.filter(pk=instance.pk).values(*AUTHOR_COUNTERS).first()
+    if counters is None:
+        return
+    Author.objects.adjust_counters(
+        instance.author_id, book_count=-1, **{name: -n for name, n in counters.items()})
+    _deleting_books.add(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    # reviews deleted after the book find no author through it
+    _deleting_books.discard(instance.pk)
+
+
+# Book.cover_img -> Book.cover_variants, built by the build-cover-variants job
+
+
+@receiver(post_init, sender=Book)
+def remember_book_cover(sender, instance, **kwargs):
+    cover = instance.__dict__.get('cover_img')
+    instance._cover_state = getattr(cover, 'name', cover) or ''
+
+
+@receiver(pre_save, sender=Book)
+def book_cover_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.cover_img.name if instance.cover_img else ''
+    if instance._state.adding or name != instance._cover_state:
+        instance.cover_variants = None if name else False
+
+
+@receiver(post_save, sender=Book)
+def remember_saved_cover(sender, instance, raw=False, **kwargs):
+    # an upload is stored, and may be renamed, as the book is saved
+    instance._cover_state = instance.cover_img.name if instance.cover_img else ''
+
+
+# Author -> Book.author_sort
+
+
+@receiver(pre_save, sender=Book)
+def book_author_sort(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.author_sort = str(instance.author) if instance.author_id else ''
+
+
+@receiver(pre_delete, sender=Author)
+def author_deleting(sender, instance, **kwargs):
+    # the books' author is set to NULL without saving them, author_deleted re-indexes them
+    instance._book_ids = list(instance.book_set.values_list('pk', flat=True))
+    instance.book_set.update(author_sort='')
+
+
+# Book, Author, Genre -> search index and availability sets
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_book(instance)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # genre.book_set.clear() doesn't say which books it removed
+        instance._cleared_book_ids = list(
+            instance.book_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        index_book(instance)
+        availability.sync_books([instance.pk])
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_book_ids', ())
+    reindex_books(pk_set)
+    availability.sync_books(pk_set)
+
+
+def reindex_books(book_ids):
+    for book in Book.objects.filter(pk__in=book_ids).select_related('author'):
+        index_book(book)
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleting(sender, instance, **kwargs):
+    # the genre's rows in Book.genre.through cascade without m2m_changed
+    instance._book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    availability.drop_genre(instance.pk)
+    reindex_books(instance.__dict__.pop('_book_ids', ()))
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    reindex_books(instance.__dict__.pop('_book_ids', ()))
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    instance.book_set.update(author_sort=str(instance))
+    for book in instance.book_set.select_related('author'):
+        index_book(book)
+
+
+@receiver(post_save, sender=Genre)
+def genre_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    for book in instance.book_set.select_related('author'):
+        index_book(book)
+
+
+# Book, Author, Genre -> cached pages
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book(sender, instance, **kwargs):
+    invalidate(*book_scopes(instance.pk), f'author:{instance.author_id}')
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        # reverse changes (genre.book_set) are covered by the genres scope
+        invalidate(*book_scopes(None if reverse else instance.pk), 'genres')
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author(sender, instance, **kwargs):
+    # book pages show the author's name
+    book_ids = instance.book_set.values_list('pk', flat=True) if instance.pk else ()
+    invalidate(*book_scopes(*book_ids), 'authors', f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre(sender, instance, **kwargs):
+    invalidate('books', 'genres')
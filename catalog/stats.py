@@ -0,0 +1,38 @@
+"""Record counts for the home page."""
+from django.db import connection
+
+from .caching import catalog_cache, version_tag
+from .models import Author, Book
+
+STATS_TIMEOUT = 60
+
+
+def compute_stats():
+    """Book, copy, available copy and author counts in a single query.
+
+    Copy counts come from the per-book counters, so this reads the book and
+    author tables only, never BookInstance. ``connection`` is the primary's,
+    which everything filling the catalog cache reads.
+    """
+    book_table = connection.ops.quote_name(Book._meta.db_table)
+    author_table = connection.ops.quote_name(Author._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT (SELECT COUNT(*) FROM {book_table}), '
+            f'(SELECT COALESCE(SUM(total_copies), 0) FROM {book_table}), '
+            f'(SELECT COALESCE(SUM(copies_available), 0) FROM {book_table}), '
+            f'(SELECT COUNT(*) FROM {author_table})')
+        row = cursor.fetchone()
+    keys = ('num_books', 'num_instances', 'num_instances_avail', 'num_authors')
+    return dict(zip(keys, (int(value) for value in row)))
+
+
+def catalog_stats():
+    """Cached compute_stats(), refreshed when books or authors change or after a minute"""
+    cache = catalog_cache()
+    key = f'catalog:stats:{version_tag("books", "authors")}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
@@ -0,0 +1,33 @@
+from django import template
+
+from catalog.covers import VARIANTS, variant_urls
+
+register = template.Library()
+
+# rendered width of the cover on each page, picks the variant for the src fallback
+DISPLAY_WIDTHS = {
+    'list': ('thumb', 200),
+    'detail': ('medium', 300),
+}
+
+
+@register.inclusion_tag('catalog/cover_picture.html')
+def cover_picture(book, size='list', css_class=''):
+    """<picture> for a book cover with WebP and JPEG srcsets of the derived variants"""
+    variant, width = DISPLAY_WIDTHS[size]
+    context = {'book': book, 'css_class': css_class, 'sizes': f'{width}px'}
+    if not (book.cover_img and book.cover_variants):
+        # no derivatives (not built yet or unreadable source), serve the original as is
+        context['src'] = book.cover_img.url if book.cover_img else None
+        return context
+    urls = variant_urls(book.cover_img)
+
+    def srcset(fmt):
+        return ', '.join(f'{urls[fmt][name]} {box[0]}w' for name, box in VARIANTS.items())
+
+    context.update({
+        'src': urls['jpeg'][variant],
+        'jpeg_srcset': srcset('jpeg'),
+        'webp_srcset': srcset('webp'),
+    })
+    return context
@@ -0,0 +1,15 @@
+"""Test helpers shared by the catalog test suite."""
+
+
+class QueryBudgetMixin:
+    """TestCase mixin checking responses against their view's query budget"""
+
+    def assertWithinQueryBudget(self, response):
+        metrics = getattr(response, 'query_metrics', None)
+        if metrics is None:
+            self.fail('Response has no query metrics, is QueryMetricsMiddleware installed?')
+        if metrics.budget is None:
+            self.fail(f'{metrics.view_name} does not declare a query budget')
+        self.assertLessEqual(
+            metrics.queries, metrics.budget,
+            f'{metrics.view_name} ran {metrics.queries} queries, its budget is {metrics.budget}')
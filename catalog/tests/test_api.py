@@ -0,0 +1,140 @@
+import datetime
+import time
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from catalog.models import Author, Book, BookInstance, Genre, Review
+from catalog.testing import QueryBudgetMixin
+
+
+class CatalogApiTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ann', last_name='Leckie')
+        cls.genre = Genre.objects.create(name='Science Fiction')
+        cls.books = []
+        for i in range(5):
+            book = Book.objects.create(
+                title=f'Book {i}', isbn=f'97800000000{i:02}', author=cls.author,
+                description='A book')
+            book.genre.add(cls.genre)
+            cls.books.append(book)
+        cls.book = cls.books[0]
+        BookInstance.objects.create(book=cls.book, imprint='First', status='a')
+        Review.objects.create(writer='reader', body='Great', stars=4, book=cls.book)
+        Review.objects.create(writer='critic', body='Fine', stars=2, book=cls.book)
+
+    def get(self, name, *args, query='', **headers):
+        response = self.client.get(reverse(name, args=args) + query, **headers)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def test_book_detail(self):
+        response = self.get('api-book', self.book.pk)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['title'], 'Book 0')
+        self.assertEqual(data['copies_available'], 1)
+        self.assertEqual(data['avg_stars'], 3)
+        self.assertTrue(data['is_available'])
+
+    def test_sparse_fields(self):
+        data = self.get('api-book', self.book.pk, query='?fields=title,avg_stars').json()
+        self.assertEqual(data, {'id': self.book.pk, 'title': 'Book 0', 'avg_stars': 3})
+
+    def test_unknown_field_is_a_bad_request(self):
+        response = self.get('api-books', query='?fields=title,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_missing_book(self):
+        self.assertEqual(self.get('api-book', 9999).status_code, 404)
+        self.assertEqual(self.get('api-book-reviews', 9999).status_code, 404)
+
+    def test_cursor_pagination(self):
+        first = self.get('api-books', query='?limit=2&fields=title').json()
+        self.assertEqual([row['title'] for row in first['results']], ['Book 0', 'Book 1'])
+        self.assertIsNone(first['previous'])
+        second = self.get('api-books', query=f'?limit=2&fields=title&cursor={first["next"]}').json()
+        self.assertEqual([row['title'] for row in second['results']], ['Book 2', 'Book 3'])
+        self.assertEqual(self.get('api-books', query='?cursor=junk').status_code, 400)
+
+    def test_batched_lookups(self):
+        ids = f'{self.books[1].pk},{self.books[3].pk}'
+        data = self.get('api-books', query=f'?ids={ids}&fields=title').json()
+        self.assertEqual([row['title'] for row in data['results']], ['Book 1', 'Book 3'])
+        data = self.get('api-books', query='?isbns=9780000000002,nope').json()
+        self.assertEqual([row['isbn'] for row in data['results']], ['9780000000002'])
+        response = self.get('api-books', query='?ids=1,abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get('api-book-copies', self.book.pk, query='?ids=abc').status_code,
+                         400)
+
+    def test_reviews_copies_authors_genres(self):
+        reviews = self.get('api-book-reviews', self.book.pk).json()['results']
+        self.assertEqual(sorted(row['stars'] for row in reviews), [2, 4])
+        copies = self.get('api-book-copies', self.book.pk).json()['results']
+        self.assertEqual([row['status'] for row in copies], ['a'])
+        authors = self.get('api-authors').json()['results']
+        self.assertEqual(authors[0]['last_name'], 'Leckie')
+        self.assertEqual(self.get('api-author', self.author.pk).json()['first_name'], 'Ann')
+        self.assertEqual(self.get('api-genres').json()['results'][0]['name'], 'Science Fiction')
+
+    def test_etag_and_not_modified(self):
+        response = self.get('api-book', self.book.pk)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.get('api-book', self.book.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.get('api-book', self.book.pk,
+                            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # a different field selection is a different representation
+        response = self.get('api-book', self.book.pk, query='?fields=title',
+                            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        later = timezone.now() + datetime.timedelta(seconds=5)
+        Book.objects.filter(pk=self.book.pk).update(title='Renamed', updated_at=later)
+        response = self.get('api-book', self.book.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_when_a_copy_is_borrowed(self):
+        etag = self.get('api-books')['ETag']
+        copy = BookInstance.objects.get(book=self.book)
+        copy.status = 'o'
+        copy.save()
+        response = self.get('api-books', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['copies_available'], 0)
+
+    def test_list_is_modified_when_a_row_is_deleted(self):
+        query = f'?ids={self.books[0].pk},{self.books[1].pk}'
+        response = self.get('api-books', query=query)
+        etag = response['ETag']
+        # deleting a row leaves the newest updated_at of the others as it was
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.books[1].delete()
+        response = self.get('api-books', query=query,
+                            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_author_etag_changes_with_their_counters(self):
+        etag = self.get('api-author', self.author.pk)['ETag']
+        Review.objects.create(writer='reader', body='Good', stars=5, book=self.books[1])
+        response = self.get('api-author', self.author.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['review_count'], 3)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api-books'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,115 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+
+from catalog import async_views, counters
+from catalog.caching import catalog_cache
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.testing import QueryBudgetMixin
+
+# the async read views in front of the regular URLconf, as asgi.py configures it
+async_patterns = [
+    path('', async_views.index, name='index'),
+    path('books/', async_views.book_list, name='books'),
+    path('book/<int:pk>', async_views.book_detail, name='book-detail'),
+    path('authors/', async_views.author_list, name='authors'),
+    path('author/<int:pk>', async_views.author_detail, name='author-detail'),
+]
+urlpatterns = [
+    path('catalog/', include(async_patterns)),
+    path('', include('emilyslibrary.urls')),
+]
+
+
+def create_catalog():
+    author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+    genre = Genre.objects.create(name='Fantasy')
+    book = Book.objects.create(title='A Wizard of Earthsea', isbn='9780547773742', author=author)
+    book.genre.add(genre)
+    BookInstance.objects.create(book=book, imprint='Parnassus', status='a')
+    return author, book
+
+
+class AsyncViewsMixin(QueryBudgetMixin):
+
+    def setUp(self):
+        catalog_cache().clear()
+        self.author, self.book = create_catalog()
+
+    async def get(self, url, **extra):
+        response = await self.async_client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def urls(self):
+        return [
+            reverse('index'),
+            reverse('books'),
+            reverse('book-detail', args=[self.book.pk]),
+            reverse('authors'),
+            reverse('author-detail', args=[self.author.pk]),
+        ]
+
+
+@override_settings(ROOT_URLCONF=__name__, CATALOG_ASYNC_DB_POOL=False)
+class AsyncViewTest(AsyncViewsMixin, TestCase):
+    """Async views on Django's sync thread, which shares the test transaction"""
+
+    async def test_pages_render_within_budget(self):
+        for url in self.urls():
+            response = await self.get(url)
+            self.assertEqual(response.resolver_match.func.__module__, 'catalog.async_views')
+        self.assertContains(await self.get(reverse('books')), 'A Wizard of Earthsea')
+        self.assertContains(
+            await self.get(reverse('book-detail', args=[self.book.pk])), '1 of 1 Copies')
+
+    async def test_index_counts_visits(self):
+        response = await self.get(reverse('index'))
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_visits'], 0)
+        self.async_client.cookies['num_visits'] = response.cookies['num_visits'].value
+        response = await self.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+
+    async def test_index_counts_off_the_event_loop(self):
+        loops = []
+        hit = counters.hit
+
+        def record_loop(name):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return hit(name)
+
+        with mock.patch('catalog.counters.hit', side_effect=record_loop):
+            await self.get(reverse('index'))
+        self.assertEqual(loops, [None])
+
+    async def test_logged_in_user_is_loaded(self):
+        user = await sync_to_async(User.objects.create_user)('reader', password='s3cret-pass')
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertContains(response, 'Reserve a copy')
+
+    @override_settings(ROOT_URLCONF='emilyslibrary.urls')
+    async def test_sync_views_through_async_middleware(self):
+        response = await self.get(reverse('books'))
+        self.assertEqual(response.resolver_match.func.__module__, 'catalog.views')
+        self.assertGreater(response.query_metrics.queries, 0)
+
+
+@override_settings(ROOT_URLCONF=__name__, CATALOG_ASYNC_DB_POOL=True)
+class PooledAsyncViewTest(AsyncViewsMixin, TransactionTestCase):
+    """Async views on the thread pool, each worker with its own connection"""
+
+    async def test_pages_render_within_budget(self):
+        for url in self.urls():
+            await self.get(url)
+        response = await self.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertContains(response, 'A Wizard of Earthsea')
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import availability
+from catalog.availability import AvailableBooks
+from catalog.circulation import checkout, return_copy
+from catalog.models import AvailabilityChunk, Author, Book, BookInstance, Genre
+from catalog.views import BookListView
+
+
+class AvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.poetry = Genre.objects.create(name='Poetry')
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.books = []
+        # copies_changed syncs the sets once the change commits
+        with cls.captureOnCommitCallbacks(execute=True):
+            for n in range(12):
+                book = Book.objects.create(title=f'Book {n}', isbn=f'{n:013d}', author=author)
+                book.genre.add(cls.fantasy if n % 2 else cls.poetry)
+                if n % 3:
+                    BookInstance.objects.create(book=book, imprint='imprint', status='a')
+                cls.books.append(book)
+
+    def ids(self, *genres):
+        return AvailableBooks([genre.pk for genre in genres]).after(None, 100)
+
+    def expected(self, *genres):
+        return [book.pk for book in Book.objects.filter(copies_available__gt=0).order_by('pk')
+                if all(book.genre.filter(pk=genre.pk).exists() for genre in genres)]
+
+    def test_sets_follow_copies_and_genres(self):
+        self.assertEqual(self.ids(), self.expected())
+        self.assertEqual(self.ids(self.fantasy), self.expected(self.fantasy))
+        self.assertEqual(self.ids(self.fantasy, self.poetry), [])
+
+        book = self.books[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            copy = checkout(book, self.reader)
+        self.assertNotIn(book.pk, self.ids())
+        self.assertNotIn(book.pk, self.ids(self.fantasy))
+        with self.captureOnCommitCallbacks(execute=True):
+            return_copy(copy)
+        self.assertIn(book.pk, self.ids(self.fantasy))
+
+        book.genre.add(self.poetry)
+        self.assertEqual(self.ids(self.fantasy, self.poetry), [book.pk])
+        book.genre.remove(self.fantasy)
+        self.assertNotIn(book.pk, self.ids(self.fantasy))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookInstance.objects.create(book=self.books[0], imprint='imprint', status='a')
+        self.assertIn(self.books[0].pk, self.ids(self.poetry))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[2].bookinstance_set.get().delete()
+        self.assertEqual(self.ids(), self.expected())
+
+    def test_sync_waits_for_the_commit(self):
+        book = self.books[1]
+        with self.captureOnCommitCallbacks() as callbacks:
+            checkout(book, self.reader)
+            # the chunk rows are neither locked nor changed inside the loan's transaction
+            self.assertIn(book.pk, self.ids())
+        for callback in callbacks:
+            callback()
+        self.assertNotIn(book.pk, self.ids())
+
+    def test_walks_in_both_directions(self):
+        ids = self.expected()
+        self.assertEqual(AvailableBooks().after(ids[2], 3), ids[3:6])
+        self.assertEqual(AvailableBooks().before(ids[5], 3), ids[2:5])
+        self.assertEqual(AvailableBooks().after(ids[-1], 3), [])
+
+    def test_list_pages_available_books_by_genre(self):
+        url = reverse('books')
+        response = self.client.get(url, {'available': '1', 'genre': self.fantasy.pk})
+        self.assertEqual([book.pk for book in response.context['book_list']],
+                         self.expected(self.fantasy))
+
+        seen = []
+        params = {'available': '1'}
+        with mock.patch.object(BookListView, 'paginate_by', 3):
+            while True:
+                response = self.client.get(url, params)
+                seen += [book.pk for book in response.context['book_list']]
+                cursor = response.context['page_obj'].next_cursor
+                if not cursor:
+                    break
+                params['cursor'] = cursor
+        self.assertEqual(seen, self.expected())
+
+    def test_rebuild_command(self):
+        call_command('rebuild_availability', '--check', stdout=StringIO())
+        AvailabilityChunk.objects.update(bits=availability.to_bytes(0))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_availability', '--check', stdout=StringIO())
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertEqual(self.ids(), self.expected())
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.caching import catalog_cache
+from catalog.models import ArchivedLoanEvent, Author, Book, BookInstance, Genre, LoanEvent, Review
+from catalog.testing import QueryBudgetMixin
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Every catalog page stays within its query budget with a page worth of data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test1', password='1X<ISRUkw+tuK')
+        cls.user.user_permissions.add(Permission.objects.get(codename='can_add_edit'))
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(3)]
+        for author_id in range(15):
+            author = Author.objects.create(
+                first_name=f'Writer {author_id}', last_name=f'Surname {author_id}')
+            book = Book.objects.create(
+                title=f'Book {author_id}', isbn=f'{author_id}', author=author)
+            book.genre.set(genres)
+            for copy in range(3):
+                BookInstance.objects.create(
+                    book=book, imprint='unlikely imprint', status='ao'[copy % 2],
+                    borrower=cls.user if copy % 2 else None)
+            Review.objects.create(writer='reader', body='review', stars=4, book=book)
+            LoanEvent.objects.create(kind='o', book=book, user=cls.user)
+            ArchivedLoanEvent.objects.create(id=1000 + author_id, kind='o', book=book, user=cls.user)
+        cls.book = book
+        cls.author = author
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def urls(self):
+        return [
+            reverse('index'),
+            reverse('books'),
+            reverse('books') + '?filter=book',
+            reverse('book-detail', args=[self.book.pk]),
+            reverse('book-suggest') + '?q=bo',
+            reverse('authors'),
+            reverse('author-detail', args=[self.author.pk]),
+        ]
+
+    def test_anonymous_pages_within_budget(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.client.get(url))
+
+    def test_logged_in_pages_within_budget(self):
+        self.client.login(username='test1', password='1X<ISRUkw+tuK')
+        for url in self.urls() + [reverse('my-borrowed'), reverse('all-loaned'),
+                                  reverse('my-loan-history'),
+                                  reverse('book-loans', args=[self.book.pk])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+
+    def test_metrics_headers(self):
+        with self.settings(CATALOG_METRICS_HEADERS=True):
+            response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Query-Count'], '3')
+        self.assertIn('db;dur=', response['Server-Timing'])
@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.caching import catalog_cache, get_versions, invalidate
+from catalog.models import Author, Book, BookInstance, Genre, Review
+
+
+class CatalogCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.genre = Genre.objects.create(name='Children')
+        cls.book = Book.objects.create(
+            title='Test Book', isbn='1234', author=cls.author)
+        cls.book.genre.add(cls.genre)
+        BookInstance.objects.create(
+            book=cls.book, imprint='unlikely imprint', status='a')
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_anonymous_book_list_is_served_from_cache(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Catalog-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Catalog-Cache'], 'hit')
+        self.assertContains(response, 'Test Book')
+
+    def test_logged_in_requests_bypass_page_cache(self):
+        User.objects.create_user(username='test1', password='1X<ISRUkw+tuK')
+        self.client.login(username='test1', password='1X<ISRUkw+tuK')
+        self.client.get(reverse('books'))
+        response = self.client.get(reverse('books'))
+        self.assertFalse(response.has_header('X-Catalog-Cache'))
+
+    def test_changes_invalidate_cached_pages(self):
+        self.client.get(reverse('books'))
+        self.client.get(reverse('author-detail', args=[self.author.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Minnie'
+            self.author.save()
+
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Catalog-Cache'], 'miss')
+        response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertContains(response, 'Minnie')
+
+    def test_detail_body_is_cached_until_the_book_changes(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Review.objects.create(writer='reader', body='Loved it', stars=5, book=self.book)
+        response = self.client.get(url)
+        self.assertContains(response, 'Loved it')
+
+    def test_invalidate_bumps_versions(self):
+        before = get_versions('books', 'book:1')
+        invalidate('book:1')
+        after = get_versions('books', 'book:1')
+        self.assertEqual(before['books'], after['books'])
+        self.assertNotEqual(before['book:1'], after['book:1'])
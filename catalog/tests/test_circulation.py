@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.circulation import (CirculationError, cancel_hold, checkout,
+                                 expire_holds, reserve, return_copy)
+from catalog.models import Author, Book, BookInstance, Hold, LoanEvent
+
+
+def make_book(copies, status='a'):
+    author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+    book = Book.objects.create(title='Test Book', isbn='1234', author=author)
+    for _ in range(copies):
+        BookInstance.objects.create(book=book, imprint='unlikely imprint', status=status)
+    return book
+
+
+class CirculationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = make_book(copies=1)
+        cls.alice, cls.bob, cls.carol = (
+            User.objects.create_user(username=name, password='1X<ISRUkw+tuK')
+            for name in ('alice', 'bob', 'carol'))
+
+    def counters(self):
+        book = Book.objects.get(pk=self.book.pk)
+        return book.copies_available, book.total_copies
+
+    def test_checkout_and_return(self):
+        copy = checkout(self.book, self.alice)
+        self.assertEqual((copy.status, copy.borrower), ('o', self.alice))
+        self.assertEqual(copy.due_back, timezone.localdate() + timedelta(days=21))
+        self.assertEqual(self.counters(), (0, 1))
+        with self.assertRaises(CirculationError):
+            checkout(self.book, self.bob)
+
+        self.assertIsNone(return_copy(copy))
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        self.assertEqual(self.counters(), (1, 1))
+
+    def test_holds_are_served_in_order(self):
+        copy = checkout(self.book, self.alice)
+        bob_hold = reserve(self.book, self.bob)
+        carol_hold = reserve(self.book, self.carol)
+        self.assertEqual((bob_hold.status, carol_hold.status), ('w', 'w'))
+        with self.assertRaises(CirculationError):
+            reserve(self.book, self.bob)
+
+        self.assertEqual(return_copy(copy), bob_hold)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower), ('r', self.bob))
+        # carol is still waiting, the copy is bob's to pick up
+        with self.assertRaises(CirculationError):
+            checkout(self.book, self.carol)
+        self.assertEqual(checkout(self.book, self.bob), copy)
+        bob_hold.refresh_from_db()
+        self.assertEqual(bob_hold.status, 'f')
+
+        return_copy(copy)
+        carol_hold.refresh_from_db()
+        self.assertEqual(carol_hold.status, 'y')
+        self.assertEqual(self.counters(), (0, 1))
+
+    def test_reserve_sets_free_copy_aside(self):
+        hold = reserve(self.book, self.alice)
+        self.assertEqual(hold.status, 'y')
+        self.assertEqual(hold.instance.status, 'r')
+        self.assertEqual(self.counters(), (0, 1))
+
+        cancel_hold(hold)
+        self.assertEqual(self.counters(), (1, 1))
+
+    def test_expired_hold_passes_copy_on(self):
+        reserve(self.book, self.alice)
+        bob_hold = reserve(self.book, self.bob)
+        self.assertEqual(expire_holds(timezone.now() + timedelta(days=4)), 1)
+        bob_hold.refresh_from_db()
+        self.assertEqual(bob_hold.status, 'y')
+        self.assertEqual(bob_hold.instance.borrower, self.bob)
+
+    def test_new_copy_goes_to_the_queue(self):
+        checkout(self.book, self.alice)
+        bob_hold = reserve(self.book, self.bob)
+        copy = BookInstance.objects.create(book=self.book, imprint='second printing', status='a')
+        self.assertEqual((copy.status, copy.borrower_id), ('r', self.bob.pk))
+        bob_hold.refresh_from_db()
+        self.assertEqual((bob_hold.status, bob_hold.instance), ('y', copy))
+        self.assertEqual(self.counters(), (0, 2))
+
+    def test_head_of_queue_takes_free_copy(self):
+        checkout(self.book, self.alice)
+        bob_hold = reserve(self.book, self.bob)
+        reserve(self.book, self.carol)
+        # a copy freed without the signals, as a bulk fix-up would
+        copy = BookInstance.objects.create(book=self.book, imprint='unlikely imprint', status='u')
+        BookInstance.objects.filter(pk=copy.pk).update(status='a')
+        Book.objects.adjust_counters(self.book.pk, copies_available=1)
+        with self.assertRaises(CirculationError):
+            checkout(self.book, self.carol)
+        self.assertEqual(checkout(self.book, self.bob), copy)
+        bob_hold.refresh_from_db()
+        self.assertEqual((bob_hold.status, bob_hold.instance), ('f', copy))
+
+    def test_changed_copy_rolls_back(self):
+        hold = reserve(self.book, self.alice)
+        # someone took the copy off the shelf behind circulation's back
+        BookInstance.objects.filter(pk=hold.instance_id).update(status='u')
+        with self.assertRaises(CirculationError):
+            checkout(self.book, self.alice)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'y')
+        self.assertFalse(LoanEvent.objects.filter(kind='o').exists())
+
+    def test_reserve_view(self):
+        self.client.login(username='alice', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('book-reserve', args=[self.book.pk]))
+        self.assertRedirects(response, reverse('my-borrowed'))
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertContains(response, 'Ready for pickup')
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    """Many threads racing for a few copies never get the same one"""
+    copies = 5
+    readers = 25
+
+    def test_no_double_checkout(self):
+        book = make_book(copies=self.copies)
+        users = [User.objects.create_user(username=f'reader{i}') for i in range(self.readers)]
+        barrier = threading.Barrier(self.readers)
+        results, errors = [], []
+
+        def borrow(user):
+            try:
+                barrier.wait()
+                for attempt in range(50):
+                    try:
+                        results.append(checkout(book, user).pk)
+                    except OperationalError as error:
+                        # SQLite has no row locks, concurrent writers get
+                        # "database is locked" and have to try again
+                        if 'locked' not in str(error):
+                            raise
+                        time.sleep(0.01 * random.random())
+                        continue
+                    break
+            except CirculationError:
+                pass
+            except Exception as error:  # anything else fails the test
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=borrow, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.copies)
+        self.assertEqual(len(set(results)), self.copies)
+        self.assertEqual(BookInstance.objects.filter(status='o').count(), self.copies)
+        self.assertEqual(Book.objects.get(pk=book.pk).copies_available, 0)
@@ -0,0 +1,176 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase
+from django.urls import reverse
+
+from catalog.benchmark import percentile
+from catalog.models import Author, Book, BookInstance, Genre, Review
+from catalog.search import search_books
+
+
+class ImportCatalogTest(TestCase):
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as output:
+            output.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv(self):
+        Author.objects.create(first_name='Jane', last_name='Austen')
+        path = self.write('.csv', (
+            'title,isbn,author_first_name,author_last_name,genres,copies,publication_date\n'
+            'Emma,111,Jane,Austen,Romance;Classic,3,1815-12-23\n'
+            'Persuasion,222,Jane,Austen,Romance,0,\n'
+            'Dracula,333,Bram,Stoker,Horror,1,\n'
+            'No isbn,,Bram,Stoker,Horror,1,\n'
+            'Emma again,111,Jane,Austen,Romance,1,\n'))
+        out = StringIO()
+        call_command('import_catalog', path, '--batch-size', '2', stdout=out)
+
+        self.assertIn('Imported 3 books (2 skipped)', out.getvalue())
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 3)
+        emma = Book.objects.get(isbn='111')
+        self.assertEqual(emma.author.last_name, 'Austen')
+        self.assertEqual(str(emma.publication_date), '1815-12-23')
+        self.assertEqual(sorted(g.name for g in emma.genre.all()), ['Classic', 'Romance'])
+        self.assertEqual(BookInstance.objects.filter(book=emma).count(), 3)
+        self.assertEqual((emma.copies_available, emma.total_copies), (3, 3))
+        self.assertEqual(list(search_books(Book.objects.all(), 'stoker')),
+                         [Book.objects.get(isbn='333')])
+
+    def test_import_jsonl_skips_existing_isbns(self):
+        rows = [{'title': 'Emma', 'isbn': '111', 'genres': ['Romance'], 'copies': 2,
+                 'copy_status': 'u'}]
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        call_command('import_catalog', path, stdout=StringIO())
+        call_command('import_catalog', path, stdout=StringIO())
+
+        self.assertEqual(Book.objects.count(), 1)
+        book = Book.objects.get()
+        self.assertEqual((book.copies_available, book.total_copies), (0, 2))
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+
+    def test_import_skips_bad_copies(self):
+        rows = [{'title': 'Emma', 'isbn': '111', 'copies': 1, 'copy_status': 'x'},
+                {'title': 'Dracula', 'isbn': '333', 'copies': -2},
+                {'title': 'Persuasion', 'isbn': '222', 'copies': 1, 'copy_status': 'o'}]
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out)
+
+        self.assertIn('Imported 1 books (2 skipped)', out.getvalue())
+        self.assertEqual(list(BookInstance.objects.values_list('book__isbn', 'status')),
+                         [('222', 'o')])
+
+
+class ExportCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Jane', last_name='Austen')
+        for i in range(5):
+            book = Book.objects.create(title=f'Book {i}', isbn=f'{i}', author=author)
+            BookInstance.objects.create(book=book, imprint='imprint', status='a')
+
+    def test_export_csv_in_chunks(self):
+        out = StringIO()
+        # 5 books in chunks of 2 is three queries
+        with self.assertNumQueries(3):
+            call_command('export_catalog', 'books', '--chunk-size', '2', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'title', 'isbn'])
+        self.assertEqual(len(lines), 6)
+
+    def test_export_jsonl(self):
+        out = StringIO()
+        call_command('export_catalog', 'copies', '--format', 'jsonl', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status'], 'a')
+
+    def test_export_view_is_staff_only(self):
+        url = reverse('catalog-export', args=['authors', 'jsonl'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True)
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [{'id': Author.objects.get().pk, 'first_name': 'Jane',
+                                 'last_name': 'Austen', 'date_of_birth': None,
+                                 'date_of_death': None}])
+        self.assertEqual(self.client.get(
+            reverse('catalog-export', args=['users', 'csv'])).status_code, 404)
+
+
+class GenerateCatalogTest(TestCase):
+    def test_generate_small_catalog(self):
+        call_command('generate_catalog', '--books', '30', '--copies', '90', '--reviews', '60',
+                     '--users', '5', '--authors', '4', '--batch-size', '7', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 30)
+        self.assertEqual(Author.objects.count(), 4)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertTrue(BookInstance.objects.exists())
+        self.assertTrue(Review.objects.exists())
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower=None).exists())
+        # counters and search index are filled without the signals
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+        title = Book.objects.first().title
+        self.assertIn(Book.objects.first(), search_books(Book.objects.all(), title))
+
+    def test_refuses_to_mix_with_existing_books(self):
+        Book.objects.create(title='Emma', isbn='9780141439587')
+        with self.assertRaises(CommandError):
+            call_command('generate_catalog', '--books', '1', stdout=StringIO())
+        call_command('generate_catalog', '--books', '1', '--append', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 2)
+
+
+class BenchmarkCatalogTest(LiveServerTestCase):
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        self.assertEqual(percentile(ordered, 50), 50)
+        self.assertEqual(percentile(ordered, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_benchmark_writes_baseline(self):
+        call_command('generate_catalog', '--books', '15', '--users', '2', stdout=StringIO())
+        output = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        call_command('benchmark_catalog', '--url', self.live_server_url, '--requests', '2',
+                     '--concurrency', '2', '--warmup', '0', '--samples', '1',
+                     '--output', output, stdout=StringIO())
+        with open(output) as baseline:
+            report = json.load(baseline)
+        self.assertEqual(report['environment']['rows']['books'], 15)
+        names = {result['name'] for result in report['scenarios']}
+        self.assertTrue({'index', 'books', 'book-detail-0', 'api-books', 'my-borrowed'} <= names)
+        for result in report['scenarios']:
+            self.assertEqual(result['errors'], 0, result['name'])
+            self.assertIsNotNone(result['queries_per_request'], result['name'])
+
+        out = StringIO()
+        call_command('benchmark_catalog', '--url', self.live_server_url, '--requests', '2',
+                     '--warmup', '0', '--samples', '1', '--only', 'index', '--compare', output,
+                     '--threshold', '1000', stdout=out)
+        self.assertIn('index: p95', out.getvalue())
+
+
+class ExplainViewsTest(TestCase):
+    def test_views_use_the_query_indexes(self):
+        call_command('generate_catalog', '--books', '20', '--users', '3', stdout=StringIO())
+        out = StringIO()
+        call_command('explain_views', '--only', 'my-borrowed', 'authors', 'api-book-reviews',
+                     '--plans', '--fail-on-scan', stdout=out)
+        plans = out.getvalue()
+        if connection.vendor == 'sqlite':
+            for index in ('copy_borrower_status_idx', 'author_name_idx', 'review_book_date_idx'):
+                self.assertIn(index, plans)
+        self.assertIn('0 full table scans', plans)
@@ -0,0 +1,89 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from catalog import covers
+from catalog.covers import FORMATS, VARIANTS, variant_name
+from catalog.models import Author, Book
+from catalog.templatetags.covers import cover_picture
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_jpeg(size=(628, 950)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'JPEG')
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CoverVariantTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        self.book = Book.objects.create(
+            title='Test Book', isbn='1234', author=author, cover_img=make_jpeg())
+
+    def test_command_builds_every_variant(self):
+        call_command('build_cover_variants', stdout=StringIO())
+        self.book.refresh_from_db()
+        self.assertIs(self.book.cover_variants, True)
+        for variant, box in VARIANTS.items():
+            for fmt in FORMATS:
+                path = f'{MEDIA_ROOT}/{variant_name(self.book.cover_img.name, variant, fmt)}'
+                with Image.open(path) as image:
+                    self.assertEqual(image.format, fmt.upper())
+                    self.assertLessEqual(image.width, box[0])
+                    self.assertLessEqual(image.height, box[1])
+
+    def test_job_builds_variants_for_the_tag(self):
+        self.assertIsNone(self.book.cover_variants)
+        # the tag never builds or looks for variants itself
+        with mock.patch('catalog.covers.default_storage.exists') as exists:
+            context = cover_picture(self.book, 'list')
+        exists.assert_not_called()
+        self.assertEqual(context['src'], self.book.cover_img.url)
+
+        self.assertEqual(covers.build_pending(), (1, 0))
+        self.assertEqual(covers.build_pending(), (0, 0))
+        self.book.refresh_from_db()
+        context = cover_picture(self.book, 'list')
+        self.assertTrue(context['src'].endswith('/thumb/' + self.book.cover_img.name.split('/')[-1] + '.jpg'))
+        self.assertIn('200w', context['webp_srcset'])
+        self.assertIn('600w', context['jpeg_srcset'])
+
+        # a new cover waits for the job again
+        self.book.cover_img = make_jpeg()
+        self.book.save()
+        self.assertIsNone(self.book.cover_variants)
+
+    def test_failing_cover_does_not_block_the_queue(self):
+        first = self.book
+        second = Book.objects.create(title='Second Book', isbn='5678', cover_img=make_jpeg())
+        with mock.patch('catalog.covers.open_cover', side_effect=[
+                Image.DecompressionBombError('too big'), covers.open_cover(second.cover_img.name)]):
+            with self.assertLogs('catalog.covers', 'ERROR'):
+                self.assertEqual(covers.build_pending(), (1, 1))
+        self.assertEqual(
+            [Book.objects.get(pk=book.pk).cover_variants for book in (first, second)],
+            [False, True])
+
+    def test_cover_picture_falls_back_to_original(self):
+        Book.objects.filter(pk=self.book.pk).update(cover_img='book_covers/missing.jpg')
+        with self.assertLogs('catalog.covers', 'WARNING'):
+            self.assertEqual(covers.build_pending(), (0, 1))
+        self.book.refresh_from_db()
+        self.assertIs(self.book.cover_variants, False)
+        context = cover_picture(self.book, 'detail')
+        self.assertEqual(context['src'], self.book.cover_img.url)
+        self.assertNotIn('webp_srcset', context)
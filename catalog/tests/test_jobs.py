@@ -0,0 +1,91 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from catalog import jobs
+from catalog.circulation import reserve
+from catalog.models import Hold, Job
+from catalog.tests.test_circulation import make_book
+
+calls = []
+
+
+def note_call():
+    calls.append(1)
+    return len(calls)
+
+
+def fail():
+    raise RuntimeError('out of ink')
+
+
+TEST_JOBS = {
+    'note': ('catalog.tests.test_jobs.note_call', 60),
+    'fail': ('catalog.tests.test_jobs.fail', 3600),
+    'expire-holds': ('catalog.jobs.expire_holds', 300),
+}
+
+
+@override_settings(CATALOG_JOBS=TEST_JOBS)
+class JobRunnerTest(TestCase):
+    def setUp(self):
+        calls.clear()
+        jobs.sync_jobs()
+
+    def test_due_jobs_run_once_and_are_rescheduled(self):
+        self.assertEqual(set(Job.objects.values_list('name', flat=True)), set(TEST_JOBS))
+        results = {name: (status, result) for name, status, result in jobs.run_due()}
+        self.assertEqual(results['note'], ('ok', '1'))
+        self.assertEqual(results['fail'][0], 'failed')
+        self.assertIn('out of ink', Job.objects.get(name='fail').last_result)
+        self.assertEqual(jobs.run_due(), [])
+
+        note = Job.objects.get(name='note')
+        self.assertEqual(note.next_run_at, note.last_finished_at + timedelta(seconds=60))
+        self.assertEqual(len(jobs.claim_due(now=note.next_run_at)), 1)
+
+    def test_claims_do_not_overlap(self):
+        self.assertEqual(len(jobs.claim_due(limit=2)), 2)
+        self.assertEqual(len(jobs.claim_due(limit=2)), 1)
+        self.assertEqual(jobs.claim_due(), [])
+        # a worker that died holding a claim gives it up when the lease runs out
+        later = timezone.now() + jobs.LEASE + timedelta(seconds=1)
+        self.assertEqual(len(jobs.claim_due(now=later)), 3)
+
+    def test_settings_changes_are_picked_up(self):
+        with override_settings(CATALOG_JOBS={**TEST_JOBS, 'note': (TEST_JOBS['note'][0], 120),
+                                             'new': (TEST_JOBS['note'][0], 60)}):
+            jobs.sync_jobs()
+            self.assertEqual(Job.objects.get(name='note').interval, timedelta(seconds=120))
+            self.assertIn('new', jobs.claim_due())
+
+    def test_run_jobs_command_expires_holds(self):
+        book = make_book(copies=1)
+        user = User.objects.create_user(username='alice', password='1X<ISRUkw+tuK')
+        hold = reserve(book, user)
+        Hold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        out = StringIO()
+        call_command('run_jobs', stdout=out)
+        self.assertIn('expire-holds: 1 holds expired', out.getvalue())
+        self.assertIn('RuntimeError: out of ink', out.getvalue())
+        self.assertEqual(Hold.objects.get(pk=hold.pk).status, 'e')
+
+        out = StringIO()
+        call_command('run_jobs', '--list', stdout=out)
+        self.assertIn('note: every 0:01:00', out.getvalue())
+
+
+class DefaultJobsTest(TestCase):
+    def test_configured_jobs_succeed(self):
+        make_book(copies=2)
+        jobs.sync_jobs()
+        results = jobs.run_due()
+        self.assertEqual(len(results), len(jobs.configured_jobs()))
+        for name, status, result in results:
+            with self.subTest(job=name):
+                self.assertEqual(status, 'ok', result)
@@ -0,0 +1,104 @@
+from collections import Counter
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import ledger
+from catalog.circulation import cancel_hold, checkout, reserve, return_copy
+from catalog.models import ArchivedLoanEvent, Book, LoanEvent, LoanRollup
+from catalog.tests.test_circulation import make_book
+
+
+def at(year, month, day):
+    return timezone.make_aware(datetime(year, month, day, 12))
+
+
+class LoanLedgerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = make_book(copies=1)
+        cls.alice, cls.bob = (User.objects.create_user(username=name, password='1X<ISRUkw+tuK')
+                              for name in ('alice', 'bob'))
+
+    def kinds(self, querysets):
+        return [event.kind for event in ledger.history_paginator(querysets, 50).page().object_list]
+
+    def test_circulation_records_events(self):
+        copy = checkout(self.book, self.alice)
+        hold = reserve(self.book, self.bob)
+        return_copy(copy)
+        cancel_hold(hold)
+        self.assertEqual(self.kinds(ledger.book_history(self.book.pk)), ['c', 'r', 'h', 'o'])
+        self.assertEqual(self.kinds(ledger.user_history(self.alice.pk)), ['r', 'o'])
+        returned = LoanEvent.objects.get(kind='r')
+        self.assertEqual((returned.user, returned.instance_id), (self.alice, copy.pk))
+        self.assertEqual(LoanEvent.objects.get(kind='o').due_back, copy.due_back)
+
+    def test_rollups_for_many_books(self):
+        books = Book.objects.bulk_create(
+            [Book(title=f'Book {i}', isbn=f'isbn{i}') for i in range(400)])
+        book_ids = Book.objects.filter(isbn__startswith='isbn').values_list('pk', flat=True)
+        months = [at(2020, month, 1).date() for month in (1, 2, 3)]
+        counts = Counter({(month, book_id, 'o'): 2 for month in months for book_id in book_ids})
+        ledger.add_to_rollups(counts)
+        ledger.add_to_rollups(counts)
+        self.assertEqual(LoanRollup.objects.count(), 3 * len(books))
+        self.assertEqual(set(LoanRollup.objects.values_list('count', flat=True)), {4})
+
+    def test_compaction_archives_and_rolls_up(self):
+        for occurred_at in (at(2020, 1, 1), at(2020, 1, 2), at(2020, 1, 3), at(2020, 2, 1)):
+            LoanEvent.objects.create(kind='o', book=self.book, user=self.alice,
+                                     occurred_at=occurred_at)
+        recent = ledger.record('r', self.book.pk, self.alice.pk)
+        ids = sorted(LoanEvent.objects.values_list('id', flat=True))
+
+        self.assertEqual(ledger.compact(at(2020, 2, 2), batch_size=2), 4)
+        self.assertEqual(ledger.compact(at(2020, 2, 2)), 0)
+        self.assertEqual(list(LoanEvent.objects.values_list('id', flat=True)), [recent.pk])
+        self.assertEqual(sorted(ArchivedLoanEvent.objects.values_list('id', flat=True)),
+                         ids[:-1])
+        self.assertEqual(sorted(LoanRollup.objects.values_list('month', 'count')),
+                         [(at(2020, 1, 1).date(), 3), (at(2020, 2, 1).date(), 1)])
+
+        # history pages run across both tables without gaps or repeats
+        paginator = ledger.history_paginator(ledger.user_history(self.alice.pk), 2)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual([event.id for page in (first, second, third) for event in page.object_list],
+                         ids[::-1])
+        self.assertIsNone(third.next_cursor)
+        self.assertEqual([event.id for event in paginator.page(third.previous_cursor).object_list],
+                         ids[::-1][2:4])
+
+        LoanEvent.objects.create(kind='o', book=self.book, occurred_at=at(2020, 1, 20))
+        ledger.compact(at(2020, 2, 2))
+        self.assertEqual(ledger.monthly_counts(self.book.pk),
+                         [(at(2020, 1, 1).date(), 4), (at(2020, 2, 1).date(), 1)])
+
+    def test_compact_command(self):
+        LoanEvent.objects.create(kind='o', book=self.book, occurred_at=at(2020, 1, 1))
+        ledger.record('r', self.book.pk)
+        out = StringIO()
+        call_command('compact_loan_ledger', '--keep-days', '30', stdout=out)
+        self.assertIn('1 loan events archived', out.getvalue())
+        self.assertEqual((LoanEvent.objects.count(), ArchivedLoanEvent.objects.count()), (1, 1))
+
+    def test_history_views(self):
+        checkout(self.book, self.alice)
+        ArchivedLoanEvent.objects.create(id=10 ** 9, kind='o', book_id=self.book.pk + 1,
+                                         user=self.alice, occurred_at=at(2020, 1, 1))
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('my-loan-history'))
+        self.assertContains(response, self.book.title)
+        self.assertContains(response, 'a removed book')
+
+        url = reverse('book-loans', args=[self.book.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.alice.user_permissions.add(Permission.objects.get(codename='can_add_edit'))
+        self.assertContains(self.client.get(url), 'by alice')
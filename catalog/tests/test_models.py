@@ -1,6 +1,10 @@
 from django.test import TestCase
 
-from catalog.models import Author
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from catalog.models import Author, Book, BookInstance, Review
 
 
 class AuthorModelTest(TestCase):
@@ -32,3 +36,90 @@ class AuthorModelTest(TestCase):
     def test_absolute_url(self):
         author = Author.objects.get(id=1)
         self.assertEqual(author.get_absolute_url(), '/catalog/author/1')
+
+
+class BookCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.book = Book.objects.create(
+            title='Test Book', isbn='1234', author=author)
+        cls.other_book = Book.objects.create(
+            title='Empty Book', isbn='5678', author=author)
+        for status in ('a', 'a', 'o', 'u'):
+            BookInstance.objects.create(
+                book=cls.book, imprint='unlikely imprint', status=status)
+        for stars in (2, 5):
+            Review.objects.create(
+                writer='reader', body='review', stars=stars, book=cls.book)
+
+    def test_counters_follow_inserts(self):
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertTrue(book.is_available)
+        self.assertEqual(book.copies_available, 2)
+        self.assertEqual(book.total_copies, 4)
+        self.assertEqual(book.review_count, 2)
+        self.assertEqual(book.avg_stars, 3.5)
+
+    def test_book_without_copies_or_reviews(self):
+        book = Book.objects.get(pk=self.other_book.pk)
+        self.assertFalse(book.is_available)
+        self.assertEqual(book.total_copies, 0)
+        self.assertIsNone(book.avg_stars)
+
+    def test_counters_follow_status_changes_and_deletes(self):
+        for inst in BookInstance.objects.filter(status='a'):
+            inst.status = 'o'
+            inst.save()
+        inst = BookInstance.objects.filter(status='u').get()
+        inst.book = self.other_book
+        inst.status = 'a'
+        inst.save()
+        Review.objects.filter(stars=5).get().delete()
+
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(book.copies_available, 0)
+        self.assertEqual(book.total_copies, 3)
+        self.assertEqual(book.review_count, 1)
+        self.assertEqual(book.avg_stars, 2)
+        other_book = Book.objects.get(pk=self.other_book.pk)
+        self.assertEqual(other_book.copies_available, 1)
+        self.assertEqual(other_book.total_copies, 1)
+
+    def test_deleting_a_reviewed_book_updates_its_author(self):
+        author = self.book.author
+        third = Book.objects.create(title='Third Book', isbn='9012', author=author)
+        Review.objects.create(writer='reader', body='review', stars=4, book=third)
+        self.book.bookinstance_set.all().delete()
+        self.book.delete()
+
+        author.refresh_from_db()
+        self.assertEqual((author.book_count, author.copies_available, author.review_count,
+                          author.star_sum), (2, 0, 1, 4))
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+
+    def test_star_histogram_follows_reviews(self):
+        review = Review.objects.get(stars=2)
+        review.stars = 4
+        review.save()
+        Review.objects.create(writer='reader', body='review', stars=4, book=self.book)
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(book.star_histogram(),
+                         [(5, 1, 33), (4, 2, 67), (3, 0, 0), (2, 0, 0), (1, 0, 0)])
+
+        Review.objects.filter(stars=4).delete()
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual([count for _, count, _ in book.star_histogram()], [1, 0, 0, 0, 0])
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+
+    def test_rebuild_command_repairs_counters(self):
+        Book.objects.update(copies_available=0, total_copies=0,
+                            review_count=0, star_sum=0, stars_5=0, rating=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_book_counters', '--check', stdout=StringIO())
+        call_command('rebuild_book_counters', stdout=StringIO())
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual((book.copies_available, book.total_copies,
+                          book.review_count, book.star_sum, book.stars_5), (2, 4, 2, 7, 1))
+        self.assertEqual(book.rating, 3.5)
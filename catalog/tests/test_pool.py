@@ -0,0 +1,115 @@
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from catalog.db.sqlite3.base import DatabaseWrapper
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'pool.sqlite3')
+        self.alias = f'pool-test-{self.id()}'
+        self.addCleanup(lambda: self.pool().clear())
+
+    def wrapper(self, **pool):
+        settings_dict = {
+            'ENGINE': 'catalog.db.sqlite3', 'NAME': self.name, 'OPTIONS': {}, 'TIME_ZONE': None,
+            'AUTOCOMMIT': True, 'CONN_MAX_AGE': 0, 'ATOMIC_REQUESTS': False,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+            'POOL': {'MAX_SIZE': 2, **pool},
+        }
+        return DatabaseWrapper(settings_dict, alias=self.alias)
+
+    def pool(self):
+        return self.wrapper().pool
+
+    def raw(self, wrapper):
+        wrapper.ensure_connection()
+        return wrapper.connection
+
+    def test_closed_connections_are_reused(self):
+        first, second = self.wrapper(), self.wrapper()
+        raw = self.raw(first)
+        self.assertFalse(first.reused)
+        first.close()
+        self.assertIs(self.raw(second), raw)
+        self.assertTrue(second.reused)
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        second.close()
+        self.assertEqual((self.pool().opened, self.pool().reused), (1, 1))
+
+    def test_pool_keeps_at_most_max_size(self):
+        wrappers = [self.wrapper() for _ in range(3)]
+        raws = [self.raw(wrapper) for wrapper in wrappers]
+        for wrapper in wrappers:
+            wrapper.close()
+        self.assertEqual(len(self.pool().idle), 2)
+        with self.assertRaises(Exception):
+            raws[2].execute('SELECT 1')
+
+    def test_dead_old_and_broken_connections_are_not_reused(self):
+        wrapper = self.wrapper()
+        raw = self.raw(wrapper)
+        wrapper.close()
+        # dropped by the server while idle: the health check opens a new one
+        raw.close()
+        self.assertIsNot(self.raw(wrapper), raw)
+
+        wrapper.errors_occurred = True
+        wrapper.close()
+        self.assertEqual(len(self.pool().idle), 0)
+
+        wrapper = self.wrapper(MAX_AGE=0.05)
+        raw = self.raw(wrapper)
+        wrapper.close()
+        time.sleep(0.1)
+        self.assertIsNot(self.raw(wrapper), raw)
+        wrapper.close()
+
+    def test_open_transactions_are_rolled_back(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (n integer)')
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+        wrapper.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone(), (0,))
+        wrapper.close()
+
+    def test_other_settings_get_another_pool(self):
+        first = self.wrapper()
+        raw = self.raw(first)
+        first.close()
+        # the same alias pointed at another database, as the test runner does
+        self.name = self.name.replace('pool.sqlite3', 'other.sqlite3')
+        second = self.wrapper()
+        self.assertIsNot(self.raw(second), raw)
+        self.assertEqual(second.settings_dict['NAME'], self.name)
+        with self.assertRaises(Exception):
+            raw.execute('SELECT 1')
+        second.close()
+
+    def test_pooling_off(self):
+        wrapper = self.wrapper(MAX_SIZE=0)
+        raw = self.raw(wrapper)
+        wrapper.close()
+        self.assertIsNot(self.raw(wrapper), raw)
+        wrapper.close()
+
+
+class BenchmarkConnectionsTest(TestCase):
+    def test_runs_without_a_pool(self):
+        out = StringIO()
+        call_command('benchmark_connections', '--modes', 'per-request', 'persistent',
+                     '--requests', '4', '--warmup', '1', '--concurrency', '2', stdout=out)
+        self.assertIn('persistent', out.getvalue())
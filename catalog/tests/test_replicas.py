@@ -0,0 +1,152 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import counters
+from catalog.caching import catalog_cache
+from catalog.models import Author, Book, SiteCounter
+from catalog.replicas import PIN_COOKIE, ReplicaMiddleware, current_read_alias, replica_reads
+from catalog.stats import catalog_stats
+
+REPLICA = 'replica'
+
+
+@override_settings(CATALOG_DB_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(TransactionTestCase):
+    """The test database as the primary and a second SQLite file as its replica.
+
+    The replica is added after the test runner set up its databases, and filled
+    by copying the primary with the SQLite backup API.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        catalog_cache().clear()
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        self.book = Book.objects.create(title='Replicated Title', isbn='1234', author=author)
+        self.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.replicate()
+        # a write the replica hasn't caught up with
+        Book.objects.filter(pk=self.book.pk).update(title='Primary Title')
+
+    def replicate(self):
+        """Copy the primary into the replica file, standing in for replication"""
+        for alias in (DEFAULT_DB_ALIAS, REPLICA):
+            connections[alias].ensure_connection()
+        connections[DEFAULT_DB_ALIAS].connection.backup(connections[REPLICA].connection)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(url)
+        return response, len(primary), len(replica)
+
+    def test_read_views_read_a_replica(self):
+        # signed-in pages aren't cached, their reads all go to the replica
+        self.client.force_login(self.reader)
+        self.replicate()
+        Book.objects.filter(pk=self.book.pk).update(title='Newer Title')
+        # the first request fills the cached genre choices from the primary
+        self.client.get(reverse('books'))
+        response, primary, replica = self.get(reverse('books'))
+        self.assertContains(response, 'Primary Title')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response, primary, replica = self.get(reverse('api-book', args=[self.book.pk]))
+        self.assertEqual(response.json()['title'], 'Primary Title')
+        self.assertEqual((primary, replica), (0, 1))
+
+    def test_cache_fills_read_the_primary(self):
+        # the versions were bumped by the write, the replica's rows predate it
+        response, primary, replica = self.get(reverse('books'))
+        self.assertContains(response, 'Primary Title')
+        self.assertEqual(response['X-Catalog-Cache'], 'miss')
+        response, primary, replica = self.get(reverse('books'))
+        self.assertEqual(response['X-Catalog-Cache'], 'hit')
+        self.assertContains(response, 'Primary Title')
+
+        response, primary, replica = self.get(self.book.get_absolute_url())
+        self.assertContains(response, 'Primary Title')
+
+    def test_index_caches_primary_counts(self):
+        Book.objects.create(title='Second Title', isbn='5678', author=self.book.author)
+        SiteCounter.objects.create(name=counters.HOME_VISITS, value=5)
+        response, primary, replica = self.get(reverse('index'))
+        self.assertContains(response, '<strong>Books:</strong> 2')
+        self.assertContains(response, 'visited 5 times')
+        self.assertEqual(catalog_stats()['num_books'], 2)
+        self.assertEqual(counters.stored(counters.HOME_VISITS), 5)
+
+    def test_other_views_and_requests_read_the_primary(self):
+        self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        self.assertEqual(Book.objects.get().title, 'Primary Title')
+        self.client.force_login(self.reader)
+        response, primary, replica = self.get(reverse('my-borrowed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+
+    def test_writers_read_their_writes(self):
+        # the session is only on the primary, which the pin cookie keeps reading
+        response = self.client.post(reverse('login'), {'username': 'reader',
+                                                       'password': '1X<ISRUkw+tuK'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        url = reverse('book-review-form', args=[self.book.pk])
+        response = self.client.post(url, {'stars': 4, 'body': 'Good'})
+        self.assertRedirects(response, self.book.get_absolute_url(), fetch_redirect_response=False)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response, primary, replica = self.get(self.book.get_absolute_url())
+        self.assertContains(response, 'Primary Title')
+        self.assertEqual(replica, 0)
+
+        # once the pin expires reads go back to the replica, which has caught up by then
+        self.replicate()
+        del self.client.cookies[PIN_COOKIE]
+        response, primary, replica = self.get(self.book.get_absolute_url())
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(primary, 0)
+
+    def test_first_write_pins_the_request(self):
+        seen = []
+
+        @replica_reads
+        def view(request):
+            seen.append(current_read_alias())
+            Book.objects.filter(pk=self.book.pk).update(title='Renamed')
+            seen.append(current_read_alias())
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        middleware = ReplicaMiddleware(lambda request: middleware.process_view(
+            request, view, (), {}) or view(request))
+        response = middleware(request)
+        self.assertEqual(seen, [REPLICA, None])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(current_read_alias())
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate(REPLICA, 'catalog', model_name='book'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'catalog', model_name='book'))
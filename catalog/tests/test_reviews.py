@@ -0,0 +1,99 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import reviews
+from catalog.models import Author, Book, Review, ReviewSubmission
+
+
+def reject_shouting(submission):
+    if submission.body.isupper():
+        return reviews.REJECT
+    return reviews.default_moderator(submission)
+
+
+class ReviewIngestionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.book = Book.objects.create(title='Test Book', isbn='1234', author=author)
+        cls.other = Book.objects.create(title='Other Book', isbn='5678', author=author)
+        cls.reader = User.objects.create_user(
+            username='reader', password='1X<ISRUkw+tuK', first_name='Rita', last_name='Reader')
+
+    def submit(self, book, body='Loved it', stars=5):
+        return ReviewSubmission.objects.create(
+            book=book, user=self.reader, writer='Rita Reader', body=body, stars=stars)
+
+    def counters(self, book):
+        book = Book.objects.get(pk=book.pk)
+        return book.review_count, book.star_sum, book.rating
+
+    def test_post_queues_a_review(self):
+        url = reverse('book-review-form', args=[self.book.pk])
+        response = self.client.post(url, {'stars': 4, 'body': 'Good'})
+        self.assertRedirects(response, f'/accounts/login/?next={url}')
+
+        self.client.force_login(self.reader)
+        # the book and writer come from the URL and the login, not the form
+        response = self.client.post(url, {'stars': 4, 'body': 'Good', 'book': self.other.pk,
+                                          'writer': 'Someone Else'})
+        self.assertRedirects(response, self.book.get_absolute_url())
+        submission = ReviewSubmission.objects.get()
+        self.assertEqual((submission.book, submission.writer, submission.status),
+                         (self.book, 'Rita Reader', 'q'))
+        self.assertFalse(Review.objects.exists())
+
+        response = self.client.post(url, {'stars': 9, 'body': 'Too good'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['stars'])
+
+    def test_batch_applies_reviews_and_counters_once_per_book(self):
+        for stars in (5, 4, 3):
+            self.submit(self.book, stars=stars)
+        self.submit(self.other, stars=2)
+
+        # savepoint, select the batch, insert the reviews, delete the submissions,
+        # one counter update per book and one for its author, release
+        with self.assertNumQueries(9):
+            result = reviews.apply_batch()
+        self.assertEqual(result, reviews.BatchResult(4, 0, 0))
+        self.assertEqual(self.counters(self.book), (3, 12, 4.0))
+        self.assertEqual(self.counters(self.other), (1, 2, 2.0))
+        self.assertFalse(ReviewSubmission.objects.exists())
+        call_command('rebuild_book_counters', '--check', stdout=StringIO())
+
+    def test_date_written_is_the_local_date(self):
+        submission = self.submit(self.book)
+        # late evening in New York, already the next day in UTC
+        ReviewSubmission.objects.filter(pk=submission.pk).update(submitted_at=datetime.datetime(
+            2021, 3, 2, 3, 0, tzinfo=datetime.timezone.utc))
+        reviews.apply_batch()
+        self.assertEqual(Review.objects.get().date_written, datetime.date(2021, 3, 1))
+
+    def test_moderation_holds_and_rejects(self):
+        self.submit(self.book, body='Great, more at http://spam.example')
+        self.submit(self.book, body='TERRIBLE')
+        self.submit(self.book, body='Fine')
+        with override_settings(CATALOG_REVIEW_MODERATOR='catalog.tests.test_reviews.reject_shouting'):
+            result = reviews.drain(batch_size=2)
+        self.assertEqual(result, reviews.BatchResult(1, 1, 1))
+        held = ReviewSubmission.objects.get()
+        self.assertEqual((held.status, held.note), ('h', 'contains a link'))
+
+        # a moderator's approval queues it again past the hook
+        ReviewSubmission.objects.filter(pk=held.pk).update(status='a')
+        self.assertEqual(reviews.apply_batch(), reviews.BatchResult(1, 0, 0))
+        self.assertEqual(self.counters(self.book)[0], 2)
+
+    def test_process_reviews_command(self):
+        self.submit(self.book)
+        out = StringIO()
+        call_command('process_reviews', stdout=out)
+        self.assertIn('1 reviews applied', out.getvalue())
+        response = self.client.get(self.book.get_absolute_url())
+        self.assertContains(response, 'Loved it')
@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.search import search_books, suggest_titles, tokenize
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        austen = Author.objects.create(first_name='Jane', last_name='Austen')
+        fantasy = Genre.objects.create(name='Fantasy')
+        romance = Genre.objects.create(name='Romance')
+
+        cls.hobbit = Book.objects.create(
+            title='The Hobbit', isbn='9780261102217', author=tolkien,
+            description='A hobbit goes on an adventure with dwarves.')
+        cls.hobbit.genre.add(fantasy)
+        cls.rings = Book.objects.create(
+            title='The Fellowship of the Ring', isbn='9780261102354', author=tolkien,
+            description='The hobbit Frodo inherits a ring.')
+        cls.rings.genre.add(fantasy)
+        cls.pride = Book.objects.create(
+            title='Pride and Prejudice', isbn='9780141439518', author=austen,
+            description='Elizabeth Bennet meets Mr Darcy.')
+        cls.pride.genre.add(romance)
+
+    def search(self, query, **kwargs):
+        return list(search_books(Book.objects.all(), query, **kwargs))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("The Hobbit, or There and Back Again!"),
+                         ['the', 'hobbit', 'or', 'there', 'and', 'back', 'again'])
+
+    def test_matches_each_field(self):
+        self.assertEqual(self.search('austen'), [self.pride])
+        self.assertEqual(self.search('romance'), [self.pride])
+        self.assertEqual(self.search('9780141439518'), [self.pride])
+        self.assertEqual(self.search('darcy'), [self.pride])
+
+    def test_title_match_ranks_above_description_match(self):
+        self.assertEqual(self.search('hobbit'), [self.hobbit, self.rings])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search('tolkien ring'), [self.rings])
+
+    def test_prefix_matching_on_last_term(self):
+        self.assertEqual(self.search('prej'), [self.pride])
+        self.assertEqual(self.search('prej', prefix=False), [])
+
+    def test_index_follows_author_and_genre_changes(self):
+        author = self.pride.author
+        author.last_name = 'Bronte'
+        author.save()
+        self.pride.genre.clear()
+        self.assertEqual(self.search('bronte'), [self.pride])
+        self.assertEqual(self.search('romance'), [])
+
+    def test_index_follows_author_and_genre_deletes(self):
+        Genre.objects.get(name='Romance').delete()
+        self.pride.author.delete()
+        self.assertEqual(self.search('romance'), [])
+        self.assertEqual(self.search('austen'), [])
+        self.assertEqual(self.search('darcy'), [self.pride])
+
+    def test_suggest_titles(self):
+        self.assertEqual(suggest_titles('fel'),
+                         [(self.rings.pk, 'The Fellowship of the Ring')])
+
+    def test_book_list_filter_uses_search(self):
+        response = self.client.get(reverse('books') + '?filter=tolkien')
+        self.assertEqual(list(response.context['book_list']),
+                         [self.rings, self.hobbit])
+
+    def test_suggest_view(self):
+        response = self.client.get(reverse('book-suggest') + '?q=hob')
+        self.assertEqual(response.json()['results'][0]['title'], 'The Hobbit')
@@ -0,0 +1,92 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog import counters, sessions
+from catalog.caching import catalog_cache
+from catalog.models import Author, Book, SiteCounter
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class AnonymousWritesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.book = Book.objects.create(title='Test Book', isbn='1234', author=author)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def urls(self):
+        return [reverse('index'), reverse('books'), self.book.get_absolute_url(),
+                reverse('book-reviews', args=[self.book.pk]), reverse('authors'),
+                reverse('author-detail', args=[self.book.author_id])]
+
+    def test_anonymous_browsing_writes_nothing(self):
+        for engine in ('db', 'cached_db', 'signed_cookies'):
+            with self.subTest(engine=engine), override_settings(
+                    SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                with CaptureQueriesContext(connection) as queries:
+                    for url in self.urls() * 2:
+                        self.assertEqual(self.client.get(url).status_code, 200)
+                writes = [query['sql'] for query in queries
+                          if query['sql'].lstrip().upper().startswith(WRITES)]
+                self.assertEqual(writes, [])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_login_with_signed_cookie_sessions(self):
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('my-borrowed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.exists())
+
+    def test_visit_counter_flushes_in_batches(self):
+        for _ in range(3):
+            self.client.get(reverse('index'))
+        self.assertFalse(SiteCounter.objects.exists())
+        self.assertEqual(counters.flush(), {counters.HOME_VISITS: 3})
+        self.assertEqual(SiteCounter.objects.get().value, 3)
+        self.assertEqual(counters.flush(), {})
+
+        counters.hit(counters.HOME_VISITS, 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.total(counters.HOME_VISITS), 5)
+        counters.flush()
+        self.assertEqual(SiteCounter.objects.get().value, 5)
+        catalog_cache().clear()
+        self.assertEqual(self.client.get(reverse('index')).context['total_visits'], 5)
+
+
+class PruneSessionsTest(TestCase):
+    def make_sessions(self, count, expire_date):
+        Session.objects.bulk_create(
+            [Session(session_key=f'{expire_date:%Y%m%d%H%M%S}{n:020d}', session_data='',
+                     expire_date=expire_date) for n in range(count)])
+
+    def test_expired_sessions_deleted_in_batches(self):
+        now = timezone.now()
+        self.make_sessions(5, now - timedelta(days=1))
+        self.make_sessions(2, now + timedelta(days=1))
+        # three batches of two, then an empty one
+        with self.assertNumQueries(7):
+            self.assertEqual(sessions.clear_expired(batch_size=2, now=now), 5)
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_command(self):
+        self.make_sessions(3, timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command('prune_sessions', stdout=out)
+        self.assertIn('3 expired sessions deleted', out.getvalue())
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            call_command('prune_sessions', stdout=out)
+        self.assertIn('keeps no session rows', out.getvalue())
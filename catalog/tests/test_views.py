@@ -7,6 +7,48 @@ from django.utils import timezone
 from django.contrib.auth.models import User, Permission
 
 from catalog.models import BookInstance, Book, Genre
+from catalog.caching import catalog_cache
+
+
+class IndexViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(
+            first_name='Mickey', last_name='Mouse')
+        test_book = Book.objects.create(
+            title='Test Book', isbn='1234', author=test_author)
+        for status in ('a', 'o'):
+            BookInstance.objects.create(
+                book=test_book, imprint='unlikely imprint', status=status)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_stats_in_one_cached_query(self):
+        # the stats, and the stored visit total on a cold cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_instances'], 2)
+        self.assertEqual(response.context['num_instances_avail'], 1)
+        self.assertEqual(response.context['num_authors'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_stats_refresh_when_copies_change(self):
+        self.client.get(reverse('index'))
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_instances_avail'], 2)
+
+    def test_visits_counted_without_session(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+        self.assertEqual(response.context['total_visits'], 1)
+        self.assertNotIn('sessionid', response.cookies)
 
 
 class AuthorListViewTest(TestCase):
@@ -20,6 +62,10 @@ class AuthorListViewTest(TestCase):
                 first_name=f'Writer {author_id}',
                 last_name=f'Surname {author_id}',)
 
+    def setUp(self):
+        # rendered pages are cached across tests, start every test cold
+        catalog_cache().clear()
+
     def test_view_url_exists_at_desired_location(self):
         response = self.client.get('/catalog/authors/')
         self.assertEqual(response.status_code, 200)
@@ -48,6 +94,206 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(response.context['is_paginated'] == True)
         self.assertEqual(len(response.context['author_list']), 3)
 
+    def test_cursor_pagination_walks_all_authors(self):
+        response = self.client.get(reverse('authors'))
+        first_page = list(response.context['author_list'])
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+        response = self.client.get(reverse('authors'), {'cursor': next_cursor})
+        self.assertEqual(len(response.context['author_list']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(len(set(first_page) | set(response.context['author_list'])), 13)
+
+        previous_cursor = response.context['page_obj'].previous_cursor
+        response = self.client.get(reverse('authors'), {'cursor': previous_cursor})
+        self.assertEqual(list(response.context['author_list']), first_page)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('authors'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class AuthorDetailViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        genres = [Genre.objects.create(name=f'Genre {n}') for n in range(3)]
+        for n in range(30):
+            book = Book.objects.create(title=f'Book {n:02d}', isbn=f'{n}', author=cls.author)
+            book.genre.set(genres[:n % 3 + 1])
+            BookInstance.objects.create(book=book, imprint='unlikely imprint', status='ao'[n % 2])
+        Book.objects.get(title='Book 00').reviews.create(writer='reader', body='ok', stars=3)
+        Book.objects.get(title='Book 01').reviews.create(writer='reader', body='good', stars=4)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_bibliography_in_fixed_queries(self):
+        # author, books, genres of every book
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        books = response.context['author'].books
+        self.assertEqual([book.title for book in books], [f'Book {n:02d}' for n in range(30)])
+        self.assertEqual((books[0].is_available, books[1].is_available), (True, False))
+        self.assertContains(response, '15 copies available')
+        self.assertContains(response, '3.5')
+        self.assertContains(response, 'Genre 2', count=10)
+
+    def test_author_totals_follow_books(self):
+        other = Author.objects.create(first_name='Minnie', last_name='Mouse')
+        book = Book.objects.get(title='Book 01')
+        book.author = other
+        book.save()
+        copy = BookInstance.objects.get(book__title='Book 02')
+        copy.status = 'u'
+        copy.save()
+        Book.objects.get(title='Book 00').reviews.get().delete()
+
+        author, other = Author.objects.get(pk=self.author.pk), Author.objects.get(pk=other.pk)
+        self.assertEqual((author.book_count, author.copies_available, author.review_count), (29, 14, 0))
+        self.assertEqual((other.book_count, other.copies_available, other.avg_stars), (1, 0, 4))
+
+        Book.objects.filter(title='Book 02').get().bookinstance_set.all().delete()
+        Book.objects.get(title='Book 02').delete()
+        self.assertEqual(Author.objects.get(pk=self.author.pk).book_count, 28)
+
+
+class BookListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_author = Author.objects.create(
+            first_name='Mickey', last_name='Mouse')
+        test_genre = Genre.objects.create(name='Children')
+        for book_id in range(12):
+            book = Book.objects.create(
+                title=f'Book {book_id}', isbn=f'{book_id}', author=test_author)
+            book.genre.add(test_genre)
+            BookInstance.objects.create(
+                book=book, imprint='unlikely imprint', status='a')
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_view_uses_correct_template(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/book_list.html')
+
+    def test_query_count_does_not_grow_with_books(self):
+        # page of books, genre prefetch, genre filter choices, no COUNT with cursor pagination
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('books'))
+        self.assertEqual(len(response.context['book_list']), 12)
+        self.assertContains(response, 'Available')
+
+    def test_detail_query_count(self):
+        book = Book.objects.first()
+        # book with stats, genres, reviews
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('book-detail', args=[book.pk]))
+        self.assertContains(response, '1 of 1 Copies Available')
+
+
+class BookListSortTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        authors = [Author.objects.create(first_name=first, last_name=last)
+                   for first, last in (('Ann', 'Zed'), ('Bob', 'Young'), ('Cy', 'Young'))]
+        for n in range(15):
+            book = Book.objects.create(
+                title=f'Book {n % 4}', isbn=f'{n}', author=authors[n % 3],
+                publication_date=datetime.date(2000 + n % 5, 1, 1))
+            for _ in range(n % 3):
+                BookInstance.objects.create(book=book, imprint='unlikely imprint', status='a')
+            for stars in range(1, n % 4 + 1):
+                book.reviews.create(writer='someone', body='fine', stars=stars)
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def walk(self, orderby):
+        """Ids of every book, following the cursors of ?orderby="""
+        seen, params = [], {'orderby': orderby}
+        while True:
+            response = self.client.get(reverse('books'), params)
+            self.assertEqual(response.status_code, 200)
+            seen += [book.pk for book in response.context['book_list']]
+            cursor = response.context['page_obj'].next_cursor
+            if not cursor:
+                return seen
+            params['cursor'] = cursor
+
+    def test_sorts_walk_every_book_in_order(self):
+        books = list(Book.objects.select_related('author'))
+        expected = {
+            'title': sorted(books, key=lambda b: (b.title, b.pk)),
+            'published': sorted(books, key=lambda b: (b.publication_date, b.pk), reverse=True),
+            'author': sorted(books, key=lambda b: (str(b.author), b.pk)),
+            'rating': sorted(books, key=lambda b: (b.avg_stars or 0, b.pk), reverse=True),
+            'available': sorted(books, key=lambda b: (b.copies_available, b.pk), reverse=True),
+        }
+        for orderby, ordered in expected.items():
+            with self.subTest(orderby=orderby):
+                self.assertEqual(self.walk(orderby), [book.pk for book in ordered])
+                self.assertEqual(self.walk(f'-{orderby}'), [book.pk for book in reversed(ordered)])
+
+    def test_sort_keys_follow_reviews_and_authors(self):
+        book = Book.objects.get(isbn='0')
+        book.reviews.create(writer='someone', body='great', stars=5)
+        self.assertEqual(self.walk('rating')[0], book.pk)
+
+        author = Author.objects.get(last_name='Zed')
+        author.last_name = 'Adams'
+        author.save()
+        self.assertEqual(self.walk('author')[0], book.pk)
+
+    def test_unknown_sort_uses_title_order(self):
+        response = self.client.get(reverse('books'), {'orderby': 'isbn'})
+        self.assertEqual(response.context['orderby'], '')
+        self.assertEqual([book.title for book in response.context['book_list']][:4], ['Book 0'] * 4)
+
+
+class BookReviewListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Mickey', last_name='Mouse')
+        cls.book = Book.objects.create(title='Test Book', isbn='1234', author=author)
+        for n in range(25):
+            cls.book.reviews.create(writer='reader', body=f'Review {n}', stars=n % 5 + 1,
+                                    date_written=datetime.date(2021, 1, 1 + n))
+
+    def setUp(self):
+        catalog_cache().clear()
+
+    def test_detail_embeds_newest_reviews_and_histogram(self):
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertEqual([review.body for review in response.context['recent_reviews']],
+                         ['Review 24', 'Review 23', 'Review 22'])
+        self.assertNotContains(response, 'Review 21')
+        self.assertContains(response, 'All 25 reviews')
+        self.assertContains(response, '<td>5</td>', count=5)
+
+    def test_reviews_paged_newest_first(self):
+        url = reverse('book-reviews', args=[self.book.pk])
+        # book, one page of reviews
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        first_page = [review.body for review in response.context['review_list']]
+        self.assertEqual(first_page, [f'Review {n}' for n in range(24, 4, -1)])
+
+        response = self.client.get(url, {'cursor': response.context['page_obj'].next_cursor,
+                                         'fragment': '1'})
+        self.assertTemplateUsed(response, 'catalog/review_items.html')
+        self.assertTemplateNotUsed(response, 'base_generic.html')
+        self.assertEqual([review.body for review in response.context['review_list']],
+                         [f'Review {n}' for n in range(4, -1, -1)])
+        self.assertNotContains(response, 'More reviews')
+
+    def test_unknown_book_is_404(self):
+        response = self.client.get(reverse('book-reviews', args=[self.book.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
 
 class LoanedBookInstanceByUserListViewTest(TestCase):
     def setUp(self):
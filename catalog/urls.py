@@ -1,15 +1,34 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
 
 
-urlpatterns = [
-    path('', views.index, name="index"),
-    path('books/', views.BookListView.as_view(), name="books"),
-    path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
-    path('authors/', views.AuthorListView.as_view(), name='authors'),
-    path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+if settings.CATALOG_ASYNC_VIEWS:
+    urlpatterns = [
+        path('', async_views.index, name="index"),
+        path('books/', async_views.book_list, name="books"),
+        path('book/<int:pk>', async_views.book_detail, name='book-detail'),
+        path('authors/', async_views.author_list, name='authors'),
+        path('author/<int:pk>', async_views.author_detail, name='author-detail'),
+    ]
+else:
+    urlpatterns = [
+        path('', views.index, name="index"),
+        path('books/', views.BookListView.as_view(), name="books"),
+        path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+        path('authors/', views.AuthorListView.as_view(), name='authors'),
+        path('author/<int:pk>', views.AuthorDetailView.as_view(), name='author-detail'),
+    ]
+
+urlpatterns += [
+    path('books/suggest/', views.book_suggest, name='book-suggest'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
+    path('mybooks/history', views.LoanHistoryView.as_view(), name='my-loan-history'),
     path('loanedbooks/', views.AllLoanedBooksView.as_view(), name='all-loaned'),
+    path('book/<int:pk>/loans', views.BookLoanHistoryView.as_view(), name='book-loans'),
+    path('book/<int:pk>/reviews', views.BookReviewListView.as_view(), name='book-reviews'),
+    path('book/<int:pk>/reserve', views.reserve_book, name='book-reserve'),
+    path('hold/<int:pk>/cancel', views.cancel_book_hold, name='hold-cancel'),
 ]
 
 urlpatterns += [
@@ -27,9 +46,23 @@ urlpatterns += [
 ]
 
 urlpatterns += [
-    path('bookreview/', (views.ReviewFormView.as_view()),
-         name="book-review-form")
+    path('book/<int:pk>/review', views.ReviewFormView.as_view(), name="book-review-form")
 ]
 urlpatterns += [
     path('register/', views.register, name="register")
 ]
+
+urlpatterns += [
+    path('export/<str:kind>.<str:fmt>', views.export_catalog, name='catalog-export'),
+]
+
+urlpatterns += [
+    path('api/', api.api_root, name='api-root'),
+    path('api/books/', api.book_list, name='api-books'),
+    path('api/books/<int:pk>/', api.book_detail, name='api-book'),
+    path('api/books/<int:pk>/copies/', api.book_copies, name='api-book-copies'),
+    path('api/books/<int:pk>/reviews/', api.book_reviews, name='api-book-reviews'),
+    path('api/authors/', api.author_list, name='api-authors'),
+    path('api/authors/<int:pk>/', api.author_detail, name='api-author'),
+    path('api/genres/', api.genre_list, name='api-genres'),
+]
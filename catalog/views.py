@@ -1,13 +1,19 @@
-from django.shortcuts import render, redirect
-from .models import Book, Author, BookInstance, Genre, Review
+from django.shortcuts import get_object_or_404, render, redirect
+from .models import Book, Author, BookInstance, Genre, Hold, Review
 from django.views import generic, View
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Prefetch
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django import forms
 from django.urls import reverse
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.views.generic import FormView
 from django.views.generic.detail import SingleObjectMixin
 from django_filters.views import FilterView
@@ -15,113 +21,361 @@ from django_filters.views import FilterView
 
 from catalog.models import Author, Review
 from catalog.models import Book
+from django.contrib.auth.models import User
 # from catalog.filters import BookFilter
+from . import counters, ledger
+from .availability import AvailableBooks
+from .caching import CachedPageMixin, cache_timeout, catalog_cache, get_versions, version_tag
+from .circulation import CirculationError, cancel_hold, reserve
+from .export import EXPORTS, iter_lines
+from .export import FORMATS as EXPORT_FORMATS
 from .forms import ReviewForm, RegisterForm
+from .middleware import query_budget
+from .pagination import CursorPaginationMixin, IdSetPaginator, reverse_ordering
+from .replicas import primary_reads, replica_reads
+from .reviews import writer_name
+from .search import search_books, suggest_titles
+from .stats import catalog_stats
 
+VISITS_SALT = 'catalog.index.visits'
+VISITS_COOKIE_AGE = 60 * 60 * 24 * 365
 
+
+@replica_reads
+@query_budget(4)
 def index(request):
     """View function for the home page of site"""
 
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+    context = dict(catalog_stats())
+    context['num_visits'] = get_visits(request)
+    context['total_visits'] = counters.total(counters.HOME_VISITS)
+    response = render(request, 'index.html', context=context)
+    count_visit(response, context['num_visits'])
+    return response
 
-    # Available books
-    num_instances_avail = BookInstance.objects.filter(
-        status__exact='a').count()
 
-    num_authors = Author.objects.count()
+# visits to the home page, counted in a signed cookie rather than the session
+# and in a cache-backed site counter, so the home page doesn't write to the database
 
-    # number of visits to this view, as counted in the session variable
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+def get_visits(request):
+    try:
+        return int(request.get_signed_cookie('num_visits', default=0, salt=VISITS_SALT))
+    except ValueError:
+        return 0
 
-    context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_avail': num_instances_avail,
-        'num_authors': num_authors,
-        'num_visits': num_visits,
-    }
 
-    return render(request, 'index.html', context=context)
+def count_visit(response, num_visits):
+    counters.hit(counters.HOME_VISITS)
+    response.set_signed_cookie('num_visits', num_visits + 1, salt=VISITS_SALT,
+                               max_age=VISITS_COOKIE_AGE, httponly=True, samesite='Lax')
 
 
-class BookListView(generic.ListView):
+class BookListView(CachedPageMixin, CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 12
+    cursor_ordering = ('title', 'id')
+    cache_scopes = ('books',)
+    query_budget = 5
+    replica_reads = True
+
+    # ?orderby= values, each walks one of the Book indexes; "-name" reverses a sort
+    sorts = {
+        'title': ('Title', ('title', 'id')),
+        'published': ('Newest', ('-publication_date', '-id')),
+        'author': ('Author', ('author_sort', 'id')),
+        'rating': ('Highest rated', ('-rating', '-id')),
+        'available': ('Most copies available', ('-copies_available', '-id')),
+    }
+
+    available_books = None
+
+    def get_sort(self):
+        """The requested ?orderby= if it is a known sort, else None"""
+        orderby = self.request.GET.get('orderby', '').strip()
+        return orderby if orderby.lstrip('-') in self.sorts else None
+
+    def get_cursor_ordering(self):
+        sort = self.get_sort()
+        if sort:
+            ordering = self.sorts[sort.lstrip('-')][1]
+            return reverse_ordering(ordering) if sort.startswith('-') else ordering
+        # search results are ordered by rank, page those by offset
+        if self.request.GET.get('filter'):
+            return None
+        return super().get_cursor_ordering()
+
+    def get_cursor_paginator(self, queryset, page_size):
+        if self.available_books is not None:
+            return IdSetPaginator(self.available_books, queryset, page_size)
+        return super().get_cursor_paginator(queryset, page_size)
+
+    def get_genre_ids(self):
+        return [int(pk) for pk in self.request.GET.getlist('genre') if pk.isdigit()]
 
     def get_queryset(self):
         filter_val = self.request.GET.get('filter')
-        queryset = super().get_queryset()
+        available = self.request.GET.get('available')
+        genre_ids = self.get_genre_ids()
+        queryset = Book.objects.for_display().order_by(*self.cursor_ordering)
+        if available and not filter_val and not self.get_sort():
+            # available books, optionally in genres: the precomputed sets, in id order
+            self.available_books = AvailableBooks(genre_ids)
+            return queryset
+        if available:
+            queryset = queryset.filter(copies_available__gt=0)
+        for genre_id in genre_ids:
+            queryset = queryset.filter(genre=genre_id)
         if filter_val:
-            return queryset.filter(title__icontains=filter_val)
+            return search_books(queryset, filter_val)
         else:
             return queryset
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # versions for the cached book card fragments
+        books = context['book_list']
+        versions = get_versions('genres', *(f'book:{book.pk}' for book in books))
+        for book in books:
+            book.cache_version = f"{versions[f'book:{book.pk}']}.{versions['genres']}"
+        context['cache_timeout'] = cache_timeout()
+        context['genre_choices'] = self.get_genre_choices(versions['genres'])
+        context['selected_genres'] = self.get_genre_ids()
+        context['sort_choices'] = [(name, label) for name, (label, _) in self.sorts.items()]
+        context['orderby'] = self.get_sort() or ''
+        return context
+
+    def get_genre_choices(self, version):
+        """(pk, name) of every genre for the filter form, cached until genres change"""
+        key = f'catalog:genre-choices:{version}'
+        choices = catalog_cache().get(key)
+        if choices is None:
+            with primary_reads():
+                choices = list(Genre.objects.order_by('name').values_list('pk', 'name'))
+            catalog_cache().set(key, choices, cache_timeout(from_primary=True))
+        return choices
+
+
+@replica_reads
+@query_budget(1)
+def book_suggest(request):
+    """Typeahead suggestions for the catalog filter, as JSON"""
+    suggestions = suggest_titles(request.GET.get('q', ''))
+    return JsonResponse({'results': [
+        {'id': pk, 'title': title, 'url': reverse('book-detail', args=[str(pk)])}
+        for pk, title in suggestions]})
+
 
 class BookDetailView(generic.DetailView):
     model = Book
     template_name = 'catalog/book_detail.html'
     form_class = ReviewForm
+    query_budget = 5
+    replica_reads = True
+    recent_reviews = 3
+
+    def get_queryset(self):
+        return Book.objects.for_display()
+
+    def get_object(self, queryset=None):
+        # the detail body is a cached fragment, cache the book it is keyed on too
+        pk = self.kwargs[self.pk_url_kwarg]
+        self.cache_version = version_tag(f'book:{pk}', 'genres')
+        key = f'catalog:book:{pk}:{self.cache_version}'
+        book = catalog_cache().get(key)
+        if book is None:
+            with primary_reads():
+                book = super().get_object(queryset)
+            catalog_cache().set(key, book, cache_timeout(from_primary=True))
+        return book
 
     def get_context_data(self, **kwargs):
         context = super(BookDetailView, self).get_context_data(**kwargs)
         context['form'] = ReviewForm
+        # only read, from the primary, when the cached detail body is rendered
+        context['recent_reviews'] = Review.objects.using(DEFAULT_DB_ALIAS).filter(
+            book_id=self.object.pk).order_by(
+            *BookReviewListView.cursor_ordering)[:self.recent_reviews]
+        context['cache_version'] = self.cache_version
+        context['cache_timeout'] = cache_timeout(from_primary=True)
         return context
 
 
-class ReviewFormView(FormView):
+class ReviewFormView(LoginRequiredMixin, SingleObjectMixin, FormView):
+    """Queue a review of a book, catalog.reviews applies it in the background"""
+    model = Book
     form_class = ReviewForm
-    success_url = reverse_lazy('books')
-    model = Review
-    book_pk = None
+    template_name = 'catalog/review_form.html'
+    http_method_names = ['post']
+    query_budget = 4
 
-    def get_book(self):
-        return Review.objects.first().book
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return super().post(request, *args, **kwargs)
 
     def form_valid(self, form):
-        temp = form.cleaned_data.get("book")
-        self.book_pk = temp.pk
-        item = form.save()
-        return super(ReviewFormView, self).form_valid(form)
-
-    def get_success_url(self):
-        return reverse('book-detail', args=[str(self.book_pk)])
+        form.instance.book = self.object
+        form.instance.user = self.request.user
+        form.instance.writer = writer_name(self.request.user)
+        form.save()
+        messages.success(self.request, 'Thanks for your review, it will appear here shortly.')
+        return redirect(self.object)
 
 
-class AuthorListView(generic.ListView):
+class AuthorListView(CachedPageMixin, CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 10
+    cursor_ordering = ('last_name', 'first_name', 'id')
+    # the stored totals change with the books
+    cache_scopes = ('authors', 'books')
+    query_budget = 3
+    replica_reads = True
 
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(CachedPageMixin, generic.DetailView):
+    """An author and their bibliography, in three queries however many books they wrote"""
     model = Author
+    # author, books, genres, and the session and user when logged in
+    query_budget = 5
+    replica_reads = True
+
+    def get_cache_scopes(self):
+        return (f'author:{self.kwargs["pk"]}', 'books')
+
+    def get_queryset(self):
+        # availability and ratings are stored on Book, genres take the third query
+        books = Book.objects.prefetch_related('genre').order_by('title', 'id')
+        return Author.objects.prefetch_related(Prefetch('book_set', queryset=books, to_attr='books'))
 
 
-class ReviewListView(generic.ListView):
+class BookReviewListView(CachedPageMixin, CursorPaginationMixin, generic.ListView):
+    """A book's reviews newest first, ?fragment=1 renders only the list for embedding"""
     model = Review
+    paginate_by = 20
+    cursor_ordering = ('-date_written', '-id')
+    query_budget = 3
+    replica_reads = True
 
+    def get_cache_scopes(self):
+        return (f'book:{self.kwargs["pk"]}',)
+
+    def get_queryset(self):
+        self.book = get_object_or_404(Book, pk=self.kwargs['pk'])
+        return self.book.reviews.order_by(*self.cursor_ordering)
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+    def get_template_names(self):
+        if self.request.GET.get('fragment'):
+            return ['catalog/review_items.html']
+        return ['catalog/book_review_list.html']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['book'] = self.book
+        return context
+
+
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     """ Generic class-based view listing books on loan to current user"""
     """Must be logged in to see it (loginrequiredmixin checks this)"""
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    cursor_ordering = ('book__title', 'id')
+    query_budget = 4
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+        return (BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+                .select_related('book').order_by(*self.cursor_ordering))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['hold_list'] = (Hold.objects.filter(
+            user=self.request.user, status__in=Hold.ACTIVE_STATUSES).select_related('book'))
+        return context
+
+
+@login_required
+@require_POST
+def reserve_book(request, pk):
+    """Place a hold on a book for the current user"""
+    book = get_object_or_404(Book, pk=pk)
+    try:
+        reserve(book, request.user)
+    except CirculationError:
+        pass  # already queued, the loans page shows the existing hold
+    return redirect('my-borrowed')
 
 
-class AllLoanedBooksView(PermissionRequiredMixin, generic.ListView):
+@login_required
+@require_POST
+def cancel_book_hold(request, pk):
+    hold = get_object_or_404(Hold, pk=pk, user=request.user)
+    try:
+        cancel_hold(hold)
+    except CirculationError:
+        pass
+    return redirect('my-borrowed')
+
+
+class AllLoanedBooksView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     """Generic class-based view listing all books on loan and the borrowers"""
     permission_required = 'catalog.can_add_edit'
     model = BookInstance
     template_name = 'catalog/all_loaned_books.html'
     paginate_by = 10
+    cursor_ordering = ('book__title', 'id')
+    query_budget = 5
+
+    def get_queryset(self):
+        return (BookInstance.objects.filter(borrower__isnull=False)
+                .select_related('book', 'borrower').order_by(*self.cursor_ordering))
+
+
+class LoanHistoryView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
+    """The loan ledger of the current user, newest first, archived events included"""
+    template_name = 'catalog/loan_history.html'
+    context_object_name = 'event_list'
+    paginate_by = 20
+    query_budget = 5
+
+    def get_queryset(self):
+        return ledger.user_history(self.request.user.pk)
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return ledger.history_paginator(queryset, page_size)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # the ledger keeps no foreign keys, so titles are looked up and may be gone
+        books = Book.objects.only('title').in_bulk(
+            {event.book_id for event in context['event_list']})
+        for event in context['event_list']:
+            event.title = books[event.book_id].title if event.book_id in books else None
+        return context
+
+
+class BookLoanHistoryView(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
+    """The loan ledger of one book with its borrowers, for librarians"""
+    permission_required = 'catalog.can_add_edit'
+    template_name = 'catalog/loan_history.html'
+    context_object_name = 'event_list'
+    paginate_by = 20
+    query_budget = 8
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower__isnull=False)
+        self.book = get_object_or_404(Book, pk=self.kwargs['pk'])
+        return ledger.book_history(self.book.pk)
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return ledger.history_paginator(queryset, page_size)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['book'] = self.book
+        users = User.objects.only('username').in_bulk(
+            {event.user_id for event in context['event_list'] if event.user_id})
+        for event in context['event_list']:
+            event.borrower = users.get(event.user_id)
+        return context
 
 
 class AuthorCreate(CreateView):
@@ -154,6 +408,17 @@ class BookDelete(DeleteView):
     success_url = reverse_lazy('books')
 
 
+@staff_member_required
+def export_catalog(request, kind, fmt):
+    """Stream one catalog table as CSV or JSON Lines"""
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export')
+    response = StreamingHttpResponse(
+        iter_lines(kind, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+
 def register(response):
     if response.method == 'POST':
         form = RegisterForm(response.POST)
@@ -3,6 +3,23 @@ ASGI config for emilyslibrary project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through this module routes the hot catalog read views to their async
+versions in catalog.async_views (CATALOG_ASYNC_VIEWS=1). Run it with uvicorn,
+one event loop per worker process:
+
+    pip install 'uvicorn[standard]'
+    uvicorn emilyslibrary.asgi:application --host 0.0.0.0 --port 8000 \\
+        --workers 4 --limit-concurrency 200 --timeout-keep-alive 5
+
+or under gunicorn with the uvicorn worker class:
+
+    gunicorn emilyslibrary.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Each worker can open up to one database connection per thread of the loop's
+default executor (min(32, cpu_count + 4) threads), so size the database's
+connection limit for workers x threads. ``manage.py benchmark_asgi`` compares
+this path with the WSGI one in-process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
@@ -12,5 +29,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emilyslibrary.settings')
+os.environ.setdefault('CATALOG_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
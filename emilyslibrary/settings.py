@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.QueryMetricsMiddleware',
+    'catalog.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,24 +76,158 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'emilyslibrary.wsgi.application'
+ASGI_APPLICATION = 'emilyslibrary.asgi.application'
+
+# Serve the hot catalog read views from catalog.async_views. asgi.py turns this
+# on; under WSGI the sync views are cheaper. With CATALOG_ASYNC_DB_POOL the
+# async views run their queries on a thread pool, one connection per worker
+# thread, rather than on Django's single thread for sync code.
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '') == '1'
+CATALOG_ASYNC_DB_POOL = os.environ.get('CATALOG_ASYNC_DB_POOL', '1') == '1'
 
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# catalog.db.mysql is Django's MySQL backend with a per-process connection
+# pool, see catalog/db/pool.py. Each request borrows a pooled connection and
+# returns it when the request ends (CONN_MAX_AGE 0), so neither WSGI threads
+# nor the ASGI executor's threads pin a connection each. Set
+# CATALOG_DB_POOL_SIZE=0 to turn pooling off and CATALOG_DB_CONN_MAX_AGE to
+# keep plain persistent connections per thread instead.
+# manage.py benchmark_connections compares the three.
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'catalog.db.mysql',
         'NAME': 'my_library',
         'USER': 'dbadmin',
         'PASSWORD': '12345',
         'HOST': 'localhost',
         'PORT': '3306',
+        'CONN_MAX_AGE': int(os.environ.get('CATALOG_DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('CATALOG_DB_POOL_SIZE', 10)),
+            'MAX_AGE': int(os.environ.get('CATALOG_DB_POOL_MAX_AGE', 300)),
+            'HEALTH_CHECKS': os.environ.get('CATALOG_DB_HEALTH_CHECKS', '1') == '1',
+        },
         'TEST': {'NAME': 'test_my_library'}
 
     }
 }
 
+# Read replicas
+# CATALOG_DB_REPLICA_HOSTS=host1,host2 adds a replica1, replica2, ... alias per
+# host, otherwise set up like default. The catalog read views opted in with
+# replica_reads send their reads there, see catalog/replicas.py; writes and
+# the requests of a client that has just written, for
+# CATALOG_REPLICA_PIN_SECONDS, stay on the primary.
+
+CATALOG_DB_REPLICAS = []
+for number, host in enumerate(
+        filter(None, os.environ.get('CATALOG_DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(DATABASES['default'], HOST=host.strip(),
+                                         TEST={'MIRROR': 'default'})
+    CATALOG_DB_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['catalog.replicas.ReplicaRouter']
+CATALOG_REPLICA_PIN_SECONDS = int(os.environ.get('CATALOG_REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# The catalog alias holds rendered pages and fragments, see catalog/caching.py.
+# Local memory by default (and in tests); point CATALOG_CACHE_BACKEND and
+# CATALOG_CACHE_LOCATION at a file-based cache directory or a memcached/redis
+# server in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': os.environ.get(
+            'CATALOG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', 'catalog'),
+    },
+    'sessions': {
+        'BACKEND': os.environ.get(
+            'CATALOG_SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOG_SESSION_CACHE_LOCATION', 'sessions'),
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 600))
+
+
+# Sessions
+# CATALOG_SESSION_ENGINE picks where sessions are kept:
+#   db              a django_session row each (the default)
+#   cached_db       read through the sessions cache, written to it and the table
+#   cache           the sessions cache only, lost when it is cleared
+#   signed_cookies  in the visitor's browser, no server-side storage or logout
+#                   of other devices
+# With several web processes, cached_db and cache need a shared sessions
+# cache (CATALOG_SESSION_CACHE_BACKEND), or a process may serve a stale
+# session after a logout elsewhere. Anonymous visitors get no session
+# whichever engine is used: the catalog keeps their state in cookies.
+# manage.py prune_sessions (or the prune-sessions job) removes expired rows.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get(
+    'CATALOG_SESSION_ENGINE', 'db')
+SESSION_CACHE_ALIAS = 'sessions'
+
+
+# Reviews
+# Posted reviews are queued and applied in batches by manage.py process_reviews,
+# after the moderation hook below has approved, held or rejected each one.
+
+CATALOG_REVIEW_MODERATOR = 'catalog.reviews.default_moderator'
+
+
+# Background jobs
+# Periodic maintenance run by manage.py run_jobs (from cron, or as a
+# long-running worker with --forever), see catalog/jobs.py.
+# name: (dotted path of a callable, seconds between runs)
+
+CATALOG_JOBS = {
+    'expire-holds': ('catalog.jobs.expire_holds', 5 * 60),
+    'process-reviews': ('catalog.jobs.process_reviews', 60),
+    'reconcile-counters': ('catalog.jobs.reconcile_counters', 24 * 60 * 60),
+    'prune-sessions': ('catalog.jobs.prune_sessions', 24 * 60 * 60),
+    'compact-loan-ledger': ('catalog.jobs.compact_loan_ledger', 24 * 60 * 60),
+    'flush-counters': ('catalog.jobs.flush_counters', 60),
+    'build-cover-variants': ('catalog.jobs.build_cover_variants', 60),
+}
+
+
+# Request metrics
+# catalog.middleware.QueryMetricsMiddleware logs query counts and timings for
+# catalog views to the catalog.metrics logger, warning when a view goes over
+# its query budget. Set CATALOG_METRICS_LOG to write them to a file instead
+# of the console, and CATALOG_METRICS_LEVEL=INFO to log every request.
+
+CATALOG_METRICS_HEADERS = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'metrics': {
+            'class': 'logging.FileHandler',
+            'filename': os.environ['CATALOG_METRICS_LOG'],
+        } if os.environ.get('CATALOG_METRICS_LOG') else {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'catalog.metrics': {
+            'handlers': ['metrics'],
+            'level': os.environ.get('CATALOG_METRICS_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators